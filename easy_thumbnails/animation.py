@@ -0,0 +1,97 @@
+from PIL import Image
+
+
+class AnimatedImage:
+    """
+    The decoded frames of an animated image, along with the animation's
+    metadata.
+
+    Animated images are passed through the image processors as an
+    ``AnimatedImage`` so each frame is only decoded once and the animation is
+    only encoded once, when the thumbnail is saved.
+
+    Like a multi-frame PIL image, any attribute which isn't specific to the
+    animation (such as ``size``, ``mode`` or ``convert``) refers to the current
+    frame. Use :class:`easy_thumbnails.processors.FrameAware` to process every
+    frame.
+    """
+
+    def __init__(self, frames, info=None, format=None):
+        self.frames = list(frames)
+        self.info = dict(self.frames[0].info if info is None else info)
+        self.format = format
+        self._frame = 0
+
+    @classmethod
+    def from_image(cls, im):
+        """
+        Return an ``AnimatedImage`` containing every frame of a multi-frame
+        PIL image (or the image itself, if it is already an
+        ``AnimatedImage``).
+        """
+        if isinstance(im, cls):
+            return im
+        current = im.tell()
+        frames = []
+        for i in range(im.n_frames):
+            im.seek(i)
+            frames.append(im.copy())
+        im.seek(current)
+        return cls(frames, format=im.format)
+
+    def __getattr__(self, key):
+        if key == 'frames':
+            # Avoid infinite recursion before the frames are set.
+            raise AttributeError(key)
+        return getattr(self.frames[self._frame], key)
+
+    def __repr__(self):
+        return '<{} {} frames={}>'.format(
+            self.__class__.__name__, self.format, len(self.frames))
+
+    @property
+    def n_frames(self):
+        return len(self.frames)
+
+    @property
+    def is_animated(self):
+        return len(self.frames) > 1
+
+    def seek(self, frame):
+        if not 0 <= frame < len(self.frames):
+            raise EOFError('no more images in animation')
+        self._frame = frame
+
+    def tell(self):
+        return self._frame
+
+    def map(self, function, *args, **kwargs):
+        """
+        Return a new ``AnimatedImage`` containing the result of calling
+        ``function`` with each frame (along with any extra arguments).
+        """
+        return self.__class__(
+            [function(frame, *args, **kwargs) for frame in self.frames],
+            info=self.info, format=self.format)
+
+    def save(self, fp, format=None, **params):
+        """
+        Save the animation, or only its first frame unless ``save_all`` is
+        set (as PIL does).
+        """
+        first, rest = self.frames[0], self.frames[1:]
+        if not params.pop('save_all', False) or not rest:
+            return first.save(fp, format=format, **params)
+        durations = [frame.info.get('duration') for frame in self.frames]
+        if None not in durations:
+            params.setdefault('duration', durations)
+        params.setdefault('loop', self.info.get('loop', 0))
+        return first.save(
+            fp, format=format, save_all=True, append_images=rest, **params)
+
+
+def is_image(im):
+    """
+    Return whether ``im`` is a PIL image or an ``AnimatedImage``.
+    """
+    return isinstance(im, (Image.Image, AnimatedImage))
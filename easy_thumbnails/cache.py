@@ -0,0 +1,124 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+
+from easy_thumbnails import utils
+from easy_thumbnails.conf import settings
+
+
+class ExistenceCache:
+    """
+    A cache of source modification times and thumbnail existence checks.
+
+    Entries are kept in a process-local LRU cache, holding at most
+    ``THUMBNAIL_EXISTENCE_CACHE_SIZE`` entries, and (if
+    ``THUMBNAIL_EXISTENCE_CACHE_BACKEND`` is set) in a Django cache shared
+    between processes. Entries expire after
+    ``THUMBNAIL_EXISTENCE_CACHE_TIMEOUT`` seconds. The cache is disabled if
+    this timeout is ``0``.
+
+    When there is a shared cache, source modification times are only kept in
+    it (not in the process-local cache). Thumbnail entries record the source
+    modification time they were checked against, so a source saved by any
+    process invalidates its thumbnails' entries in every process at once.
+    """
+
+    #: The kinds of keys which are only kept in the shared cache, if there is
+    #: one.
+    shared_only = frozenset(['source'])
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def source_key(self, storage, name):
+        """
+        Return the cache key for a source file's modification time.
+        """
+        return 'source', utils.get_storage_hash(storage), name
+
+    def thumbnail_key(self, storage, name):
+        """
+        Return the cache key for a thumbnail's existence.
+        """
+        return 'thumbnail', utils.get_storage_hash(storage), name
+
+    def get(self, key):
+        """
+        Return the cached value for ``key``, or ``None`` if there isn't one.
+        """
+        timeout = settings.THUMBNAIL_EXISTENCE_CACHE_TIMEOUT
+        if not timeout:
+            return None
+        shared_cache = self._get_shared_cache()
+        local = self._is_local(key, shared_cache)
+        if local:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    expires, value = entry
+                    if expires > time.monotonic():
+                        self._entries.move_to_end(key)
+                        return value
+                    del self._entries[key]
+        if shared_cache is None:
+            return None
+        value = shared_cache.get(self._shared_key(key))
+        if value is not None and local:
+            self._set_local(key, value, timeout)
+        return value
+
+    def set(self, key, value):
+        """
+        Cache ``value`` for ``key``.
+        """
+        timeout = settings.THUMBNAIL_EXISTENCE_CACHE_TIMEOUT
+        if not timeout:
+            return
+        shared_cache = self._get_shared_cache()
+        if self._is_local(key, shared_cache):
+            self._set_local(key, value, timeout)
+        if shared_cache is not None:
+            shared_cache.set(self._shared_key(key), value, timeout)
+
+    def delete(self, key):
+        """
+        Remove any cached value for ``key``.
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+        shared_cache = self._get_shared_cache()
+        if shared_cache is not None:
+            shared_cache.delete(self._shared_key(key))
+
+    def clear(self):
+        """
+        Remove all entries from the process-local cache.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def _set_local(self, key, value, timeout):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + timeout, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > settings.THUMBNAIL_EXISTENCE_CACHE_SIZE:
+                self._entries.popitem(last=False)
+
+    def _is_local(self, key, shared_cache):
+        return shared_cache is None or key[0] not in self.shared_only
+
+    def _get_shared_cache(self):
+        alias = settings.THUMBNAIL_EXISTENCE_CACHE_BACKEND
+        if not alias:
+            return None
+        return caches[alias]
+
+    def _shared_key(self, key):
+        return 'easy_thumbnails_exists:%s' % utils.md5_not_used_for_security(
+            ':'.join(key).encode('utf8')).hexdigest()
+
+
+existence_cache = ExistenceCache()
@@ -174,12 +174,32 @@ class Settings(AppSettings):
     Set to ``False`` to never use progressive encoding.
     """
 
+    THUMBNAIL_REDUCING_GAP = 3.0
+    """
+    When scaling a source image down, first reduce it by an integer factor
+    (which is much faster than resampling) while keeping it at least this many
+    times larger than the thumbnail, then resample it to the thumbnail size.
+
+    Lower values are faster, at the cost of some quality. At ``3.0`` the
+    result is nearly indistinguishable from resampling the full sized image.
+    Set to ``None`` to always resample the full sized image.
+
+    This can be overridden for each thumbnail (or alias) with the
+    ``reducing_gap`` option.
+    """
+
     THUMBNAIL_EXTENSION = 'jpg'
     """
     The type of image to save thumbnails with no transparency layer as.
 
     Note that changing the extension will most likely cause the
     ``THUMBNAIL_QUALITY`` setting to have no effect.
+
+    The ``format`` thumbnail option (an extension such as ``'webp'``) chooses
+    the format of a single thumbnail or alias instead, and the ``formats``
+    option lists several formats in order of preference, such as
+    ``['avif', 'webp', 'jpg']``, to generate the thumbnail in each of them
+    (see :meth:`easy_thumbnails.files.Thumbnailer.get_many_thumbnails`).
     """
 
     THUMBNAIL_PRESERVE_EXTENSIONS = None
@@ -205,7 +225,7 @@ class Settings(AppSettings):
     """
     The function used to generate the filename for thumbnail images.
 
-    Four namers are included in easy_thumbnails:
+    Five namers are included in easy_thumbnails:
 
     ``easy_thumbnails.namers.default``
         Descriptive filename containing the source and options like
@@ -221,6 +241,15 @@ class Settings(AppSettings):
         Filename with source hashed, size, then options hashed like
         ``1xedFtqllFo9_100x100_QHCa6G1l.jpg``.
 
+    ``easy_thumbnails.namers.content_hash``
+        Content-addressed filename, from a hash of the source file's contents
+        and the options, like
+        ``3f/3f2a9c17d04b6e85a1c2f93e0d7b5a64.100x100_q85_crop.jpg``.
+        Identical source images (even with different names) share their
+        thumbnails, which are only generated once. The hash is recorded on the
+        source's cache entry; use the ``thumbnail_hash_sources`` management
+        command to record it for existing sources.
+
     To write a custom namer, always catch all other keyword arguments arguments
     (with \\*\\*kwargs). You have access to the following arguments:
     ``thumbnailer``, ``source_filename``, ``thumbnail_extension`` (does *not*
@@ -279,6 +308,113 @@ class Settings(AppSettings):
     but your storage still has the thumbnail files.
     """
 
+    THUMBNAIL_GENERATION_LOCK = None
+    """
+    The lock backend used to stop more than one process from generating the
+    same missing thumbnail at once (for example, when many workers render a
+    popular page straight after a deploy).
+
+    Two backends are included in easy_thumbnails:
+
+    ``easy_thumbnails.locks.CacheLock``
+        Stores locks in Django's default cache. Use a cache shared between all
+        processes, such as memcached or redis.
+
+    ``easy_thumbnails.locks.FileLock``
+        Uses ``flock`` on files in ``THUMBNAIL_GENERATION_LOCK_DIR``.
+
+    If ``None`` (the default), thumbnails are generated without locking.
+    """
+
+    THUMBNAIL_GENERATION_LOCK_TIMEOUT = 30
+    """
+    The number of seconds a process waits to acquire a generation lock. Cache
+    based locks also expire after this many seconds.
+    """
+
+    THUMBNAIL_GENERATION_LOCK_WAIT = True
+    """
+    If ``True``, a process that finds another process generating the same
+    thumbnail waits for it to finish (up to
+    ``THUMBNAIL_GENERATION_LOCK_TIMEOUT`` seconds) and then returns that
+    thumbnail.
+
+    If ``False``, the thumbnail is treated as missing instead, as if it was
+    requested with ``generate=False``.
+    """
+
+    THUMBNAIL_GENERATION_LOCK_DIR = ''
+    """
+    The directory used by ``easy_thumbnails.locks.FileLock`` to store lock
+    files. Defaults to an ``easy_thumbnails`` directory in the system's
+    temporary directory.
+    """
+
+    THUMBNAIL_EXISTENCE_CACHE_TIMEOUT = 0
+    """
+    The number of seconds to cache source modification times and thumbnail
+    existence checks for, avoiding storage or database lookups each time a
+    thumbnail is requested. Set to ``0`` (the default) to disable the cache.
+
+    Cached entries are invalidated when a thumbnail is saved or deleted
+    through easy-thumbnails, but changes made directly to the storage are
+    only noticed once the entry expires.
+    """
+
+    THUMBNAIL_EXISTENCE_CACHE_SIZE = 10000
+    """
+    The maximum number of entries kept in each process's existence cache.
+    """
+
+    THUMBNAIL_EXISTENCE_CACHE_BACKEND = None
+    """
+    The alias of a Django cache (from the ``CACHES`` setting) to share the
+    existence cache between processes, in addition to each process's local
+    cache.
+
+    Source modification times are then only cached in the shared cache, so a
+    source saved through easy-thumbnails by one process is noticed by every
+    process straight away. Without a shared cache, other processes only
+    notice the change once their cached entries expire.
+    """
+
+    THUMBNAIL_QUEUE = 'easy_thumbnails.queues.DatabaseQueue'
+    """
+    The queue backend used by the ``queue_aliases``, ``queue_aliases_global``
+    and ``queue_missed_thumbnail`` signal handlers to generate thumbnails in
+    the background.
+
+    Two backends are included in easy_thumbnails:
+
+    ``easy_thumbnails.queues.DatabaseQueue``
+        Stores jobs in the database. Run the ``thumbnail_worker`` management
+        command to process them.
+
+    ``easy_thumbnails.queues.ThreadPoolQueue``
+        Processes jobs in a pool of background threads within the web process.
+    """
+
+    THUMBNAIL_QUEUE_CONCURRENCY = 2
+    """
+    The number of threads used to process queued thumbnail jobs, both by the
+    ``ThreadPoolQueue`` backend and (by default) the ``thumbnail_worker``
+    management command.
+    """
+
+    THUMBNAIL_QUEUE_CLAIM_TIMEOUT = 600
+    """
+    The number of seconds that a ``thumbnail_worker`` has to process a job
+    claimed from the ``DatabaseQueue``. Jobs which fail, or which are claimed
+    by a worker that stops before finishing them, are claimed again after
+    this time.
+    """
+
+    THUMBNAIL_QUEUE_MAX_ATTEMPTS = 3
+    """
+    The number of times a job in the ``DatabaseQueue`` is attempted before it
+    is removed from the queue.
+    """
+
     THUMBNAIL_ALIASES = None
     """
     A dictionary of predefined alias options for different targets. See the
@@ -303,6 +439,42 @@ class Settings(AppSettings):
     still works as a fall back.
     """
 
+    THUMBNAIL_CACHE_SOURCE_METADATA = False
+    """
+    Save the properties of source images to the database.
+
+    When enabled, the size, format, mode, number of frames and EXIF
+    orientation of each source image are recorded when it is first decoded to
+    generate a thumbnail (or saved through a thumbnailer field).
+    ``ThumbnailerImageFieldFile`` then uses the cached size for its ``width``
+    and ``height`` without opening the file.
+
+    For storages whose files have modification times, the metadata is
+    refreshed once the source file changes.
+    """
+
+    THUMBNAIL_PASSTHROUGH = False
+    """
+    Save a copy of the source file as the thumbnail, rather than decoding and
+    encoding it again, when the source image already satisfies the thumbnail
+    options. This is the case when the source image:
+
+    * fits within the thumbnail's size (so it isn't scaled down or cropped),
+    * wouldn't be altered by any of the processors for the other options
+      (processors without an ``active`` predicate always count as altering
+      the image),
+    * doesn't need rotating to match its EXIF orientation,
+    * isn't animated,
+    * and is already in the thumbnail's format (chosen from the thumbnail's
+      extension as usual, see ``THUMBNAIL_EXTENSION``).
+
+    This is checked from the source image's header without decoding it (and
+    from its cached size first, when ``THUMBNAIL_CACHE_SOURCE_METADATA`` is
+    enabled). The copy keeps everything in the source file, such as its EXIF
+    data, and neither the ``quality`` option nor
+    ``THUMBNAIL_IMAGE_SAVE_OPTIONS`` is applied to it.
+    """
+
     THUMBNAIL_WIDGET_OPTIONS = {'size': (80, 80)}
     """
     Default options for the
@@ -315,11 +487,66 @@ class Settings(AppSettings):
         },
         'WEBP': {
             'quality': 85,
+            'method': 4,
+        },
+        'AVIF': {
+            'speed': 6,
         },
     }
     """
-    Allows customising Image.save parameters based on format, for example:
-    `{'WEBP': {'method': 6}}`
+    Allows customising Image.save parameters based on format, for example::
+
+        THUMBNAIL_IMAGE_SAVE_OPTIONS = {
+            'WEBP': {'method': 6, 'lossless': True},
+            'AVIF': {'speed': 4, 'subsampling': '4:4:4'},
+            'PNG': {'compress_level': 9},
+        }
+
+    These are the encoder presets for each format. WebP's ``method`` (from
+    ``0`` to ``6``) and AVIF's ``speed`` (from ``10`` down to ``0``) trade
+    slower encoding for smaller files, so keep them moderate for thumbnails
+    generated on request. A thumbnail's own ``quality`` (and, for JPEG,
+    ``subsampling``) option takes precedence over the ones given here.
+    """
+
+    THUMBNAIL_ANIMATION_MAX_FRAMES = None
+    """
+    The maximum number of frames decoded from an animated source image. Set to
+    ``None`` (the default) for no limit.
+
+    When an animation has more frames, ``THUMBNAIL_ANIMATION_LIMIT_STRATEGY``
+    decides what happens.
+    """
+
+    THUMBNAIL_ANIMATION_MAX_PIXELS = None
+    """
+    The maximum number of pixels (the width times the height times the number
+    of frames) decoded from an animated source image. This limits the memory
+    used to decode each animation. Set to ``None`` (the default) for no limit.
     """
 
+    THUMBNAIL_ANIMATION_MAX_DECODE_TIME = None
+    """
+    The maximum number of seconds spent decoding the frames of an animated
+    source image. Set to ``None`` (the default) for no limit.
+    """
+
+    THUMBNAIL_ANIMATION_LIMIT_STRATEGY = 'sample'
+    """
+    What to do with an animated source image which exceeds one of the
+    ``THUMBNAIL_ANIMATION_MAX_*`` limits:
+
+    ``'sample'``
+        Keep frames sampled evenly across the animation, as many as the
+        limits allow. Each kept frame lasts as long as the frames it replaces.
+        If the decode time limit is reached, only the first frame is kept.
+
+    ``'first'``
+        Only keep the first frame.
+
+    ``'error'``
+        Raise an ``EasyThumbnailsError``.
+    """
+
+
 settings = Settings()
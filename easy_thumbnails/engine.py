@@ -1,12 +1,16 @@
+import inspect
 import os
 
 from io import BytesIO, StringIO
 
-from django.utils.module_loading import import_string
+from django.core.signals import setting_changed
+from django.dispatch import receiver
 
 from PIL import Image
 
+from easy_thumbnails import utils
 from easy_thumbnails.conf import settings
+from easy_thumbnails.exceptions import EasyThumbnailsError
 from easy_thumbnails.options import ThumbnailOptions
 
 
@@ -21,6 +25,113 @@ class NoSourceGenerator(Exception):
             len(self.args))
 
 
+class Pipeline:
+    """
+    The resolved image processors and source generators used to generate
+    thumbnails.
+
+    Each processor (and generator) may be given as a callable or as the dotted
+    path to one. Processors can declare optional attributes which let the
+    pipeline avoid unnecessary work:
+
+    ``active``
+        A predicate, called with the image and the thumbnail options, which
+        returns ``False`` if the processor wouldn't alter the image, so that
+        the processor is skipped.
+
+    ``deferrable``
+        A predicate which returns ``True`` if the processor gives the same
+        result when it is run after the image is resized. If the next active
+        processor is one which ``resizes`` the image, the deferrable processor
+        is run after it (on the smaller image) instead.
+
+    ``resizes``
+        ``True`` if the processor resizes the image.
+    """
+
+    def __init__(self, processors=(), generators=()):
+        self.processors = tuple(
+            utils.get_callable(processor) for processor in processors)
+        self.generators = tuple(
+            utils.get_callable(generator) for generator in generators)
+        self.processor_options = {
+            processor: get_valid_options(processor)
+            for processor in self.processors + self.generators}
+        self.valid_options = frozenset(
+            ['size', 'quality', 'subsampling', 'format', 'formats']).union(
+            *self.processor_options.values())
+        self._chain = tuple(
+            (processor, getattr(processor, 'active', None),
+             getattr(processor, 'deferrable', None),
+             getattr(processor, 'resizes', False))
+            for processor in self.processors)
+
+    def get_processors(self, image, options):
+        """
+        Return the processors which would alter ``image`` for the given
+        thumbnail options (checking each one against the source image).
+        """
+        return [
+            processor for processor, active, deferrable, resizes in self._chain
+            if active is None or active(image, **options)]
+
+    def process(self, image, options):
+        """
+        Process an image through each of the active processors.
+        """
+        deferred = None
+        for processor, active, deferrable, resizes in self._chain:
+            if active is not None and not active(image, **options):
+                continue
+            if deferred is not None and not resizes:
+                image = deferred(image, **options)
+                deferred = None
+            if (deferred is None and deferrable is not None and
+                    deferrable(image, **options)):
+                deferred = processor
+                continue
+            image = processor(image, **options)
+            if deferred is not None:
+                image = deferred(image, **options)
+                deferred = None
+        if deferred is not None:
+            image = deferred(image, **options)
+        return image
+
+
+def get_valid_options(processor):
+    """
+    Return the set of options accepted by a processor (or source generator).
+    """
+    # Skip the first argument (the source image).
+    return frozenset(inspect.getfullargspec(processor)[0][1:])
+
+
+_pipeline = None
+
+
+def get_pipeline():
+    """
+    Return the pipeline for the ``THUMBNAIL_PROCESSORS`` and
+    ``THUMBNAIL_SOURCE_GENERATORS`` settings.
+
+    The pipeline is only built again when these settings change.
+    """
+    global _pipeline
+    key = (tuple(settings.THUMBNAIL_PROCESSORS),
+           tuple(settings.THUMBNAIL_SOURCE_GENERATORS))
+    if _pipeline is None or _pipeline[0] != key:
+        _pipeline = (key, Pipeline(*key))
+    return _pipeline[1]
+
+
+@receiver(setting_changed)
+def reset_pipeline(setting, **kwargs):
+    global _pipeline
+    if setting in ('THUMBNAIL_PROCESSORS', 'THUMBNAIL_SOURCE_GENERATORS'):
+        _pipeline = None
+
+
 def process_image(source, processor_options, processors=None):
     """
     Process a source PIL image through a series of image processors, returning
@@ -28,13 +139,57 @@ def process_image(source, processor_options, processors=None):
     """
     processor_options = ThumbnailOptions(processor_options)
     if processors is None:
-        processors = [
-            import_string(name)
-            for name in settings.THUMBNAIL_PROCESSORS]
-    image = source
-    for processor in processors:
-        image = processor(image, **processor_options)
-    return image
+        pipeline = get_pipeline()
+    else:
+        pipeline = Pipeline(processors)
+    return pipeline.process(source, processor_options)
+
+
+# The modes which Image.reduce can average pixels of (palette and bilevel
+# images can't be averaged, and Pillow can't reduce 16 bit images).
+REDUCIBLE_MODES = frozenset([
+    'L', 'LA', 'La', 'RGB', 'RGBA', 'RGBa', 'RGBX', 'CMYK', 'YCbCr', 'I',
+    'F'])
+
+
+def reduce_image(image, options_list):
+    """
+    Reduce a source PIL image by the largest integer factor which still leaves
+    it at least ``reducing_gap`` times larger than every thumbnail in
+    ``options_list``.
+
+    This lets many thumbnails be processed from one smaller intermediate image
+    rather than each of them resizing the full sized source image, without
+    reducing it any further than scaling each thumbnail on its own would.
+    Images in modes which PIL can't reduce (such as palette images) are
+    returned unchanged.
+    """
+    if not isinstance(image, Image.Image) or getattr(image, 'n_frames', 1) > 1:
+        return image
+    if image.mode not in REDUCIBLE_MODES:
+        return image
+    factors = []
+    for options in options_list:
+        if options.get('autocrop'):
+            # Autocropping happens before scaling, so the amount that the
+            # image can be reduced by isn't known in advance.
+            return image
+        reducing_gap = options.get('reducing_gap')
+        if reducing_gap is None:
+            reducing_gap = settings.THUMBNAIL_REDUCING_GAP
+        reducing_gap = float(reducing_gap or 0)
+        if not reducing_gap:
+            # This thumbnail is resampled from the full sized image.
+            return image
+        covering_size = utils.get_covering_size(image.size, **options)
+        if not covering_size:
+            return image
+        factors.append(int(min(
+            image.size[0] / (covering_size[0] * reducing_gap),
+            image.size[1] / (covering_size[1] * reducing_gap))))
+    if not factors or min(factors) < 2:
+        return image
+    return image.reduce(min(factors))
 
 
 def save_pil_image(image, destination=None, filename=None, **options):
@@ -47,6 +202,10 @@ def save_pil_image(image, destination=None, filename=None, **options):
     # Ensure plugins are fully loaded so that Image.EXTENSION is populated.
     Image.init()
     format = Image.EXTENSION.get(os.path.splitext(filename)[1].lower(), 'JPEG')
+    if format != 'JPEG':
+        # The subsampling option is a JPEG subsampling level (the AVIF encoder
+        # takes a differently formatted value from the save options instead).
+        options.pop('subsampling', None)
     if format in settings.THUMBNAIL_IMAGE_SAVE_OPTIONS:
         for key, value in settings.THUMBNAIL_IMAGE_SAVE_OPTIONS[format].items():
             options.setdefault(key, value)
@@ -71,7 +230,7 @@ def save_pil_image(image, destination=None, filename=None, **options):
             # of pillow avoid the MAXBLOCK limitation.
             pass
     else:
-        if format != 'WEBP' and 'quality' in options:
+        if format not in ('WEBP', 'AVIF') and 'quality' in options:
             options.pop('quality')
     if not saved:
         image.save(destination, format=format, **options)
@@ -87,7 +246,8 @@ def generate_source_image(source_file, processor_options, generators=None,
     once a generator returns an image.
 
     The return value is this image instance or ``None`` if no generators
-    return an image.
+    return an image. An ``EasyThumbnailsError`` raised by a generator is
+    always raised, even if ``fail_silently`` is set.
 
     If the source file cannot be opened, it will be set to ``None`` and still
     passed to the generators.
@@ -97,9 +257,7 @@ def generate_source_image(source_file, processor_options, generators=None,
     # file-like objects provide this attribute, so just fall back to False.
     was_closed = getattr(source_file, 'closed', False)
     if generators is None:
-        generators = [
-            import_string(name)
-            for name in settings.THUMBNAIL_SOURCE_GENERATORS]
+        generators = get_pipeline().generators
     exceptions = []
     try:
         for generator in generators:
@@ -116,6 +274,11 @@ def generate_source_image(source_file, processor_options, generators=None,
                     source = None
             try:
                 image = generator(source, **processor_options)
+            except EasyThumbnailsError:
+                # The generator recognised the source but refused to generate
+                # an image from it (for example, an animation over the limits),
+                # so don't hide that behind trying the other generators.
+                raise
             except Exception as e:
                 if not fail_silently:
                     if len(generators) == 1:
@@ -1,4 +1,5 @@
 import os
+import uuid
 
 from django.core.files.base import File, ContentFile
 from django.core.files.storage import default_storage, Storage
@@ -8,10 +9,13 @@ from django.db.models.fields.files import ImageFieldFile, FieldFile
 from django.utils import timezone
 from django.utils.safestring import mark_safe
 from django.utils.html import escape
-from django.utils.module_loading import import_string
 
-from easy_thumbnails import engine, exceptions, models, utils, signals, storage
+from PIL import Image
+
+from easy_thumbnails import (
+    engine, exceptions, locks, models, probe, utils, signals, storage)
 from easy_thumbnails.alias import aliases
+from easy_thumbnails.cache import existence_cache
 from easy_thumbnails.conf import settings
 from easy_thumbnails.options import ThumbnailOptions
 
@@ -89,7 +93,123 @@ def generate_all_aliases(fieldfile, include_global):
         thumbnailer = get_thumbnailer(fieldfile)
         for key, options in all_options.items():
             options['ALIAS'] = key
-            thumbnailer.get_thumbnail(options)
+        thumbnailer.get_many_thumbnails(list(all_options.values()))
+
+
+def prefetch_thumbnails(objects, aliases=None, fields=None):
+    """
+    Load the cached references of the source images and thumbnails for many
+    files at once, so that looking up their thumbnails doesn't query the
+    database for each file.
+
+    :param objects: An iterable (such as a queryset) of either model instances
+        or ``ThumbnailerFieldFile`` instances.
+    :param aliases: The names of the aliases which will be looked up. If
+        ``None`` (default), references to all of each source's thumbnails are
+        loaded.
+    :param fields: The names of the file fields to prefetch for model
+        instances. If ``None`` (default), all of the model's thumbnailer
+        fields are used.
+    :returns: A list of the objects.
+
+    A constant number of queries is used, no matter how many objects there
+    are. For example::
+
+        photos = prefetch_thumbnails(
+            Photo.objects.all(), aliases=['small', 'large'])
+    """
+    from easy_thumbnails.alias import aliases as all_aliases
+
+    objects = list(objects)
+    thumbnailers = []
+    for obj in objects:
+        if isinstance(obj, ThumbnailerFieldFile):
+            fieldfiles = [obj]
+        else:
+            field_names = fields
+            if field_names is None:
+                field_names = [
+                    field.name for field in obj._meta.fields
+                    if issubclass(
+                        getattr(field, 'attr_class', None) or object,
+                        ThumbnailerFieldFile)]
+            fieldfiles = [getattr(obj, name) for name in field_names]
+        for fieldfile in fieldfiles:
+            if fieldfile and not fieldfile.remote_source:
+                thumbnailers.append(fieldfile)
+    if not thumbnailers:
+        return objects
+
+    # Load the source references, one query per source storage.
+    names_by_storage = {}
+    for thumbnailer in thumbnailers:
+        storage_hash = utils.get_storage_hash(thumbnailer.source_storage)
+        names_by_storage.setdefault(storage_hash, set()).add(thumbnailer.name)
+    sources = {}
+    for storage_hash, names in names_by_storage.items():
+        queryset = models.Source.objects.filter(
+            storage_hash=storage_hash, name__in=names)
+        if settings.THUMBNAIL_CACHE_SOURCE_METADATA:
+            queryset = queryset.select_related('metadata')
+        for source in queryset:
+            sources[(storage_hash, source.name)] = source
+    for thumbnailer in thumbnailers:
+        # Assigned before working out the thumbnail names, which may depend on
+        # the source reference (such as the content hash it records).
+        thumbnailer._source_cache = sources.get((
+            utils.get_storage_hash(thumbnailer.source_storage),
+            thumbnailer.name))
+
+    # Work out which thumbnail names will be looked up.
+    thumbnail_names = None
+    if aliases is not None:
+        thumbnail_names = []
+        for thumbnailer in thumbnailers:
+            names = set()
+            for alias in aliases:
+                options = all_aliases.get(
+                    alias, target=thumbnailer.alias_target)
+                if not options:
+                    continue
+                options = thumbnailer.get_options(dict(options, ALIAS=alias))
+                for transparent in (False, True):
+                    names.add(thumbnailer.get_thumbnail_name(
+                        options, transparent=transparent))
+            thumbnail_names.append(names)
+
+    # Load the thumbnail references in a single query.
+    thumbnail_caches = {}
+    if sources:
+        queryset = models.Thumbnail.objects.filter(
+            source__in=[source.pk for source in sources.values()])
+        if thumbnail_names is not None:
+            queryset = queryset.filter(
+                name__in=set().union(*thumbnail_names))
+        if settings.THUMBNAIL_CACHE_DIMENSIONS:
+            queryset = queryset.select_related('dimensions')
+        for thumbnail in queryset:
+            source_thumbnails = thumbnail_caches.setdefault(
+                thumbnail.source_id, {})
+            source_thumbnails[(thumbnail.storage_hash, thumbnail.name)] = (
+                thumbnail)
+
+    for i, thumbnailer in enumerate(thumbnailers):
+        source = thumbnailer._source_cache
+        source_thumbnails = thumbnail_caches.get(source.pk, {}) if source else {}
+        thumbnail_storage_hash = utils.get_storage_hash(
+            thumbnailer.thumbnail_storage)
+        if thumbnail_names is None:
+            prefetched = {
+                name: thumbnail
+                for (storage_hash, name), thumbnail in source_thumbnails.items()
+                if storage_hash == thumbnail_storage_hash}
+        else:
+            prefetched = {
+                name: source_thumbnails.get((thumbnail_storage_hash, name))
+                for name in thumbnail_names[i]}
+        thumbnailer._prefetched_thumbnails = prefetched
+        thumbnailer._prefetched_all_thumbnails = thumbnail_names is None
+    return objects
 
 
 def database_get_image_dimensions(file, close=False, dimensions=None):
@@ -99,7 +219,8 @@ def database_get_image_dimensions(file, close=False, dimensions=None):
     state.
 
     Will attempt to get the dimensions from the file itself if they aren't
-    in the db.
+    in the db, only reading the image's header for the common formats (see
+    ``easy_thumbnails.probe.get_image_dimensions``).
     """
     storage_hash = utils.get_storage_hash(file.storage)
     dimensions = None
@@ -116,7 +237,15 @@ def database_get_image_dimensions(file, close=False, dimensions=None):
             dimensions_cache = None
         if dimensions_cache:
             return dimensions_cache.width, dimensions_cache.height
-    if os.path.splitext(file.file.name)[1] == '.svg':
+    if file.closed:
+        file.open()
+    # Read the dimensions from the image's header, only parsing (or, for
+    # SVGs, rendering) the whole file if that fails.
+    dimensions = probe.get_image_dimensions(file)
+    if dimensions:
+        if close:
+            file.close()
+    elif os.path.splitext(file.file.name)[1] == '.svg':
         from easy_thumbnails.VIL.Image import load
         dimensions = load(file.path).size
     else:
@@ -167,6 +296,9 @@ class ThumbnailFile(ImageFieldFile):
         elif not isinstance(thumbnail_options, ThumbnailOptions):
             thumbnail_options = ThumbnailOptions(thumbnail_options)
         self.thumbnail_options = thumbnail_options
+        #: Thumbnails of the same image in other (preferred) formats, see the
+        #: ``formats`` thumbnail option.
+        self.alternatives = []
 
     def save(self, *args, **kwargs):
         # Can't save a ``ThumbnailFile`` directly.
@@ -220,7 +352,9 @@ class ThumbnailFile(ImageFieldFile):
 
         :param use_size: Whether to get the size of the thumbnail image for use
             in the tag attributes. If ``None`` (default), the size will only
-            be used it if won't result in a remote file retrieval.
+            be used it if won't result in a remote file retrieval. Only the
+            header of the image is read to find its size, unless the size is
+            already cached.
 
         All other keyword parameters are added as (properly escaped) extra
         attributes to the `img` tag.
@@ -242,6 +376,35 @@ class ThumbnailFile(ImageFieldFile):
                           for key, value in sorted(attrs.items())])
         return mark_safe('<img %s />' % attrs)
 
+    def picture(self, alt='', use_size=None, **attrs):
+        """
+        Return a ``<picture>`` element containing a ``<source>`` for each of
+        the thumbnail's :attr:`alternatives` (in other formats), followed by
+        this thumbnail's :meth:`tag`.
+
+        The arguments are passed on to :meth:`tag`.
+        """
+        sources = []
+        for alternative in self.alternatives:
+            source_attrs = {'srcset': alternative.url}
+            mime_type = alternative.mime_type
+            if mime_type:
+                source_attrs['type'] = mime_type
+            sources.append('<source %s />' % ' '.join([
+                '%s="%s"' % (key, escape(value))
+                for key, value in sorted(source_attrs.items())]))
+        img = self.tag(alt=alt, use_size=use_size, **attrs)
+        return mark_safe('<picture>%s%s</picture>' % (''.join(sources), img))
+
+    @property
+    def mime_type(self):
+        """
+        The MIME type of the thumbnail, from its extension.
+        """
+        Image.init()
+        extension = os.path.splitext(self.name)[1].lower()
+        return Image.MIME.get(Image.EXTENSION.get(extension))
+
     def _get_file(self):
         self._require_file()
         if not hasattr(self, '_file') or self._file is None:
@@ -268,10 +431,9 @@ class ThumbnailFile(ImageFieldFile):
 
     def _get_image_dimensions(self):
         if not hasattr(self, '_dimensions_cache'):
-            close = self.closed
-            self.open()
+            # The file is only opened if the dimensions aren't cached.
             self._dimensions_cache = database_get_image_dimensions(
-                self, close=close)
+                self, close=self.closed)
         return self._dimensions_cache
 
     def set_image_dimensions(self, thumbnail):
@@ -364,9 +526,23 @@ class Thumbnailer(File):
         Return an unsaved ``ThumbnailFile`` containing a thumbnail image.
 
         The thumbnail image is generated using the ``thumbnail_options``
-        dictionary.
+        dictionary. If ``THUMBNAIL_PASSTHROUGH`` is set and the source image
+        already satisfies these options, the thumbnail is a copy of the source
+        file instead.
         """
         thumbnail_options = self.get_options(thumbnail_options)
+        self._check_size(thumbnail_options)
+        thumbnail = self._passthrough_thumbnails([thumbnail_options])[0]
+        if thumbnail:
+            return thumbnail
+        image = self._generate_source_image(
+            thumbnail_options, silent_template_exception)
+        return self._render_thumbnail(image, thumbnail_options)
+
+    def _check_size(self, thumbnail_options):
+        """
+        Raise an ``EasyThumbnailsError`` if the requested size is invalid.
+        """
         orig_size = thumbnail_options['size']  # remember original size
         # Size sanity check.
         min_dim, max_dim = 0, 0
@@ -380,13 +556,44 @@ class Thumbnailer(File):
             msg = "The source image has an invalid size ({0}x{1})"
             raise exceptions.EasyThumbnailsError(msg.format(*orig_size))
 
-        image = engine.generate_source_image(
-            self, thumbnail_options, self.source_generators,
-            fail_silently=silent_template_exception)
+    def _generate_source_image(self, thumbnail_options,
+                               silent_template_exception=False):
+        """
+        Return the source image generated from this file, raising an
+        ``InvalidImageFormatError`` if it doesn't appear to be an image.
+
+        The source image's metadata is cached at the same time, if
+        ``THUMBNAIL_CACHE_SOURCE_METADATA`` is set and it isn't already.
+        """
+        cache_metadata = (
+            settings.THUMBNAIL_CACHE_SOURCE_METADATA and
+            not self.remote_source and not self.get_source_metadata())
+        was_closed = cache_metadata and self.closed
+        if was_closed:
+            # Keep the file open, so it's only opened once to decode the image
+            # and read its metadata.
+            try:
+                self.open()
+            except Exception:
+                pass
+        try:
+            image = engine.generate_source_image(
+                self, thumbnail_options, self.source_generators,
+                fail_silently=silent_template_exception)
+            if image is not None and cache_metadata:
+                self.cache_source_metadata(self)
+        finally:
+            if was_closed:
+                self.close()
         if image is None:
             msg = "The source file does not appear to be an image: '{name}'"
             raise exceptions.InvalidImageFormatError(msg.format(name=self.name))
+        return image
 
+    def _render_thumbnail(self, image, thumbnail_options):
+        """
+        Process a source image into an unsaved ``ThumbnailFile``.
+        """
         thumbnail_image = engine.process_image(image, thumbnail_options,
                                                self.thumbnail_processors)
         filename = self.get_thumbnail_name(
@@ -397,24 +604,102 @@ class Thumbnailer(File):
 
         if os.path.splitext(self.name)[1][1:].lower() == 'svg':
             img = engine.save_svg_image(thumbnail_image, filename=filename)
+            # S3 requires the data as bytes.
+            data = ContentFile(img.read().encode())
         else:
             img = engine.save_pil_image(
                 thumbnail_image, filename=filename, quality=quality,
                 subsampling=subsampling, keep_icc_profile=thumbnail_options.get('keep_icc_profile', False))
-        data = img.read()
-
-        # S3 requires the data as bytes.
-        if not isinstance(data, bytes):
-            data = data.encode()
+            # Hand the encoded buffer over as it is, rather than copying it.
+            data = File(img)
 
         thumbnail = ThumbnailFile(
-            filename, file=ContentFile(data), storage=self.thumbnail_storage,
+            filename, storage=self.thumbnail_storage,
             thumbnail_options=thumbnail_options)
+        thumbnail.file = data
         thumbnail.image = thumbnail_image
         thumbnail._committed = False
 
         return thumbnail
 
+    def _passthrough_thumbnails(self, thumbnail_options_list):
+        """
+        Return a list of unsaved ``ThumbnailFile`` instances containing a copy
+        of the source file, one for each set of options in
+        ``thumbnail_options_list`` (or ``None`` for options which the source
+        image doesn't already satisfy, see ``THUMBNAIL_PASSTHROUGH``).
+
+        The source image is checked from its header, without decoding it.
+        """
+        thumbnails = [None] * len(thumbnail_options_list)
+        if not settings.THUMBNAIL_PASSTHROUGH:
+            return thumbnails
+        candidates = list(range(len(thumbnail_options_list)))
+        metadata = self.get_source_metadata()
+        if metadata:
+            # Rule out sources which don't fit without opening the file.
+            if metadata.frames > 1:
+                return thumbnails
+            candidates = [
+                i for i in candidates if utils.fits_within(
+                    metadata.oriented_size, thumbnail_options_list[i]['size'])]
+        if not candidates:
+            return thumbnails
+        # Other source generators may not give the image as it is stored.
+        from easy_thumbnails.source_generators import pil_image
+        generators = self.source_generators
+        if generators is None:
+            generators = engine.get_pipeline().generators
+        if not generators or utils.get_callable(generators[0]) is not pil_image:
+            return thumbnails
+        if self.thumbnail_processors is None:
+            pipeline = engine.get_pipeline()
+        else:
+            pipeline = engine.Pipeline(self.thumbnail_processors)
+
+        was_closed = self.closed
+        try:
+            try:
+                self.open()
+                # Only the image's header is read.
+                image = Image.open(self)
+            except Exception:
+                return thumbnails
+            if getattr(image, 'is_animated', False):
+                return thumbnails
+            transparent = utils.is_transparent(image)
+            orientation = utils.get_exif_orientation(image)
+            Image.init()
+            data = None
+            for i in candidates:
+                thumbnail_options = thumbnail_options_list[i]
+                if (thumbnail_options.get('exif_orientation', True) and
+                        orientation not in (None, 1)):
+                    continue
+                if pipeline.get_processors(image, thumbnail_options):
+                    continue
+                filename = self.get_thumbnail_name(
+                    thumbnail_options, transparent=transparent)
+                extension = os.path.splitext(filename)[1].lower()
+                if Image.EXTENSION.get(extension) != image.format:
+                    continue
+                if data is None:
+                    # The source image fits within the thumbnail, so it's no
+                    # larger than an encoded thumbnail kept in memory.
+                    self.seek(0)
+                    data = self.read()
+                thumbnail = ThumbnailFile(
+                    filename, storage=self.thumbnail_storage,
+                    thumbnail_options=thumbnail_options)
+                thumbnail.file = ContentFile(data)
+                thumbnail._dimensions_cache = image.size
+                thumbnail._committed = False
+                thumbnails[i] = thumbnail
+        finally:
+            if was_closed:
+                self.close()
+        return thumbnails
+
     def get_thumbnail_name(self, thumbnail_options, transparent=False):
         """
         Return a thumbnail filename for the given ``thumbnail_options``
@@ -430,7 +715,13 @@ class Thumbnailer(File):
         path = path.lstrip('/')
         source_extension = os.path.splitext(source_filename)[1][1:].lower()
         preserve_extensions = self.thumbnail_preserve_extensions
-        if preserve_extensions is True or isinstance(preserve_extensions, (list, tuple)) and \
+        output_format = (thumbnail_options.get('format') or '').lower()
+        if output_format and not (
+                transparent and output_format in ('jpg', 'jpeg')):
+            # JPEG has no transparency layer, so transparent thumbnails are
+            # still saved with the transparency extension.
+            extension = output_format
+        elif preserve_extensions is True or isinstance(preserve_extensions, (list, tuple)) and \
                 source_extension in preserve_extensions:
             extension = source_extension
         elif transparent:
@@ -446,10 +737,11 @@ class Thumbnailer(File):
         basedir = self.thumbnail_basedir % data
         subdir = self.thumbnail_subdir % data
 
-        if isinstance(self.thumbnail_namer, str):
-            namer_func = import_string(self.thumbnail_namer)
-        else:
-            namer_func = self.thumbnail_namer
+        namer_func = utils.get_callable(self.thumbnail_namer)
+        if getattr(namer_func, 'content_addressed', False):
+            # Thumbnails of identical sources are shared, wherever the sources
+            # are stored.
+            path = ''
         filename = namer_func(
             thumbnailer=self,
             source_filename=source_filename,
@@ -503,14 +795,52 @@ class Thumbnailer(File):
         The new thumbnail image is generated using the ``thumbnail_options``
         dictionary. If the ``save`` argument is ``True`` (default), the
         generated thumbnail will be saved too.
+
+        If ``THUMBNAIL_GENERATION_LOCK`` is set, only one process at a time
+        generates and saves a missing thumbnail. Other processes requesting it
+        either wait for that thumbnail or return ``None``, depending on
+        ``THUMBNAIL_GENERATION_LOCK_WAIT``. ``None`` is also returned if the
+        wait times out, so callers need to handle it even when generating.
+
+        If the options include a list of output ``formats``, a thumbnail is
+        returned in the last (fallback) format, with the thumbnails in the
+        other formats as its ``alternatives`` (see
+        :meth:`get_many_thumbnails`).
         """
         thumbnail_options = self.get_options(thumbnail_options)
         if generate is None:
             generate = self.generate
+        if thumbnail_options.get('formats'):
+            return self.get_many_thumbnails(
+                [thumbnail_options], save=save, generate=generate,
+                silent_template_exception=silent_template_exception)[0]
 
         thumbnail = self.get_existing_thumbnail(thumbnail_options)
+        if thumbnail and generate and save:
+            self._reference_shared_thumbnails()
         if not thumbnail:
-            if generate:
+            lock = generate and save and self.get_generation_lock(
+                thumbnail_options)
+            if lock:
+                if lock.acquire(
+                        blocking=settings.THUMBNAIL_GENERATION_LOCK_WAIT):
+                    try:
+                        # Another process may have generated the thumbnail
+                        # while this one was waiting for the lock.
+                        thumbnail = self.get_existing_thumbnail(
+                            thumbnail_options)
+                        if not thumbnail:
+                            thumbnail = self.generate_thumbnail(
+                                thumbnail_options,
+                                silent_template_exception=(
+                                    silent_template_exception))
+                            self.save_thumbnail(thumbnail)
+                    finally:
+                        lock.release()
+                else:
+                    signals.thumbnail_missed.send(
+                        sender=self, options=thumbnail_options)
+            elif generate:
                 thumbnail = self.generate_thumbnail(
                     thumbnail_options,
                     silent_template_exception=silent_template_exception)
@@ -522,6 +852,226 @@ class Thumbnailer(File):
 
         return thumbnail
 
+    def get_generation_lock(self, thumbnail_options):
+        """
+        Return the lock guarding generation of the thumbnail for a set of
+        thumbnail options, or ``None`` if generation locking is disabled (see
+        ``THUMBNAIL_GENERATION_LOCK``).
+        """
+        thumbnail_options = self.get_options(thumbnail_options)
+        return locks.get_generation_lock('%s:%s' % (
+            utils.get_storage_hash(self.thumbnail_storage),
+            self.get_thumbnail_name(thumbnail_options)))
+
+    def get_many_thumbnails(self, thumbnail_options_list, save=True,
+                            generate=None, silent_template_exception=False):
+        """
+        Return a list of ``ThumbnailFile`` instances (or ``None`` for any
+        thumbnail which doesn't exist and wasn't generated), one for each
+        dictionary of options in ``thumbnail_options_list``.
+
+        This behaves like calling :meth:`get_thumbnail` for each set of
+        options (including taking each missing thumbnail's generation lock),
+        except that the source image is only read and decoded once for all of
+        the thumbnails which need to be generated. It is first reduced to the
+        smallest size which still covers each of these thumbnails, and each
+        thumbnail is then processed from that image.
+
+        Options with a list of output ``formats`` (in order of preference,
+        ending with a widely supported fallback format such as ``'jpg'``)
+        give a thumbnail in each format which Pillow can save. The fallback
+        thumbnail is returned, with the others in its ``alternatives`` list.
+        The ``formats`` can also be a dictionary, mapping each format to any
+        options which override the thumbnail options for that format (such as
+        a different ``quality``).
+        """
+        if generate is None:
+            generate = self.generate
+        all_options = [
+            self.get_options(thumbnail_options)
+            for thumbnail_options in thumbnail_options_list]
+        if not any(thumbnail_options.get('formats')
+                   for thumbnail_options in all_options):
+            thumbnails, missed = self._get_many_thumbnails(
+                all_options, save, generate, silent_template_exception)
+            for i in sorted(missed):
+                signals.thumbnail_missed.send(
+                    sender=self, options=all_options[i])
+            return thumbnails
+
+        # Generate the thumbnails for every format together, then group them
+        # again.
+        format_options = [
+            self._get_format_options(thumbnail_options)
+            for thumbnail_options in all_options]
+        format_thumbnails, missed = self._get_many_thumbnails(
+            [options for options_list in format_options
+             for options in options_list],
+            save, generate, silent_template_exception)
+        thumbnails = []
+        start = 0
+        for thumbnail_options, options_list in zip(
+                all_options, format_options):
+            end = start + len(options_list)
+            group = format_thumbnails[start:end]
+            if missed.intersection(range(start, end)):
+                # Only signal the miss once for all of the formats.
+                signals.thumbnail_missed.send(
+                    sender=self, options=thumbnail_options)
+            start = end
+            thumbnail = group.pop()
+            if thumbnail:
+                thumbnail.alternatives = [
+                    alternative for alternative in group if alternative]
+            thumbnails.append(thumbnail)
+        return thumbnails
+
+    def _get_many_thumbnails(self, all_options, save, generate,
+                             silent_template_exception):
+        """
+        Return the thumbnails for a list of thumbnail options (each without
+        any ``formats``) along with the set of indexes of the thumbnails which
+        are missing and weren't generated.
+        """
+        thumbnails = [
+            self.get_existing_thumbnail(thumbnail_options)
+            for thumbnail_options in all_options]
+        missing = [i for i, thumbnail in enumerate(thumbnails) if not thumbnail]
+        if generate and save:
+            self._reference_shared_thumbnails()
+        if not missing or not generate:
+            return thumbnails, set(missing)
+
+        missed = set()
+        held = []
+        try:
+            if save:
+                missing = self._acquire_generation_locks(
+                    all_options, missing, thumbnails, missed, held)
+            for i in missing:
+                self._check_size(all_options[i])
+            passthrough = self._passthrough_thumbnails(
+                [all_options[i] for i in missing])
+            for i, thumbnail in zip(missing, passthrough):
+                thumbnails[i] = thumbnail
+            rendered = [i for i in missing if not thumbnails[i]]
+            for group in self._group_by_source_options(all_options, rendered):
+                source_options = all_options[group[0]]
+                if len(group) > 1:
+                    # The source image is shared by thumbnails of different
+                    # sizes, so don't let the source generators reduce it for
+                    # any single one.
+                    source_options = ThumbnailOptions(source_options)
+                    del source_options['size']
+                image = self._generate_source_image(
+                    source_options, silent_template_exception)
+                image = engine.reduce_image(
+                    image, [all_options[i] for i in group])
+                for i in group:
+                    thumbnails[i] = self._render_thumbnail(
+                        image, all_options[i])
+            if save and missing:
+                self.save_thumbnails([thumbnails[i] for i in missing])
+        finally:
+            for lock in held:
+                lock.release()
+        return thumbnails, missed
+
+    def _group_by_source_options(self, all_options, indexes):
+        """
+        Group the indexes of the thumbnails which can share a decoded source
+        image, returning a list of index lists.
+
+        Thumbnails are grouped by every option other than their size and the
+        options only used by the image processors or when saving, since the
+        rest (such as ``exif_orientation``) may change how the source
+        generators decode the source image.
+        """
+        if self.thumbnail_processors is None:
+            processors = engine.get_pipeline().processors
+        else:
+            processors = engine.Pipeline(self.thumbnail_processors).processors
+        generators = self.source_generators
+        if generators is None:
+            generators = engine.get_pipeline().generators
+        generator_options = set().union(*(
+            engine.get_valid_options(utils.get_callable(generator))
+            for generator in generators))
+        ignored = set(['size', 'quality', 'subsampling', 'format']).union(
+            *(engine.get_valid_options(processor)
+              for processor in processors))
+        ignored -= generator_options
+        groups = []
+        for i in indexes:
+            source_options = dict(
+                (key, value) for key, value in all_options[i].items()
+                if key not in ignored)
+            for group_options, group in groups:
+                if group_options == source_options:
+                    group.append(i)
+                    break
+            else:
+                groups.append((source_options, [i]))
+        return [group for group_options, group in groups]
+
+    def _acquire_generation_locks(self, all_options, missing, thumbnails,
+                                  missed, held):
+        """
+        Acquire the generation lock of each missing thumbnail (see
+        :meth:`get_generation_lock`), appending them to ``held``.
+
+        Thumbnails whose lock couldn't be acquired are added to ``missed``,
+        and any generated by another process while waiting are filled in to
+        ``thumbnails``. Returns the indexes of the thumbnails which still need
+        to be generated.
+        """
+        names = {}
+        for i in missing:
+            names.setdefault(
+                self.get_thumbnail_name(all_options[i]), []).append(i)
+        # Always lock in the same order, so that processes generating
+        # overlapping sets of thumbnails can't deadlock.
+        for name in sorted(names):
+            indexes = names[name]
+            lock = self.get_generation_lock(all_options[indexes[0]])
+            if not lock:
+                return missing
+            if lock.acquire(blocking=settings.THUMBNAIL_GENERATION_LOCK_WAIT):
+                held.append(lock)
+            else:
+                missed.update(indexes)
+        # Another process may have generated some of the thumbnails while
+        # this one was waiting for their locks.
+        missing = [i for i in missing if i not in missed]
+        for i in missing:
+            thumbnails[i] = self.get_existing_thumbnail(all_options[i])
+        return [i for i in missing if not thumbnails[i]]
+
+    def _get_format_options(self, thumbnail_options):
+        """
+        Return a list of thumbnail options for each output format listed in
+        the ``formats`` option which Pillow can save, ending with the fallback
+        format.
+        """
+        formats = thumbnail_options.get('formats')
+        thumbnail_options = ThumbnailOptions(thumbnail_options)
+        thumbnail_options.pop('formats', None)
+        if isinstance(formats, str):
+            formats = formats.split(',')
+        if not isinstance(formats, dict):
+            formats = dict.fromkeys(formats or ())
+        Image.init()
+        options_list = []
+        for output_format, format_options in formats.items():
+            output_format = output_format.strip().lower()
+            if Image.EXTENSION.get('.' + output_format) not in Image.SAVE:
+                continue
+            options = ThumbnailOptions(
+                thumbnail_options, **(format_options or {}))
+            options['format'] = output_format
+            options_list.append(options)
+        return options_list or [thumbnail_options]
+
     def save_thumbnail(self, thumbnail):
         """
         Save a thumbnail to the thumbnail_storage.
@@ -529,56 +1079,159 @@ class Thumbnailer(File):
         Also triggers the ``thumbnail_created`` signal and caches the
         thumbnail values and dimensions for future lookups.
         """
-        filename = thumbnail.name
-        try:
-            self.thumbnail_storage.delete(filename)
-        except Exception:
-            pass
-        self.thumbnail_storage.save(filename, thumbnail)
+        self.save_thumbnails([thumbnail])
 
-        thumb_cache = self.get_thumbnail_cache(
-            thumbnail.name, create=True, update=True)
+    def save_thumbnails(self, thumbnails):
+        """
+        Save several thumbnails to the thumbnail_storage, like
+        :meth:`save_thumbnail`.
+
+        The cached references to the source and all of the thumbnails (and
+        their dimensions) are written with at most three queries on databases
+        which support ``INSERT ... ON CONFLICT`` upserts.
+        """
+        for thumbnail in thumbnails:
+            self._save_thumbnail_file(thumbnail)
+        self._update_thumbnail_cache(thumbnails)
+        for thumbnail in thumbnails:
+            signals.thumbnail_created.send(sender=thumbnail)
+
+    def _save_thumbnail_file(self, thumbnail):
+        filename = thumbnail.name
+        capabilities = utils.get_storage_capabilities(self.thumbnail_storage)
+        if capabilities['local']:
+            self._replace_local_file(thumbnail)
+        else:
+            if not capabilities['overwrite']:
+                # Stop the storage from saving the thumbnail under a new name.
+                try:
+                    self.thumbnail_storage.delete(filename)
+                except Exception:
+                    pass
+            self.thumbnail_storage.save(filename, thumbnail)
+        existence_cache.delete(
+            existence_cache.thumbnail_key(self.thumbnail_storage, filename))
+
+    def _update_thumbnail_cache(self, thumbnails):
+        """
+        Create or update the cached references to newly saved thumbnails (and
+        their source).
+        """
+        if self.remote_source or not thumbnails:
+            return
+        modified = timezone.now()
+        source = getattr(self, '_source_cache', None)
+        if not source:
+            source = models.Source.objects.upsert_files(
+                self.source_storage, [self.name], modified)[0]
+            self._source_cache = source
+        thumb_caches = models.Thumbnail.objects.upsert_files(
+            self.thumbnail_storage,
+            [thumbnail.name for thumbnail in thumbnails], modified,
+            source=source)
+        prefetched = getattr(self, '_prefetched_thumbnails', None)
+        if prefetched is not None:
+            for thumb_cache in thumb_caches:
+                prefetched[thumb_cache.name] = thumb_cache
 
         # Cache thumbnail dimensions.
         if settings.THUMBNAIL_CACHE_DIMENSIONS:
-            dimensions_cache, created = (
-                models.ThumbnailDimensions.objects.get_or_create(
-                    thumbnail=thumb_cache,
-                    defaults={'width': thumbnail.width,
-                              'height': thumbnail.height}))
-            if not created:
-                dimensions_cache.width = thumbnail.width
-                dimensions_cache.height = thumbnail.height
-                dimensions_cache.save()
-
-        signals.thumbnail_created.send(sender=thumbnail)
+            models.ThumbnailDimensions.objects.upsert([
+                models.ThumbnailDimensions(
+                    thumbnail=thumb_cache, width=thumbnail.width,
+                    height=thumbnail.height)
+                for thumbnail, thumb_cache in zip(thumbnails, thumb_caches)])
+
+    def _replace_local_file(self, thumbnail):
+        """
+        Write a thumbnail to a temporary file next to its final location in a
+        local storage, then move it into place (replacing any existing file).
+
+        Readers never see a missing or partially written thumbnail, and the
+        storage can't save it under a different name.
+        """
+        storage = self.thumbnail_storage
+        path = storage.path(thumbnail.name)
+        directory, filename = os.path.split(path)
+        utils.make_directories(
+            directory, getattr(storage, 'directory_permissions_mode', None))
+        temp_path = os.path.join(
+            directory, '.{}.{}'.format(uuid.uuid4().hex, filename))
+        try:
+            # Create the file with the usual permissions (subject to the
+            # umask), unlike tempfile which only lets its owner read it.
+            fd = os.open(
+                temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL |
+                getattr(os, 'O_BINARY', 0), 0o666)
+            with os.fdopen(fd, 'wb') as f:
+                buffer = getattr(thumbnail.file, 'file', None)
+                if hasattr(buffer, 'getbuffer'):
+                    # Write the encoded thumbnail without copying it.
+                    f.write(buffer.getbuffer())
+                else:
+                    for chunk in thumbnail.chunks():
+                        f.write(chunk)
+            permissions_mode = getattr(storage, 'file_permissions_mode', None)
+            if permissions_mode is not None:
+                os.chmod(temp_path, permissions_mode)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
 
     def thumbnail_exists(self, thumbnail_name):
         """
         Calculate whether the thumbnail already exists and that the source is
         not newer than the thumbnail.
 
-        If the source and thumbnail file storages are local, their file
+        If the source and thumbnail file storages are local (or declare the
+        ``use_modified_time`` capability, see
+        :func:`easy_thumbnails.utils.get_storage_capabilities`), their file
         modification times are used. Otherwise the database cached modification
         times are used.
+
+        Results are cached for ``THUMBNAIL_EXISTENCE_CACHE_TIMEOUT`` seconds
+        (if set), keyed by the storage, the file name and the source's
+        modification time.
         """
         if self.remote_source:
             return False
 
-        if utils.is_storage_local(self.source_storage):
-            source_modtime = utils.get_modified_time(
-                self.source_storage, self.name)
-        else:
-            source = self.get_source_cache()
-            if not source:
-                return False
-            source_modtime = source.modified
-
-        if not source_modtime:
-            return False
+        if getattr(utils.get_callable(self.thumbnail_namer),
+                   'content_addressed', False):
+            return self._content_thumbnail_exists(thumbnail_name)
+
+        source_key = existence_cache.source_key(self.source_storage, self.name)
+        source_modtime = existence_cache.get(source_key)
+        if source_modtime is None:
+            if utils.get_storage_capabilities(
+                    self.source_storage)['use_modified_time']:
+                source_modtime = utils.get_modified_time(
+                    self.source_storage, self.name)
+            else:
+                source = self.get_source_cache()
+                if not source:
+                    return False
+                source_modtime = source.modified
 
-        local_thumbnails = utils.is_storage_local(self.thumbnail_storage)
-        if local_thumbnails:
+            if not source_modtime:
+                return False
+            existence_cache.set(source_key, source_modtime)
+
+        thumbnail_key = existence_cache.thumbnail_key(
+            self.thumbnail_storage, thumbnail_name)
+        cached = existence_cache.get(thumbnail_key)
+        if cached is not None and cached[0] == source_modtime:
+            return cached[1]
+
+        exists = self._thumbnail_exists(thumbnail_name, source_modtime)
+        if exists:
+            existence_cache.set(thumbnail_key, (source_modtime, exists))
+        return exists
+
+    def _thumbnail_exists(self, thumbnail_name, source_modtime):
+        if utils.get_storage_capabilities(
+                self.thumbnail_storage)['use_modified_time']:
             thumbnail_modtime = utils.get_modified_time(
                 self.thumbnail_storage, thumbnail_name)
             if not thumbnail_modtime:
@@ -594,6 +1247,101 @@ class Thumbnailer(File):
             return thumbnail
         return False
 
+    def _content_thumbnail_exists(self, thumbnail_name):
+        """
+        Return whether a content-addressed thumbnail exists.
+
+        These thumbnails depend only on the source file's contents, so they
+        are up to date whichever source they were generated from. Nothing is
+        written while checking: a thumbnail which was generated from another
+        source is remembered, and a reference to it from this source is only
+        cached (so that it isn't deleted along with the other source) by
+        :meth:`get_thumbnail` when it's allowed to generate thumbnails.
+        """
+        thumbnail_key = existence_cache.thumbnail_key(
+            self.thumbnail_storage, thumbnail_name)
+        cached = existence_cache.get(thumbnail_key)
+        source = self.get_source_cache()
+        if source and cached is not None and cached[0] == source.pk:
+            return cached[1]
+
+        reference = source and self.get_thumbnail_cache(thumbnail_name)
+        if utils.get_storage_capabilities(
+                self.thumbnail_storage)['use_modified_time']:
+            if not utils.get_modified_time(
+                    self.thumbnail_storage, thumbnail_name):
+                return False
+        elif not reference and not models.Thumbnail.objects.filter(
+                storage_hash=utils.get_storage_hash(self.thumbnail_storage),
+                name=thumbnail_name).exists():
+            return False
+        if not reference:
+            if not hasattr(self, '_shared_thumbnails'):
+                self._shared_thumbnails = set()
+            self._shared_thumbnails.add(thumbnail_name)
+            return True
+        existence_cache.set(thumbnail_key, (source.pk, reference))
+        return reference
+
+    def _reference_shared_thumbnails(self):
+        """
+        Cache references from this source to the content-addressed thumbnails
+        found which were generated from other sources with the same contents.
+        """
+        names = getattr(self, '_shared_thumbnails', None)
+        if not names or self.remote_source:
+            return
+        self._shared_thumbnails = set()
+        thumb_caches = models.Thumbnail.objects.upsert_files(
+            self.thumbnail_storage, sorted(names), timezone.now(),
+            source=self.get_source_cache(create=True))
+        prefetched = getattr(self, '_prefetched_thumbnails', None)
+        if prefetched is not None:
+            for thumb_cache in thumb_caches:
+                prefetched[thumb_cache.name] = thumb_cache
+
+    def get_content_hash(self):
+        """
+        Return the SHA-256 hex digest of the source file's contents.
+
+        The hash is recorded on the source's cache entry, and only read from
+        the file again once it changes (according to its modification time,
+        for storages which provide one, or when it's saved through a
+        thumbnailer field).
+        """
+        if getattr(self, '_content_hash', None):
+            return self._content_hash
+        source = self.get_source_cache()
+        content_hash = source.content_hash if source else ''
+        use_modified_time = utils.get_storage_capabilities(
+            self.source_storage)['use_modified_time']
+        if content_hash and use_modified_time:
+            modified = utils.get_modified_time(self.source_storage, self.name)
+            if modified and modified > source.modified:
+                content_hash = ''
+        if not content_hash:
+            if self.closed and not self.remote_source:
+                # Open the file from the storage, rather than reopening a
+                # closed file object which may refer to a previous file.
+                with self.source_storage.open(self.name) as source_file:
+                    content_hash = utils.get_content_hash(source_file)
+            else:
+                was_closed = self.closed
+                self.open()
+                try:
+                    content_hash = utils.get_content_hash(self)
+                finally:
+                    if was_closed:
+                        self.close()
+            if not self.remote_source:
+                # The cached modification time isn't used to check whether
+                # thumbnails are up to date in these storages, so it records
+                # when the hash was read.
+                self.get_source_cache(create=True).save_content_hash(
+                    content_hash, use_modified_time and timezone.now())
+        self._content_hash = content_hash
+        return content_hash
+
     def get_source_cache(self, create=False, update=False):
         if self.remote_source:
             return None
@@ -607,15 +1355,78 @@ class Thumbnailer(File):
             check_cache_miss=self.thumbnail_check_cache_miss)
         return self._source_cache
 
+    def get_source_metadata(self):
+        """
+        Return the cached ``SourceMetadata`` of the source image, or ``None``
+        if it hasn't been cached (or ``THUMBNAIL_CACHE_SOURCE_METADATA`` isn't
+        set).
+
+        Metadata older than the source file's modification time (for storages
+        which provide it) is ignored.
+        """
+        if not settings.THUMBNAIL_CACHE_SOURCE_METADATA or self.remote_source:
+            return None
+        if not hasattr(self, '_source_metadata_cache'):
+            metadata = None
+            source = self.get_source_cache()
+            if source:
+                try:
+                    metadata = source.metadata
+                except models.SourceMetadata.DoesNotExist:
+                    pass
+            if metadata and utils.get_storage_capabilities(
+                    self.source_storage)['use_modified_time']:
+                modified = utils.get_modified_time(
+                    self.source_storage, self.name)
+                if modified and modified > metadata.modified:
+                    metadata = None
+            self._source_metadata_cache = metadata
+        return self._source_metadata_cache
+
+    def cache_source_metadata(self, file):
+        """
+        Read the metadata of the source image from ``file`` and save it to the
+        database, if ``THUMBNAIL_CACHE_SOURCE_METADATA`` is set.
+
+        Returns the ``SourceMetadata``, or ``None`` if the file isn't an image
+        which PIL can identify.
+        """
+        if not settings.THUMBNAIL_CACHE_SOURCE_METADATA or self.remote_source:
+            return None
+        try:
+            values = utils.get_source_metadata(file)
+        except Exception:
+            values = None
+        if not values:
+            return None
+        source = self.get_source_cache(create=True)
+        metadata = models.SourceMetadata.objects.upsert(
+            models.SourceMetadata(source=source, **values))
+        source.metadata = metadata
+        self._source_metadata_cache = metadata
+        return metadata
+
     def get_thumbnail_cache(self, thumbnail_name, create=False, update=False):
         if self.remote_source:
             return None
+        prefetched = getattr(self, '_prefetched_thumbnails', None)
+        if prefetched is not None and not (create or update):
+            # Use the references loaded by prefetch_thumbnails.
+            thumbnail = prefetched.get(thumbnail_name)
+            if thumbnail or (
+                    not self.thumbnail_check_cache_miss and (
+                        thumbnail_name in prefetched or
+                        self._prefetched_all_thumbnails)):
+                return thumbnail
         source = self.get_source_cache(create=True)
         update_modified = (update or create) and timezone.now()
-        return models.Thumbnail.objects.get_file(
+        thumbnail = models.Thumbnail.objects.get_file(
             create=create, update_modified=update_modified,
             storage=self.thumbnail_storage, source=source, name=thumbnail_name,
             check_cache_miss=self.thumbnail_check_cache_miss)
+        if prefetched is not None:
+            prefetched[thumbnail_name] = thumbnail
+        return thumbnail
 
     def open(self, mode=None):
         if self.closed:
@@ -648,13 +1459,24 @@ class ThumbnailerFieldFile(FieldFile, Thumbnailer):
         model.
         """
         super().save(name, content, *args, **kwargs)
-        self.get_source_cache(create=True, update=True)
+        existence_cache.delete(
+            existence_cache.source_key(self.source_storage, self.name))
+        self.__dict__.pop('_source_metadata_cache', None)
+        self._content_hash = None
+        source = self.get_source_cache(create=True, update=True)
+        if source.content_hash:
+            # The file's contents have changed.
+            source.save_content_hash('')
+        self.cache_source_metadata(content)
 
     def delete(self, *args, **kwargs):
         """
         Delete the image, along with any generated thumbnails.
         """
         source_cache = self.get_source_cache()
+        existence_cache.delete(
+            existence_cache.source_key(self.source_storage, self.name))
+        self.__dict__.pop('_source_metadata_cache', None)
         # First, delete any related thumbnails.
         self.delete_thumbnails(source_cache)
         # Next, delete the source image.
@@ -682,10 +1504,15 @@ class ThumbnailerFieldFile(FieldFile, Thumbnailer):
                 # Only attempt to delete the file if it was stored using the
                 # same storage as is currently used.
                 if thumbnail_cache.storage_hash == thumbnail_storage_hash:
-                    self.thumbnail_storage.delete(thumbnail_cache.name)
+                    # Content-addressed thumbnails may still be used by other
+                    # sources.
+                    if not thumbnail_cache.is_shared():
+                        self.thumbnail_storage.delete(thumbnail_cache.name)
+                        deleted += 1
+                    existence_cache.delete(existence_cache.thumbnail_key(
+                        self.thumbnail_storage, thumbnail_cache.name))
                     # Delete the cache thumbnail instance too.
                     thumbnail_cache.delete()
-                    deleted += 1
         return deleted
 
     delete_thumbnails.alters_data = True
@@ -729,6 +1556,14 @@ class ThumbnailerImageFieldFile(ImageFieldFile, ThumbnailerFieldFile):
     thumbnail images.
     """
 
+    def _get_image_dimensions(self):
+        if not hasattr(self, '_dimensions_cache'):
+            # Use the cached source metadata rather than opening the file.
+            metadata = self.get_source_metadata()
+            if metadata:
+                self._dimensions_cache = metadata.size
+        return super()._get_image_dimensions()
+
     def save(self, name, content, *args, **kwargs):
         """
         Save the image.
@@ -741,7 +1576,10 @@ class ThumbnailerImageFieldFile(ImageFieldFile, ThumbnailerFieldFile):
         if options:
             if 'quality' not in options:
                 options['quality'] = self.thumbnail_quality
-            content = Thumbnailer(content, name).generate_thumbnail(options)
+            # The uploaded file isn't in a storage yet, so it mustn't be
+            # cached as a source.
+            content = Thumbnailer(
+                content, name, remote_source=True).generate_thumbnail(options)
             # If the generated extension differs from the original, use it
             # instead.
             orig_name, ext = os.path.splitext(name)
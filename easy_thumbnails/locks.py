@@ -0,0 +1,142 @@
+import os
+import tempfile
+import time
+import uuid
+
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+
+from easy_thumbnails import utils
+from easy_thumbnails.conf import settings
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+def get_generation_lock(key):
+    """
+    Return a lock for generating the thumbnail identified by ``key``, using
+    the backend set in ``THUMBNAIL_GENERATION_LOCK``.
+
+    Returns ``None`` if generation locking is disabled.
+    """
+    backend = settings.THUMBNAIL_GENERATION_LOCK
+    if not backend:
+        return None
+    backend = utils.get_callable(backend)
+    return backend(key, timeout=settings.THUMBNAIL_GENERATION_LOCK_TIMEOUT)
+
+
+class BaseLock:
+    """
+    A lock which stops more than one process from generating the same
+    thumbnail at once.
+
+    Subclasses need to implement :meth:`try_acquire` and :meth:`release`.
+    """
+    #: The number of seconds to sleep between attempts to acquire the lock.
+    poll_interval = 0.1
+
+    def __init__(self, key, timeout=30):
+        self.key = key
+        self.timeout = timeout
+
+    def acquire(self, blocking=True):
+        """
+        Acquire the lock, returning ``True`` if it was acquired.
+
+        If ``blocking`` is ``True``, wait up to ``timeout`` seconds for the
+        lock to become available.
+        """
+        deadline = time.monotonic() + self.timeout
+        while not self.try_acquire():
+            if not blocking or time.monotonic() >= deadline:
+                return False
+            time.sleep(self.poll_interval)
+        return True
+
+    def try_acquire(self):
+        """
+        Try to acquire the lock without waiting, returning ``True`` if it was
+        acquired.
+        """
+        raise NotImplementedError
+
+    def release(self):
+        """
+        Release the lock.
+        """
+        raise NotImplementedError
+
+
+class CacheLock(BaseLock):
+    """
+    A lock stored in a Django cache, shared by every process using the same
+    cache backend.
+
+    The lock expires after ``timeout`` seconds so a process which dies while
+    generating a thumbnail doesn't block the thumbnail forever.
+    """
+    #: The alias of the Django cache to store locks in.
+    cache_alias = 'default'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache_key = 'easy_thumbnails_lock:%s' % (
+            utils.md5_not_used_for_security(
+                self.key.encode('utf8')).hexdigest())
+        self.token = uuid.uuid4().hex
+
+    def try_acquire(self):
+        cache = caches[self.cache_alias]
+        return cache.add(self.cache_key, self.token, timeout=self.timeout)
+
+    def release(self):
+        cache = caches[self.cache_alias]
+        # Don't remove a lock which expired and was acquired by someone else.
+        if cache.get(self.cache_key) == self.token:
+            cache.delete(self.cache_key)
+
+
+class FileLock(BaseLock):
+    """
+    A lock using ``flock`` on a file in a local (or shared) directory, set by
+    ``THUMBNAIL_GENERATION_LOCK_DIR``.
+
+    The lock is released by the operating system if the process holding it
+    dies. Lock files are left in place after being released, since removing
+    them would race with other processes waiting on the same lock. Only
+    available on platforms providing ``fcntl``.
+    """
+
+    def __init__(self, *args, **kwargs):
+        if fcntl is None:
+            raise ImproperlyConfigured(
+                "FileLock requires the fcntl module, which isn't available on "
+                "this platform.")
+        super().__init__(*args, **kwargs)
+        lock_dir = (settings.THUMBNAIL_GENERATION_LOCK_DIR or
+                    os.path.join(tempfile.gettempdir(), 'easy_thumbnails'))
+        os.makedirs(lock_dir, exist_ok=True)
+        self.path = os.path.join(
+            lock_dir, '%s.lock' % utils.md5_not_used_for_security(
+                self.key.encode('utf8')).hexdigest())
+        self.file = None
+
+    def try_acquire(self):
+        lock_file = open(self.path, 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self.file = lock_file
+        return True
+
+    def release(self):
+        if self.file is not None:
+            fcntl.flock(self.file, fcntl.LOCK_UN)
+            self.file.close()
+            self.file = None
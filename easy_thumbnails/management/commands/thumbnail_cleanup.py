@@ -8,9 +8,7 @@ from django.utils.timezone import datetime, timedelta
 
 from easy_thumbnails.conf import settings
 from easy_thumbnails.models import Source
-from easy_thumbnails.storage import get_storage
-from easy_thumbnails.utils import get_storage_hash
-from django.core.files.storage import storages
+from easy_thumbnails.storage import get_storage, get_storage_by_hash
 
 
 class ThumbnailCollectionCleaner:
@@ -59,7 +57,6 @@ class ThumbnailCollectionCleaner:
         if not storage:
             storage = get_storage()
 
-        storage_hash_map = {get_storage_hash(storages[alias]): alias for alias in settings.STORAGES.keys()}
         sources_to_delete = []
         time_start = time.time()
 
@@ -72,8 +69,7 @@ class ThumbnailCollectionCleaner:
             query = query.filter(name__startswith=cleanup_path)
 
         for source in queryset_iterator(query):
-            source_storage_alias = storage_hash_map.get(source.storage_hash)
-            source_storage = storages[source_storage_alias] if source_storage_alias else None
+            source_storage = get_storage_by_hash(source.storage_hash)
             if not source_storage:
                 self.stdout.write(f"Source storage hash ({source.storage_hash}) not found in STORAGES")
                 self.stdout.write("Can't determine source storage, skipping source")
@@ -89,6 +85,10 @@ class ThumbnailCollectionCleaner:
                 sources_to_delete.append(source.id)
 
                 for thumb in source.thumbnails.all():
+                    if thumb.is_shared():
+                        # A content-addressed thumbnail which is still used by
+                        # another source.
+                        continue
                     self.thumbnails_deleted += 1
                     abs_thumbnail_path = self._get_absolute_path(thumb.name, storage)
 
@@ -0,0 +1,226 @@
+import multiprocessing
+import os
+import time
+
+import django
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connections
+from django.db.models import FileField
+
+from easy_thumbnails import signals
+from easy_thumbnails.alias import aliases
+from easy_thumbnails.management.commands.thumbnail_cleanup import (
+    queryset_iterator)
+from easy_thumbnails.queues import get_job_options, get_job_thumbnailer
+from easy_thumbnails.storage import thumbnail_default_storage
+from easy_thumbnails.utils import get_storage_hash
+
+
+def get_target_fields(targets):
+    """
+    Return a list of ``(target, field)`` pairs for each file field matching
+    the given ``app_label``, ``app_label.Model`` or ``app_label.Model.field``
+    targets (or every file field, if no targets are given).
+    """
+    if not targets:
+        targets = [app_config.label for app_config in apps.get_app_configs()]
+    target_fields = []
+    for target in targets:
+        bits = target.split('.')
+        if len(bits) > 3:
+            raise CommandError("Invalid target: {}".format(target))
+        try:
+            app_config = apps.get_app_config(bits[0])
+            if len(bits) > 1:
+                model_list = [app_config.get_model(bits[1])]
+            else:
+                model_list = app_config.get_models()
+        except LookupError as e:
+            raise CommandError(str(e))
+        for model in model_list:
+            for field in model._meta.get_fields():
+                if not isinstance(field, FileField):
+                    continue
+                if len(bits) == 3 and field.name != bits[2]:
+                    continue
+                target_fields.append((
+                    '{}.{}.{}'.format(
+                        model._meta.app_label, model.__name__, field.name),
+                    field))
+        if len(bits) == 3 and not any(
+                name == target for name, field in target_fields):
+            raise CommandError("Invalid file field: {}".format(target))
+    return target_fields
+
+
+def init_worker():
+    """
+    Set up Django in a worker process started with the ``spawn`` method.
+    """
+    if not apps.ready:
+        django.setup()
+
+
+def generate_job(job):
+    """
+    Generate the missing thumbnails for a job, skipping any which are already
+    up to date.
+
+    Returns a tuple of the source file name, the number of thumbnails
+    generated, the number skipped and the error message (if generation
+    failed).
+    """
+    created = set()
+
+    def thumbnail_created(sender, **kwargs):
+        created.add(sender.name)
+
+    close_old_connections()
+    signals.thumbnail_created.connect(thumbnail_created)
+    try:
+        thumbnailer = get_job_thumbnailer(job)
+        options_list = get_job_options(thumbnailer, job)
+        thumbnails = thumbnailer.get_many_thumbnails(
+            options_list, generate=True)
+        generated = sum(
+            1 for thumbnail in thumbnails if thumbnail and any(
+                thumbnail_file.name in created for thumbnail_file in
+                [thumbnail] + thumbnail.alternatives))
+        return (
+            job['name'], generated, len(options_list) - generated, None)
+    except Exception as e:
+        return job['name'], 0, 0, '{}: {}'.format(type(e).__name__, e)
+    finally:
+        signals.thumbnail_created.disconnect(thumbnail_created)
+        close_old_connections()
+
+
+class Command(BaseCommand):
+    help = """ Generates missing or outdated thumbnails for the aliases of the
+    file fields of existing model instances. """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'targets',
+            nargs='*',
+            metavar='app_label[.Model[.field]]',
+            help='The apps, models or file fields to generate thumbnails for '
+                 '(defaults to every file field).')
+        parser.add_argument(
+            '--alias',
+            action='append',
+            dest='aliases',
+            default=[],
+            help='The name of an alias to generate (may be given more than '
+                 'once, defaults to every alias for each field).')
+        parser.add_argument(
+            '--include-global',
+            action='store_true',
+            dest='include_global',
+            default=False,
+            help='Also generate project-wide aliases.')
+        parser.add_argument(
+            '--workers',
+            action='store',
+            dest='workers',
+            default=os.cpu_count() or 1,
+            type=int,
+            help='The number of worker processes (defaults to the number of '
+                 'CPUs).')
+        parser.add_argument(
+            '--chunk-size',
+            action='store',
+            dest='chunk_size',
+            default=10,
+            type=int,
+            help='The number of files sent to a worker process at a time.')
+
+    def handle(self, *args, **options):
+        verbosity = int(options.get('verbosity', 1))
+        workers = max(options['workers'], 1)
+        chunk_size = max(options['chunk_size'], 1)
+        self.files = self.generated = self.skipped = self.failed = 0
+        time_start = time.time()
+
+        pool = None
+        if workers > 1:
+            # Don't share the parent's database connections with the workers.
+            connections.close_all()
+            pool = multiprocessing.Pool(workers, initializer=init_worker)
+        try:
+            for target, field in get_target_fields(options['targets']):
+                items = self.get_items(target, options)
+                if not items:
+                    continue
+                if verbosity > 0:
+                    self.stdout.write("Generating thumbnails for {}".format(
+                        target))
+                batch = []
+                # Keep a bounded number of jobs in flight, rather than letting
+                # the pool consume the whole queryset.
+                batch_size = workers * chunk_size * 4
+                for job in self.get_jobs(target, field, items):
+                    batch.append(job)
+                    if len(batch) >= batch_size:
+                        self.run_batch(pool, batch, chunk_size, verbosity)
+                        batch = []
+                self.run_batch(pool, batch, chunk_size, verbosity)
+        finally:
+            if pool:
+                pool.close()
+                pool.join()
+
+        if verbosity > 0:
+            execution_time = time.time() - time_start
+            self.stdout.write(
+                "Generated {} thumbnails for {} files ({} skipped, {} failed) "
+                "in {:.1f} seconds ({:.1f} files/second).".format(
+                    self.generated, self.files, self.skipped, self.failed,
+                    execution_time, self.files / max(execution_time, 0.001)))
+
+    def get_items(self, target, options):
+        """
+        Return the alias names to generate for a field.
+        """
+        if options['aliases']:
+            return [name for name in options['aliases']
+                    if aliases.get(name, target=target)]
+        return list(aliases.all(
+            target, include_global=options['include_global']))
+
+    def get_jobs(self, target, field, items):
+        """
+        Yield a job for each file stored in a field.
+        """
+        source_storage = get_storage_hash(field.storage)
+        thumbnail_storage = get_storage_hash(
+            getattr(field, 'thumbnail_storage', None) or
+            thumbnail_default_storage)
+        queryset = field.model._default_manager.exclude(
+            **{field.name: ''}).exclude(
+            **{'{}__isnull'.format(field.name): True}).only(
+            'pk', field.name)
+        for instance in queryset_iterator(queryset):
+            yield {
+                'source_storage': source_storage,
+                'thumbnail_storage': thumbnail_storage,
+                'name': getattr(instance, field.attname).name,
+                'target': target,
+                'items': items,
+            }
+
+    def run_batch(self, pool, jobs, chunk_size, verbosity):
+        if pool:
+            results = pool.imap_unordered(generate_job, jobs, chunk_size)
+        else:
+            results = map(generate_job, jobs)
+        for name, generated, skipped, error in results:
+            self.files += 1
+            self.generated += generated
+            self.skipped += skipped
+            if error:
+                self.failed += 1
+                self.stderr.write("Failed: {} ({})".format(name, error))
+            elif generated and verbosity > 1:
+                self.stdout.write("Generated: {}".format(name))
@@ -0,0 +1,62 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from easy_thumbnails.files import Thumbnailer
+from easy_thumbnails.management.commands.thumbnail_cleanup import (
+    queryset_iterator)
+from easy_thumbnails.models import Source
+from easy_thumbnails.storage import get_storage_by_hash
+
+
+class Command(BaseCommand):
+    help = """ Records the content hash of existing source files, used by the
+    content-addressed thumbnail namer (easy_thumbnails.namers.content_hash).
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            dest='all',
+            default=False,
+            help='Hash every source file again, rather than only those '
+                 'without a hash.')
+
+    def handle(self, *args, **options):
+        verbosity = int(options.get('verbosity', 1))
+        hashed = failed = 0
+        time_start = time.time()
+
+        queryset = Source.objects.all()
+        if not options['all']:
+            queryset = queryset.filter(content_hash='')
+        for source in queryset_iterator(queryset):
+            source_storage = get_storage_by_hash(source.storage_hash)
+            if source_storage is None:
+                failed += 1
+                self.stderr.write(
+                    "Failed: {} (unknown storage)".format(source.name))
+                continue
+            thumbnailer = Thumbnailer(
+                name=source.name, source_storage=source_storage)
+            # Use the cache entry which was already loaded, forgetting any
+            # existing hash.
+            source.content_hash = ''
+            thumbnailer._source_cache = source
+            try:
+                content_hash = thumbnailer.get_content_hash()
+            except Exception as e:
+                failed += 1
+                self.stderr.write("Failed: {} ({}: {})".format(
+                    source.name, type(e).__name__, e))
+                continue
+            hashed += 1
+            if verbosity > 1:
+                self.stdout.write("Hashed: {} ({})".format(
+                    source.name, content_hash))
+
+        if verbosity > 0:
+            self.stdout.write(
+                "Hashed {} source files ({} failed) in {:.1f} seconds.".format(
+                    hashed, failed, time.time() - time_start))
@@ -0,0 +1,84 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+from easy_thumbnails.conf import settings
+from easy_thumbnails.queues import get_queue, run_job
+
+
+class Command(BaseCommand):
+    help = """ Generates thumbnails queued by the background generation signal
+    handlers. """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency',
+            action='store',
+            dest='concurrency',
+            type=int,
+            help='The number of jobs to process at once (defaults to the '
+                 'THUMBNAIL_QUEUE_CONCURRENCY setting).')
+        parser.add_argument(
+            '--batch-size',
+            action='store',
+            dest='batch_size',
+            default=100,
+            type=int,
+            help='The number of jobs to claim from the queue at a time.')
+        parser.add_argument(
+            '--interval',
+            action='store',
+            dest='interval',
+            default=5,
+            type=float,
+            help='The number of seconds to wait when the queue is empty.')
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            dest='once',
+            default=False,
+            help='Exit once the queue is empty.')
+
+    def handle(self, *args, **options):
+        concurrency = (
+            options.get('concurrency') or settings.THUMBNAIL_QUEUE_CONCURRENCY)
+        verbosity = int(options.get('verbosity', 1))
+        queue = get_queue()
+        processed = failed = 0
+        executor = None
+        if concurrency > 1:
+            executor = ThreadPoolExecutor(max_workers=concurrency)
+        try:
+            while True:
+                try:
+                    jobs = queue.claim(options['batch_size'])
+                except NotImplementedError:
+                    raise CommandError(
+                        "The %s queue can't be processed by a worker." %
+                        settings.THUMBNAIL_QUEUE)
+                if not jobs:
+                    if options['once']:
+                        break
+                    time.sleep(options['interval'])
+                    continue
+                if executor:
+                    results = list(executor.map(run_job, jobs))
+                else:
+                    results = [run_job(job) for job in jobs]
+                for job, succeeded in zip(jobs, results):
+                    queue.finish(job, succeeded)
+                    if succeeded:
+                        processed += 1
+                    else:
+                        failed += 1
+                        self.stderr.write("Failed: {}".format(job['name']))
+                    if succeeded and verbosity > 1:
+                        self.stdout.write("Generated: {}".format(job['name']))
+        finally:
+            if executor:
+                executor.shutdown()
+        if verbosity > 0:
+            self.stdout.write(
+                "Processed {} jobs ({} failed).".format(
+                    processed + failed, failed))
@@ -0,0 +1,24 @@
+import django.utils.timezone
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('easy_thumbnails', '0002_thumbnaildimensions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ThumbnailJob',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('source_storage_hash', models.CharField(max_length=40)),
+                ('thumbnail_storage_hash', models.CharField(max_length=40, blank=True)),
+                ('name', models.CharField(max_length=255)),
+                ('target', models.CharField(max_length=255, blank=True)),
+                ('items', models.JSONField()),
+                ('created', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
@@ -0,0 +1,26 @@
+import django.utils.timezone
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('easy_thumbnails', '0003_thumbnailjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SourceMetadata',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('source', models.OneToOneField(on_delete=models.CASCADE, related_name='metadata', to='easy_thumbnails.Source')),
+                ('width', models.PositiveIntegerField()),
+                ('height', models.PositiveIntegerField()),
+                ('format', models.CharField(max_length=16, blank=True)),
+                ('mode', models.CharField(max_length=16, blank=True)),
+                ('frames', models.PositiveIntegerField(default=1)),
+                ('orientation', models.PositiveSmallIntegerField(default=1)),
+                ('modified', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
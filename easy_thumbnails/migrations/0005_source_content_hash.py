@@ -0,0 +1,16 @@
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('easy_thumbnails', '0004_sourcemetadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='source',
+            name='content_hash',
+            field=models.CharField(max_length=64, blank=True, db_index=True),
+        ),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import connections, models
 from django.utils import timezone
 
 from easy_thumbnails import utils, signal_handlers
@@ -38,6 +38,43 @@ class FileManager(models.Manager):
 
         return obj
 
+    def upsert_files(self, storage, names, modified, **kwargs):
+        """
+        Create or update the cached references to several files in a
+        storage, setting their modification time.
+
+        Uses a single ``INSERT ... ON CONFLICT`` query on databases which
+        support it (plus a query for the primary keys of updated rows on
+        databases which can't return them), otherwise falls back to
+        :meth:`get_file` for each file.
+
+        Returns a list of the references, in the same order as ``names``.
+        """
+        features = connections[self.db].features
+        if not features.supports_update_conflicts:
+            return [
+                self.get_file(storage, name, create=True,
+                              update_modified=modified, **kwargs)
+                for name in names]
+        storage_hash = utils.get_storage_hash(storage)
+        objs = [
+            self.model(storage_hash=storage_hash, name=name,
+                       modified=modified, **kwargs)
+            for name in names]
+        unique_fields = None
+        if features.supports_update_conflicts_with_target:
+            unique_fields = list(self.model._meta.unique_together[0])
+        self.bulk_create(
+            objs, update_conflicts=True, unique_fields=unique_fields,
+            update_fields=['modified'])
+        if any(obj.pk is None for obj in objs):
+            pks = dict(self.filter(
+                storage_hash=storage_hash, name__in=names,
+                **kwargs).values_list('name', 'pk'))
+            for obj in objs:
+                obj.pk = pks[obj.name]
+        return objs
+
     def _get_thumbnail_manager(self):
         return self
 
@@ -50,6 +87,14 @@ class ThumbnailManager(FileManager):
         return self
 
 
+class SourceManager(FileManager):
+
+    def _get_thumbnail_manager(self):
+        if settings.THUMBNAIL_CACHE_SOURCE_METADATA:
+            return self.select_related("metadata")
+        return self
+
+
 class File(models.Model):
     storage_hash = models.CharField(max_length=40, db_index=True)
     name = models.CharField(max_length=255, db_index=True)
@@ -66,7 +111,20 @@ class File(models.Model):
 
 
 class Source(File):
-    pass
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)
+
+    objects = SourceManager()
+
+    def save_content_hash(self, content_hash, modified=None):
+        """
+        Save the hash of the source file's contents (and optionally a new
+        modification time), without saving any other fields.
+        """
+        self.content_hash = content_hash
+        values = {'content_hash': content_hash}
+        if modified:
+            self.modified = values['modified'] = modified
+        Source.objects.filter(pk=self.pk).update(**values)
 
 
 class Thumbnail(File):
@@ -78,6 +136,37 @@ class Thumbnail(File):
     class Meta:
         unique_together = (('storage_hash', 'name', 'source'),)
 
+    def is_shared(self):
+        """
+        Return whether the same thumbnail file is also referenced by another
+        source (as content-addressed thumbnails can be).
+        """
+        return Thumbnail.objects.filter(
+            storage_hash=self.storage_hash, name=self.name).exclude(
+            source=self.source_id).exists()
+
+
+class ThumbnailDimensionsManager(models.Manager):
+
+    def upsert(self, dimensions):
+        """
+        Save a list of (unsaved) thumbnail dimensions, inserting or updating
+        them with a single query on databases which support it.
+        """
+        features = connections[self.db].features
+        if not features.supports_update_conflicts:
+            for obj in dimensions:
+                self.update_or_create(
+                    thumbnail=obj.thumbnail,
+                    defaults={'width': obj.width, 'height': obj.height})
+            return
+        unique_fields = None
+        if features.supports_update_conflicts_with_target:
+            unique_fields = ['thumbnail']
+        self.bulk_create(
+            dimensions, update_conflicts=True, unique_fields=unique_fields,
+            update_fields=['width', 'height'])
+
 
 class ThumbnailDimensions(models.Model):
     thumbnail = models.OneToOneField(Thumbnail, related_name="dimensions",
@@ -85,6 +174,8 @@ class ThumbnailDimensions(models.Model):
     width = models.PositiveIntegerField(null=True)
     height = models.PositiveIntegerField(null=True)
 
+    objects = ThumbnailDimensionsManager()
+
     def __str__(self):
         return "%sx%s" % (self.width, self.height)
 
@@ -93,5 +184,95 @@ class ThumbnailDimensions(models.Model):
         return self.width, self.height
 
 
+class SourceMetadataManager(models.Manager):
+
+    def upsert(self, metadata):
+        """
+        Save (unsaved) source metadata, inserting or updating it with a single
+        query on databases which support it.
+        """
+        fields = [
+            field.name for field in self.model._meta.concrete_fields
+            if not field.primary_key and field.name != 'source']
+        features = connections[self.db].features
+        if not features.supports_update_conflicts:
+            obj, created = self.update_or_create(
+                source=metadata.source,
+                defaults={name: getattr(metadata, name) for name in fields})
+            return obj
+        unique_fields = None
+        if features.supports_update_conflicts_with_target:
+            unique_fields = ['source']
+        self.bulk_create(
+            [metadata], update_conflicts=True, unique_fields=unique_fields,
+            update_fields=fields)
+        return metadata
+
+
+class SourceMetadata(models.Model):
+    """
+    The properties of a source image, recorded when it is first decoded (or
+    saved through a thumbnailer field) if
+    ``THUMBNAIL_CACHE_SOURCE_METADATA`` is set.
+    """
+    source = models.OneToOneField(Source, related_name="metadata",
+                                  on_delete=models.CASCADE)
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    format = models.CharField(max_length=16, blank=True)
+    mode = models.CharField(max_length=16, blank=True)
+    frames = models.PositiveIntegerField(default=1)
+    orientation = models.PositiveSmallIntegerField(default=1)
+    modified = models.DateTimeField(default=timezone.now)
+
+    objects = SourceMetadataManager()
+
+    def __str__(self):
+        return "%s %sx%s" % (self.format, self.width, self.height)
+
+    @property
+    def size(self):
+        return self.width, self.height
+
+    @property
+    def oriented_size(self):
+        """
+        The size of the image once it has been rotated to match its EXIF
+        orientation.
+        """
+        if self.orientation in (5, 6, 7, 8):
+            return self.height, self.width
+        return self.width, self.height
+
+
+class ThumbnailJob(models.Model):
+    """
+    A queued request to generate thumbnails for a source file, processed by
+    the ``thumbnail_worker`` management command.
+    """
+    source_storage_hash = models.CharField(max_length=40)
+    thumbnail_storage_hash = models.CharField(max_length=40, blank=True)
+    name = models.CharField(max_length=255)
+    target = models.CharField(max_length=255, blank=True)
+    items = models.JSONField()
+    created = models.DateTimeField(default=timezone.now)
+    claimed = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+
+    def __str__(self):
+        return self.name
+
+    def as_job(self):
+        return {
+            'id': self.pk,
+            'source_storage': self.source_storage_hash,
+            'thumbnail_storage': self.thumbnail_storage_hash,
+            'name': self.name,
+            'target': self.target,
+            'items': self.items,
+            'attempts': self.attempts,
+        }
+
+
 models.signals.pre_save.connect(signal_handlers.find_uncommitted_filefields)
 models.signals.post_save.connect(signal_handlers.signal_committed_filefields)
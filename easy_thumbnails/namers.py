@@ -62,3 +62,25 @@ def source_hashed(source_filename, prepared_options, thumbnail_extension,
     options_hash = base64.urlsafe_b64encode(parts_sha[:6]).decode('utf-8')
     return '%s_%s_%s.%s' % (
         source_hash, prepared_options[0], options_hash, thumbnail_extension)
+
+
+def content_hash(thumbnailer, prepared_options, thumbnail_extension,
+                 **kwargs):
+    """
+    Generate a content-addressed thumbnail filename, from a hash of the
+    source file's contents and the options.
+
+    Identical source images share their thumbnails, whatever their names.
+    The filename is placed in a directory named after the first two
+    characters of the hash (rather than the source's directory), for example:
+    ``3f/3f2a9c17d04b6e85a1c2f93e0d7b5a64.100x100_q85_crop.jpg``.
+    """
+    source_hash = thumbnailer.get_content_hash()[:32]
+    return '%s/%s.%s.%s' % (
+        source_hash[:2], source_hash, '_'.join(prepared_options),
+        thumbnail_extension)
+
+
+# Thumbnails named by content don't depend on the source file's name (or its
+# modification time), see Thumbnailer.thumbnail_exists.
+content_hash.content_addressed = True
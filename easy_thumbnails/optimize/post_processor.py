@@ -1,8 +1,9 @@
 import logging
+import os
+import shutil
 import subprocess
+import uuid
 from PIL import Image, UnidentifiedImageError
-from django.core.files.base import ContentFile
-from django.core.files.temp import NamedTemporaryFile
 from easy_thumbnails.optimize.conf import settings
 
 
@@ -63,23 +64,28 @@ def optimize_thumbnail(thumbnail):
             return
     except (TypeError, KeyError, NotImplementedError):
         return
-    storage = thumbnail.storage
+    # Optimize a copy of the thumbnail next to it, then move the copy into
+    # place so the thumbnail is never seen half optimized.
+    directory, filename = os.path.split(thumbnail_path)
+    temp_path = os.path.join(
+        directory, '.{}.{}'.format(uuid.uuid4().hex, filename))
     try:
-        with NamedTemporaryFile() as temp_file:
-            thumbnail.seek(0)
-            temp_file.write(thumbnail.read())
-            temp_file.flush()
-            optimize_command = optimize_command.format(filename=temp_file.name)
-            output = check_output(
-                optimize_command, stderr=subprocess.STDOUT, shell=True)
-            if output:
-                logger.warning(
-                    '{0} returned {1}'.format(optimize_command, output))
-            else:
-                logger.info('{0} returned nothing'.format(optimize_command))
-            with open(temp_file.name, 'rb') as f:
-                thumbnail.file = ContentFile(f.read())
-                storage.delete(thumbnail.name)
-                storage.save(thumbnail.name, thumbnail)
+        shutil.copy(thumbnail_path, temp_path)
+        optimize_command = optimize_command.format(filename=temp_path)
+        output = check_output(
+            optimize_command, stderr=subprocess.STDOUT, shell=True)
+        if output:
+            logger.warning(
+                '{0} returned {1}'.format(optimize_command, output))
+        else:
+            logger.info('{0} returned nothing'.format(optimize_command))
+        os.replace(temp_path, thumbnail_path)
+        # The thumbnail still holds the unoptimized content, so have it open
+        # the optimized file from storage when it is next read.
+        thumbnail.close()
+        thumbnail.file = None
     except Exception as e:
         logger.error(e)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
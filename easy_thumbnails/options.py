@@ -30,6 +30,9 @@ class ThumbnailOptions(dict):
                 continue
             if not value or key in ['size', 'quality', 'subsampling']:
                 continue
+            if key in ['format', 'formats']:
+                # The format is given by the thumbnail's extension.
+                continue
             if value is True:
                 prepared_opts.append(key)
                 continue
@@ -0,0 +1,275 @@
+import os
+import re
+import struct
+
+
+#: The most bytes read from the start of an SVG file to find its root element.
+SVG_HEADER_SIZE = 64 * 1024
+#: The largest AVIF ``meta`` box which is read to find the image's size.
+AVIF_META_SIZE = 1024 * 1024
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+AVIF_BRANDS = (b'avif', b'avis')
+# The JPEG "start of frame" markers (excluding DHT, JPG and DAC).
+JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+SVG_ROOT_RE = re.compile(r'<svg(?=[\s/>])([^>]*)>')
+SVG_ATTRIBUTE_RE = re.compile(
+    r'''([\w:.-]+)\s*=\s*(?:"([^"]*)"|'([^']*)')''')
+SVG_LENGTH_RE = re.compile(r'\s*([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)'
+                           r'\s*(?:px)?\s*')
+
+
+class Reader:
+    """
+    Read the start of a file, without reading any more of it than is needed.
+    """
+
+    def __init__(self, file):
+        self.file = file
+        self.buffer = b''
+
+    def peek(self, size):
+        """
+        Return up to ``size`` bytes without consuming them.
+        """
+        while len(self.buffer) < size:
+            data = self.file.read(size - len(self.buffer))
+            if not data:
+                break
+            self.buffer += data
+        return self.buffer[:size]
+
+    def read(self, size):
+        """
+        Consume and return ``size`` bytes, raising ``EOFError`` if the file is
+        shorter than that.
+        """
+        data = self.peek(size)
+        if len(data) < size:
+            raise EOFError
+        self.buffer = self.buffer[size:]
+        return data
+
+    def skip(self, size):
+        """
+        Skip over ``size`` bytes, seeking past them if the file allows it.
+        """
+        buffered = min(size, len(self.buffer))
+        self.buffer = self.buffer[buffered:]
+        size -= buffered
+        if not size:
+            return
+        try:
+            self.file.seek(size, os.SEEK_CUR)
+            return
+        except (AttributeError, OSError, ValueError):
+            pass
+        while size:
+            size -= len(self.read(min(size, 64 * 1024)))
+
+
+def get_image_dimensions(file):
+    """
+    Return the ``(width, height)`` of a JPEG, PNG, GIF, WebP, AVIF or SVG
+    image, read from the header of a (binary mode) file-like object.
+
+    Only the bytes needed to find the dimensions are read, rather than
+    decoding the whole image. Returns ``None`` if the image isn't in one of
+    these formats or its header couldn't be parsed. The position of seekable
+    files is restored.
+    """
+    try:
+        position = file.tell()
+        file.seek(0)
+    except (AttributeError, OSError, ValueError):
+        position = None
+    try:
+        return _probe(Reader(file))
+    except (EOFError, IndexError, struct.error, ValueError):
+        return None
+    finally:
+        if position is not None:
+            file.seek(position)
+
+
+def _probe(reader):
+    """
+    Return the dimensions of the image read by a ``Reader``, or ``None`` if
+    its format isn't recognised.
+    """
+    head = reader.peek(32)
+    if head.startswith(b'\xff\xd8'):
+        return _probe_jpeg(reader)
+    if head.startswith(PNG_SIGNATURE) and head[12:16] == b'IHDR':
+        return struct.unpack('>II', head[16:24])
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        return struct.unpack('<HH', head[6:10])
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return _probe_webp(head)
+    if head[4:8] == b'ftyp':
+        return _probe_avif(reader)
+    if head.lstrip(b'\xef\xbb\xbf \t\r\n').startswith(b'<'):
+        return _probe_svg(reader)
+    return None
+
+
+def _probe_jpeg(reader):
+    reader.read(2)
+    while True:
+        if reader.read(1) != b'\xff':
+            raise ValueError('Invalid JPEG marker')
+        marker = ord(reader.read(1))
+        # Skip any fill bytes.
+        while marker == 0xFF:
+            marker = ord(reader.read(1))
+        if marker == 0x01 or 0xD0 <= marker <= 0xD9:
+            # Markers without a segment.
+            continue
+        length, = struct.unpack('>H', reader.read(2))
+        if marker in JPEG_SOF_MARKERS:
+            height, width = struct.unpack('>xHH', reader.read(5))
+            return width, height
+        reader.skip(length - 2)
+
+
+def _probe_webp(head):
+    chunk = head[12:16]
+    if chunk == b'VP8 ':
+        if head[23:26] != b'\x9d\x01\x2a':
+            raise ValueError('Invalid VP8 frame')
+        width, height = struct.unpack('<HH', head[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b'VP8L':
+        if head[20:21] != b'\x2f':
+            raise ValueError('Invalid VP8L signature')
+        bits, = struct.unpack('<I', head[21:25])
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b'VP8X':
+        width = int.from_bytes(head[24:27], 'little') + 1
+        height = int.from_bytes(head[27:30], 'little') + 1
+        return width, height
+    return None
+
+
+def _iter_boxes(data):
+    """
+    Yield the ``(type, content)`` of each ISO base media box in ``data``.
+    """
+    offset = 0
+    while offset + 8 <= len(data):
+        size, box_type = struct.unpack('>I4s', data[offset:offset + 8])
+        header = 8
+        if size == 1:
+            size, = struct.unpack('>Q', data[offset + 8:offset + 16])
+            header = 16
+        elif size == 0:
+            size = len(data) - offset
+        if size < header:
+            raise ValueError('Invalid box size')
+        yield box_type, data[offset + header:offset + size]
+        offset += size
+
+
+def _probe_avif(reader):
+    meta = None
+    while meta is None:
+        size, box_type = struct.unpack('>I4s', reader.read(8))
+        header = 8
+        if size == 1:
+            size, = struct.unpack('>Q', reader.read(8))
+            header = 16
+        elif size == 0:
+            # The last box in the file, so there's no meta box.
+            return None
+        if size < header:
+            raise ValueError('Invalid box size')
+        if box_type == b'ftyp':
+            brands = reader.read(size - header)
+            if not any(
+                    brands[i:i + 4] in AVIF_BRANDS
+                    for i in range(0, len(brands), 4)):
+                return None
+        elif box_type == b'meta':
+            if size - header > AVIF_META_SIZE:
+                return None
+            meta = reader.read(size - header)
+        else:
+            reader.skip(size - header)
+
+    primary = None
+    properties = []
+    associations = {}
+    # The meta box is a "full box", so skip its version and flags.
+    for box_type, content in _iter_boxes(meta[4:]):
+        if box_type == b'pitm':
+            fmt = '>H' if content[0] == 0 else '>I'
+            primary, = struct.unpack_from(fmt, content, 4)
+        elif box_type == b'iprp':
+            for iprp_type, iprp_content in _iter_boxes(content):
+                if iprp_type == b'ipco':
+                    properties = list(_iter_boxes(iprp_content))
+                elif iprp_type == b'ipma':
+                    associations.update(_parse_ipma(iprp_content))
+    sizes = {}
+    for index, (box_type, content) in enumerate(properties, 1):
+        if box_type == b'ispe':
+            sizes[index] = struct.unpack_from('>II', content, 4)
+    if not sizes:
+        return None
+    for index in associations.get(primary, ()):
+        if index in sizes:
+            return sizes[index]
+    return sizes[min(sizes)]
+
+
+def _parse_ipma(content):
+    """
+    Return a dictionary of item ids to the (1-based) indexes of their
+    properties, from the content of an ``ipma`` box.
+    """
+    version, flags = content[0], int.from_bytes(content[1:4], 'big')
+    count, = struct.unpack_from('>I', content, 4)
+    offset = 8
+    associations = {}
+    for _ in range(count):
+        if version < 1:
+            item, = struct.unpack_from('>H', content, offset)
+            offset += 2
+        else:
+            item, = struct.unpack_from('>I', content, offset)
+            offset += 4
+        indexes = associations[item] = []
+        for _ in range(content[offset]):
+            if flags & 1:
+                index, = struct.unpack_from('>H', content, offset + 1)
+                offset += 2
+                indexes.append(index & 0x7FFF)
+            else:
+                indexes.append(content[offset + 1] & 0x7F)
+                offset += 1
+        offset += 1
+    return associations
+
+
+def _probe_svg(reader):
+    head = reader.peek(SVG_HEADER_SIZE).decode('utf-8', 'replace')
+    # Ignore any <svg> in comments before the root element.
+    head = re.sub(r'<!--.*?-->', '', head, flags=re.DOTALL)
+    match = SVG_ROOT_RE.search(head)
+    if not match:
+        return None
+    attributes = {
+        name: double or single
+        for name, double, single in SVG_ATTRIBUTE_RE.findall(match.group(1))}
+    view_box = attributes.get('viewBox', '').replace(',', ' ').split()
+    dimensions = []
+    for i, name in enumerate(('width', 'height')):
+        length = SVG_LENGTH_RE.fullmatch(attributes.get(name, ''))
+        if length:
+            dimensions.append(float(length.group(1)))
+        elif len(view_box) == 4:
+            dimensions.append(float(view_box[i + 2]))
+        else:
+            return None
+    return tuple(dimensions)
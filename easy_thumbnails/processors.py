@@ -1,21 +1,19 @@
-import itertools
 import re
 from functools import partial
-from io import BytesIO
 
 from PIL import Image, ImageChops, ImageFilter
 from easy_thumbnails import utils
+from easy_thumbnails.animation import AnimatedImage
+from easy_thumbnails.conf import settings
 
 
-def _compare_entropy(start_slice, end_slice, slice, difference):
+def _compare_entropy(start_entropy, end_entropy, slice, difference):
     """
-    Calculate the entropy of two slices (from the start and end of an axis),
+    Compare the entropy of two slices (from the start and end of an axis),
     returning a tuple containing the amount that should be added to the start
     and removed from the end of the axis.
 
     """
-    start_entropy = utils.image_entropy(start_slice)
-    end_entropy = utils.image_entropy(end_slice)
     if end_entropy and abs(start_entropy / end_entropy - 1) < 0.01:
         # Less than 1% difference, remove from both sides.
         if difference >= slice * 2:
@@ -28,42 +26,119 @@ def _compare_entropy(start_slice, end_slice, slice, difference):
         return slice, 0
 
 
-def _points_table():
+def _slice_entropy(im, axis):
     """
-    Iterable to map a 16 bit grayscale image to 8 bits.
+    Return a function which calculates the entropy of a slice of an image,
+    spanning the whole of the other axis, between two positions on ``axis``
+    (``0`` for the x axis, ``1`` for the y axis).
     """
-    for i in range(256):
-        for j in itertools.repeat(i, 256):
-            yield j
+    def entropy(start, end):
+        if axis == 0:
+            box = (start, 0, end, im.size[1])
+        else:
+            box = (0, start, im.size[0], end)
+        return utils.image_entropy(im.crop(box))
+    return entropy
+
+
+def _smart_crop_axis(entropy, length, difference):
+    """
+    Return the start and end of an axis after removing ``difference`` pixels
+    from it, incrementally removing slices from the edge with the least
+    entropy.
+    """
+    start, end = 0, length
+    while difference:
+        slice = min(difference, max(difference // 5, 10))
+        add, remove = _compare_entropy(
+            entropy(start, start + slice), entropy(end - slice, end), slice,
+            difference)
+        start += add
+        end -= remove
+        difference = difference - add - remove
+    return start, end
+
+
+# Grayscale modes with more than 8 bits per pixel.
+_HIGH_BIT_DEPTH_MODES = ('I', 'I;16', 'I;16B', 'I;16L', 'I;16N')
+
+
+def _reduce_bit_depth(im, stretch_levels=False):
+    """
+    Convert a 16 (or 32) bit grayscale image to 8 bit grayscale.
+
+    The conversion is a linear mapping done natively by PIL, so no lookup
+    table needs to be built.
+    """
+    if im.mode != 'I':
+        im = im.convert('I')
+    if stretch_levels:
+        low, high = im.getextrema()
+        scale = 255 / (high - low) if high > low else 0
+        # Round (rather than truncate) the scaled values.
+        offset = 0.5 - low * scale
+    else:
+        # Keep the top 8 bits of a 16 bit value.
+        scale, offset = 1 / 256, 0
+    # Values outside of the 8 bit range are clipped by the conversion.
+    return im.point(lambda x: x * scale + offset).convert('L')
 
 
 class FrameAware:
+    """
+    Apply image methods to every frame of an animated image, returning an
+    :class:`~easy_thumbnails.animation.AnimatedImage`. Images with a single
+    frame are returned as is.
+
+    For example, ``FrameAware(im).convert('RGB')`` converts every frame of
+    ``im``.
+    """
     def __new__(cls, im):
         if getattr(im, "n_frames", 1) > 1:
             return super().__new__(cls)
         return im
 
     def __init__(self, im):
-        self.im = im
-
-    def apply_to_frames(self, method, *args, **kwargs):
-        new_frames = []
-        for i in range(self.im.n_frames):
-            self.im.seek(i)
-            new_frames.append(method(*args, **kwargs))
-        write_to = BytesIO()
-        loop = self.im.info.get('loop', 0)
-        new_frames[0].save(
-            write_to, format=self.im.format, save_all=True, append_images=new_frames[1:], loop=loop
-        )
-        return Image.open(write_to)
+        # Decode the frames once, rather than for every processing step.
+        self.im = AnimatedImage.from_image(im)
+
+    def apply_to_frames(self, function, *args, **kwargs):
+        """
+        Call ``function`` with each frame (along with any extra arguments),
+        returning an ``AnimatedImage`` of the results.
+        """
+        return self.im.map(function, *args, **kwargs)
 
     def __getattr__(self, key):
-        method = getattr(self.im, key)
-        return partial(self.apply_to_frames, method)
+        return partial(self.apply_to_frames, getattr(Image.Image, key))
 
 
-def colorspace(im, bw=False, replace_alpha=False, **kwargs):
+def _map_frames(im, function, *args, **kwargs):
+    """
+    Call ``function`` with each frame of an image (along with any extra
+    arguments), returning an image made up of the results.
+    """
+    if getattr(im, 'n_frames', 1) > 1:
+        return FrameAware(im).apply_to_frames(function, *args, **kwargs)
+    return function(im, *args, **kwargs)
+
+
+def _replace_alpha(im, color):
+    if im.mode != 'RGBA':
+        im = im.convert('RGBA')
+    base = Image.new('RGBA', im.size, color)
+    base.paste(im, mask=im)
+    return base
+
+
+def _paste(im, base, offset):
+    base = base.copy()
+    base.paste(im, offset)
+    return base
+
+
+def colorspace(im, bw=False, replace_alpha=False, stretch_levels=False,
+               **kwargs):
     """
     Convert images to the correct color space.
 
@@ -81,49 +156,64 @@ def colorspace(im, bw=False, replace_alpha=False, **kwargs):
         ``replace_alpha='#fff'`` would replace the transparency layer with
         white.
 
+    stretch_levels
+        When converting a 16 (or 32) bit grayscale image to 8 bits, stretch
+        its darkest and lightest values to black and white (rather than just
+        keeping the most significant bits). Useful for scientific images which
+        only use a small part of the 16 bit range.
+
     """
-    if im.mode == 'I':
+    if im.mode in _HIGH_BIT_DEPTH_MODES:
         # PIL (and pillow) have can't convert 16 bit grayscale images to lower
         # modes, so manually convert them to an 8 bit grayscale.
-        im = FrameAware(im).point(list(_points_table()), "L")
+        im = _map_frames(im, _reduce_bit_depth, stretch_levels)
+
+    new_mode = _colorspace_mode(im, bw, replace_alpha)
+    if utils.is_transparent(im) and replace_alpha:
+        im = _map_frames(im, _replace_alpha, replace_alpha)
 
-    is_transparent = utils.is_transparent(im)
-    is_grayscale = im.mode in ('L', 'LA')
-    new_mode = im.mode
-    if is_grayscale or bw:
+    if im.mode != new_mode:
+        im = FrameAware(im).convert(new_mode)
+    return im
+
+
+def _colorspace_mode(im, bw=False, replace_alpha=False):
+    """
+    Return the mode that :func:`colorspace` converts an image to.
+    """
+    if im.mode in ('L', 'LA') or bw:
         new_mode = 'L'
     else:
         new_mode = 'RGB'
+    if utils.is_transparent(im) and not replace_alpha:
+        new_mode += 'A'
+    return new_mode
 
-    if is_transparent:
-        if replace_alpha:
-            if not getattr(im, 'is_animated', False):
-                if im.mode != 'RGBA':
-                    im = FrameAware(im).convert('RGBA')
-                base = Image.new('RGBA', im.size, replace_alpha)
-                base.paste(im, mask=im)
-                im = base
-            else:
-                frames = []
-                loop = im.info.get('loop', 0)
-                for i in range(im.n_frames):
-                    im.seek(i)
-                    if im.mode != 'RGBA':
-                        im = FrameAware(im).convert('RGBA')
-                    base = Image.new('RGBA', im.size, replace_alpha)
-                    base.paste(im, mask=im)
-                    frames.append(base)
-                write_to = BytesIO()
-                frames[0].save(
-                    write_to, format=im.format, save_all=True, append_images=frames[1:], loop=loop
-                )
-                return Image.open(write_to)
-        else:
-            new_mode = new_mode + 'A'
 
-    if im.mode != new_mode:
-        im = FrameAware(im).convert(new_mode)
-    return im
+def _colorspace_active(im, bw=False, replace_alpha=False, **kwargs):
+    if im.mode in _HIGH_BIT_DEPTH_MODES:
+        return True
+    if utils.is_transparent(im) and replace_alpha:
+        return True
+    return im.mode != _colorspace_mode(im, bw, replace_alpha)
+
+
+def _colorspace_deferrable(im, bw=False, replace_alpha=False,
+                           stretch_levels=False, crop=False, **kwargs):
+    # Reducing the bit depth (unless stretching the levels) and converting
+    # color to grayscale are linear mappings of each pixel, so they give the
+    # same result when done after the image has been scaled down.
+    if crop == 'smart':
+        # Except that smart cropping measures the entropy of the converted
+        # image, which can crop a different part of the image.
+        return False
+    if im.mode in _HIGH_BIT_DEPTH_MODES:
+        return not stretch_levels
+    return im.mode == 'RGB' and bw and not utils.is_transparent(im)
+
+
+colorspace.active = _colorspace_active
+colorspace.deferrable = _colorspace_deferrable
 
 
 def autocrop(im, autocrop=False, **kwargs):
@@ -155,8 +245,34 @@ def autocrop(im, autocrop=False, **kwargs):
     return im
 
 
+def _autocrop_active(im, autocrop=False, **kwargs):
+    return bool(autocrop)
+
+
+autocrop.active = _autocrop_active
+
+
+def _get_resample(resample):
+    """
+    Return the PIL resampling filter for a ``resample`` option, which can be
+    the name of a filter (such as ``"bicubic"``) or the filter itself.
+    """
+    if not isinstance(resample, str):
+        return resample
+    try:
+        # Pillow >= 9.1.0
+        Image__Resampling = Image.Resampling
+    except AttributeError:
+        # Pillow < 9.1.0
+        Image__Resampling = Image
+    try:
+        return getattr(Image__Resampling, resample.upper())
+    except AttributeError:
+        raise ValueError("Unknown resampling filter: {}".format(resample))
+
+
 def scale_and_crop(im, size, crop=False, upscale=False, zoom=None, target=None,
-                   **kwargs):
+                   resample='lanczos', reducing_gap=None, **kwargs):
     """
     Handle scaling and cropping the source image.
 
@@ -212,6 +328,20 @@ def scale_and_crop(im, size, crop=False, upscale=False, zoom=None, target=None,
         separated string such as ``"20,10"``.
 
         A null value such as ``(20, None)`` or ``",60"`` will default to 50%.
+
+    resample
+        The resampling filter used to scale the image: ``"lanczos"`` (the
+        default), ``"bicubic"``, ``"hamming"``, ``"bilinear"``, ``"box"`` or
+        ``"nearest"``.
+
+    reducing_gap
+        Speed up scaling an image down by first reducing it by an integer
+        factor (averaging blocks of pixels), leaving it at least
+        ``reducing_gap`` times larger than the thumbnail, before resampling
+        it. Larger values are slower but closer to resampling the full sized
+        image. Defaults to
+        :attr:`~easy_thumbnails.conf.Settings.THUMBNAIL_REDUCING_GAP`, use
+        ``0`` to always resample the full sized image.
     """
     source_x, source_y = [float(v) for v in im.size]
     target_x, target_y = [int(v) for v in size]
@@ -240,20 +370,19 @@ def scale_and_crop(im, size, crop=False, upscale=False, zoom=None, target=None,
             crop = True
         scale *= (100 + int(zoom)) / 100.0
 
-    # Check Pillow version and use right constant
-    try:
-        # Pillow >= 9.1.0
-        Image__Resampling__LANCZOS = Image.Resampling.LANCZOS
-    except AttributeError:
-        # Pillow < 9.1.0
-        Image__Resampling__LANCZOS = Image.ANTIALIAS
-
     if scale < 1.0 or (scale > 1.0 and upscale):
+        if reducing_gap is None:
+            reducing_gap = settings.THUMBNAIL_REDUCING_GAP
+        if im.mode.startswith('I;16'):
+            # PIL can't reduce 16 bit images (which are only converted to 8
+            # bits by the colorspace processor after they are scaled).
+            reducing_gap = None
         # Resize the image to the target size boundary. Round the scaled
         # boundary sizes to avoid floating point errors.
         im = FrameAware(im).resize(
             (int(round(source_x * scale)), int(round(source_y * scale))),
-            resample=Image__Resampling__LANCZOS,
+            resample=_get_resample(resample),
+            reducing_gap=float(reducing_gap or 0) or None,
         )
 
     if crop:
@@ -305,30 +434,26 @@ def scale_and_crop(im, size, crop=False, upscale=False, zoom=None, target=None,
                         box[3] = source_y - (diff_y - offset)
             # See if the image should be 'smart cropped".
             elif crop == 'smart':
-                left = top = 0
-                right, bottom = source_x, source_y
-                while diff_x:
-                    slice = min(diff_x, max(diff_x // 5, 10))
-                    start = im.crop((left, 0, left + slice, source_y))
-                    end = im.crop((right - slice, 0, right, source_y))
-                    add, remove = _compare_entropy(start, end, slice, diff_x)
-                    left += add
-                    right -= remove
-                    diff_x = diff_x - add - remove
-                while diff_y:
-                    slice = min(diff_y, max(diff_y // 5, 10))
-                    start = im.crop((0, top, source_x, top + slice))
-                    end = im.crop((0, bottom - slice, source_x, bottom))
-                    add, remove = _compare_entropy(start, end, slice, diff_y)
-                    top += add
-                    bottom -= remove
-                    diff_y = diff_y - add - remove
+                left, right = _smart_crop_axis(
+                    _slice_entropy(im, 0), source_x, diff_x)
+                top, bottom = _smart_crop_axis(
+                    _slice_entropy(im, 1), source_y, diff_y)
                 box = (left, top, right, bottom)
             # Finally, crop the image!
             im = FrameAware(im).crop(box)
     return im
 
 
+def _scale_and_crop_active(im, size, upscale=False, zoom=None, **kwargs):
+    # An image which already fits within the size is neither scaled down nor
+    # cropped.
+    return bool(upscale or zoom) or not utils.fits_within(im.size, size)
+
+
+scale_and_crop.active = _scale_and_crop_active
+scale_and_crop.resizes = True
+
+
 def filters(im, detail=False, sharpen=False, **kwargs):
     """
     Pass the source image through post-processing filters.
@@ -348,6 +473,13 @@ def filters(im, detail=False, sharpen=False, **kwargs):
     return im
 
 
+def _filters_active(im, detail=False, sharpen=False, **kwargs):
+    return bool(detail or sharpen)
+
+
+filters.active = _filters_active
+
+
 def background(im, size, background=None, **kwargs):
     """
     Add borders of a certain color to make the resized image fit exactly within
@@ -372,20 +504,12 @@ def background(im, size, background=None, **kwargs):
     if new_im.mode != im.mode:
         new_im = new_im.convert(im.mode)
     offset = (size[0] - x) // 2, (size[1] - y) // 2
-    # animated format (gif/webp/...) support manually added.
-    if not getattr(im, 'is_animated', False):
-        new_im.paste(im, offset)
-        return new_im
-    else:
-        frames = []
-        loop = im.info.get('loop', 0)
-        for i in range(im.n_frames):
-            im.seek(i)
-            copied_new_im = new_im.copy()
-            copied_new_im.paste(im, offset)
-            frames.append(copied_new_im)
-        write_to = BytesIO()
-        frames[0].save(
-            write_to, format=im.format, save_all=True, append_images=frames[1:], loop=loop
-        )
-        return Image.open(write_to)
+    return _map_frames(im, _paste, new_im, offset)
+
+
+def _background_active(im, size, background=None, **kwargs):
+    return bool(background and size[0] and size[1] and (
+        im.size[0] < size[0] or im.size[1] < size[1]))
+
+
+background.active = _background_active
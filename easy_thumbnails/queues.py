@@ -0,0 +1,241 @@
+import datetime
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.apps import apps
+from django.core.exceptions import FieldDoesNotExist
+from django.db import close_old_connections
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from easy_thumbnails import exceptions, models, storage, utils
+from easy_thumbnails.alias import aliases
+from easy_thumbnails.conf import settings
+
+
+logger = logging.getLogger('easy_thumbnails.queues')
+
+_queues = {}
+
+
+def get_queue():
+    """
+    Return the queue backend set in ``THUMBNAIL_QUEUE``.
+
+    A single instance of each backend is used for the lifetime of the process.
+    """
+    backend = settings.THUMBNAIL_QUEUE
+    if backend not in _queues:
+        queue_class = backend
+        if isinstance(queue_class, str):
+            queue_class = import_string(queue_class)
+        _queues[backend] = queue_class()
+    return _queues[backend]
+
+
+def queue_thumbnails(thumbnailer, items):
+    """
+    Queue the generation of thumbnails for a source file.
+
+    :param thumbnailer: The ``Thumbnailer`` of the source file.
+    :param items: A list of alias names and/or thumbnail options dictionaries
+        (which must be JSON serializable).
+    """
+    if thumbnailer.remote_source or not items:
+        return
+    job = {
+        'source_storage': utils.get_storage_hash(thumbnailer.source_storage),
+        'thumbnail_storage': utils.get_storage_hash(
+            thumbnailer.thumbnail_storage),
+        'name': thumbnailer.name,
+        'target': aliases._coerce_target(thumbnailer.alias_target) or '',
+        'items': list(items),
+    }
+    get_queue().enqueue(job)
+
+
+def get_job_thumbnailer(job):
+    """
+    Return a ``Thumbnailer`` for the source file of a queued job.
+
+    The storages are taken from the job's target field if it has one,
+    otherwise they are looked up by their hashes.
+    """
+    from easy_thumbnails.files import Thumbnailer
+
+    source_storage = thumbnail_storage = None
+    target = job['target'] or None
+    if target and target.count('.') == 2:
+        app_label, model_name, field_name = target.split('.')
+        try:
+            field = apps.get_model(app_label, model_name)._meta.get_field(
+                field_name)
+        except (LookupError, FieldDoesNotExist):
+            pass
+        else:
+            source_storage = field.storage
+            thumbnail_storage = getattr(field, 'thumbnail_storage', None)
+    if (source_storage is None or utils.get_storage_hash(source_storage) !=
+            job['source_storage']):
+        source_storage = storage.get_storage_by_hash(job['source_storage'])
+    if source_storage is None:
+        raise exceptions.EasyThumbnailsError(
+            "Can't find the source storage for '{0}'".format(job['name']))
+    if (thumbnail_storage is None or utils.get_storage_hash(
+            thumbnail_storage) != job['thumbnail_storage']):
+        thumbnail_storage = storage.get_storage_by_hash(
+            job['thumbnail_storage'])
+    thumbnailer = Thumbnailer(
+        name=job['name'], source_storage=source_storage,
+        thumbnail_storage=thumbnail_storage)
+    thumbnailer.alias_target = target
+    return thumbnailer
+
+
+def get_job_options(thumbnailer, job):
+    """
+    Return the list of thumbnail options dictionaries for a queued job's
+    items, skipping any aliases which no longer exist.
+    """
+    options_list = []
+    for item in job['items']:
+        if isinstance(item, str):
+            options = aliases.get(item, target=thumbnailer.alias_target)
+            if not options:
+                # The alias has been removed since the job was queued.
+                continue
+            options = dict(options, ALIAS=item)
+        else:
+            options = dict(item)
+        options_list.append(options)
+    return options_list
+
+
+def process_job(job):
+    """
+    Generate any missing thumbnails for a queued job.
+    """
+    thumbnailer = get_job_thumbnailer(job)
+    thumbnailer.get_many_thumbnails(
+        get_job_options(thumbnailer, job), generate=True)
+
+
+def run_job(job):
+    """
+    Process a queued job, logging (rather than raising) any errors.
+
+    Returns ``True`` if the job succeeded.
+    """
+    close_old_connections()
+    try:
+        process_job(job)
+    except Exception:
+        logger.exception(
+            "Failed to generate thumbnails for '%s'", job['name'])
+        return False
+    finally:
+        close_old_connections()
+    return True
+
+
+class BaseQueue:
+    """
+    A queue of thumbnail generation jobs.
+
+    Each job is a dictionary containing the ``source_storage`` and
+    ``thumbnail_storage`` hashes, the source file ``name``, the alias
+    ``target`` and the list of ``items`` (alias names or thumbnail options) to
+    generate.
+    """
+
+    def enqueue(self, job):
+        """
+        Add a job to the queue.
+        """
+        raise NotImplementedError
+
+    def claim(self, limit):
+        """
+        Claim up to ``limit`` jobs from the queue and return them, for
+        processing by the ``thumbnail_worker`` management command.
+        """
+        raise NotImplementedError
+
+    def finish(self, job, succeeded):
+        """
+        Called by the ``thumbnail_worker`` management command once a claimed
+        job has been processed.
+        """
+
+
+class DatabaseQueue(BaseQueue):
+    """
+    Store jobs in the database, to be processed by the ``thumbnail_worker``
+    management command.
+
+    A job isn't queued again while an identical one is waiting to be
+    processed. Claiming a job leases it for ``THUMBNAIL_QUEUE_CLAIM_TIMEOUT``
+    seconds, and it's only removed from the queue once it has been processed.
+    A job which fails (or whose worker dies) is claimed again once its lease
+    expires, up to ``THUMBNAIL_QUEUE_MAX_ATTEMPTS`` times.
+    """
+
+    def enqueue(self, job):
+        pending = models.ThumbnailJob.objects.filter(
+            source_storage_hash=job['source_storage'],
+            thumbnail_storage_hash=job['thumbnail_storage'],
+            name=job['name'], target=job['target'], claimed__isnull=True)
+        # Compare the items here rather than in the database, where JSON
+        # equality depends on the backend.
+        if any(items == job['items']
+               for items in pending.values_list('items', flat=True)):
+            return
+        models.ThumbnailJob.objects.create(
+            source_storage_hash=job['source_storage'],
+            thumbnail_storage_hash=job['thumbnail_storage'],
+            name=job['name'], target=job['target'], items=job['items'])
+
+    def claim(self, limit):
+        now = timezone.now()
+        expired = now - datetime.timedelta(
+            seconds=settings.THUMBNAIL_QUEUE_CLAIM_TIMEOUT)
+        queued_jobs = models.ThumbnailJob.objects.filter(
+            Q(claimed__isnull=True) | Q(claimed__lt=expired),
+            attempts__lt=settings.THUMBNAIL_QUEUE_MAX_ATTEMPTS,
+        ).order_by('pk')[:limit]
+        jobs = []
+        for queued in queued_jobs:
+            # Only update the row if no other worker has claimed it since it
+            # was read, so concurrent workers never process the same job.
+            claimed = models.ThumbnailJob.objects.filter(
+                pk=queued.pk, claimed=queued.claimed,
+                attempts=queued.attempts,
+            ).update(claimed=now, attempts=F('attempts') + 1)
+            if claimed:
+                queued.claimed = now
+                queued.attempts += 1
+                jobs.append(queued.as_job())
+        return jobs
+
+    def finish(self, job, succeeded):
+        if (succeeded or
+                job['attempts'] >= settings.THUMBNAIL_QUEUE_MAX_ATTEMPTS):
+            models.ThumbnailJob.objects.filter(pk=job['id']).delete()
+
+
+class ThreadPoolQueue(BaseQueue):
+    """
+    Process jobs in a pool of ``THUMBNAIL_QUEUE_CONCURRENCY`` background
+    threads within the current process.
+
+    Queued jobs are lost if the process exits before they are processed.
+    """
+
+    def __init__(self):
+        self.executor = ThreadPoolExecutor(
+            max_workers=settings.THUMBNAIL_QUEUE_CONCURRENCY,
+            thread_name_prefix='easy_thumbnails')
+
+    def enqueue(self, job):
+        return self.executor.submit(run_job, job)
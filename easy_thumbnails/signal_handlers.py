@@ -53,3 +53,50 @@ def generate_aliases_global(fieldfile, **kwargs):
     # Avoids circular import.
     from easy_thumbnails.files import generate_all_aliases
     generate_all_aliases(fieldfile, include_global=True)
+
+
+def queue_aliases(fieldfile, **kwargs):
+    """
+    A saved_file signal handler which queues the generation of thumbnails for
+    all field, model, and app specific aliases matching the saved file's
+    field, using the ``THUMBNAIL_QUEUE`` backend.
+    """
+    # Avoids circular import.
+    from easy_thumbnails.alias import aliases
+    from easy_thumbnails.files import get_thumbnailer
+    from easy_thumbnails.queues import queue_thumbnails
+    all_options = aliases.all(fieldfile, include_global=False)
+    queue_thumbnails(get_thumbnailer(fieldfile), list(all_options))
+
+
+def queue_aliases_global(fieldfile, **kwargs):
+    """
+    A saved_file signal handler which queues the generation of thumbnails for
+    all field, model, and app specific aliases matching the saved file's
+    field, also queueing thumbnails for each project-wide alias.
+    """
+    # Avoids circular import.
+    from easy_thumbnails.alias import aliases
+    from easy_thumbnails.files import get_thumbnailer
+    from easy_thumbnails.queues import queue_thumbnails
+    all_options = aliases.all(fieldfile, include_global=True)
+    queue_thumbnails(get_thumbnailer(fieldfile), list(all_options))
+
+
+def queue_missed_thumbnail(sender, options, **kwargs):
+    """
+    A thumbnail_missed signal handler which queues the generation of the
+    missing thumbnail, so thumbnails passively requested while rendering are
+    generated out of band.
+    """
+    # Avoids circular import.
+    from easy_thumbnails.queues import logger, queue_thumbnails
+    if 'ALIAS' in options:
+        item = options['ALIAS']
+    else:
+        item = dict(options)
+    try:
+        queue_thumbnails(sender, [item])
+    except Exception:
+        # Never break the page which is being rendered.
+        logger.exception("Failed to queue thumbnail for '%s'", sender.name)
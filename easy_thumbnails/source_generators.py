@@ -1,7 +1,14 @@
+import io
+import os
+import time
 import warnings
 from io import BytesIO
 
-from easy_thumbnails import utils
+from django.core.files.base import File
+
+from easy_thumbnails import exceptions, utils
+from easy_thumbnails.animation import AnimatedImage
+from easy_thumbnails.conf import settings
 
 
 def pil_image(source, exif_orientation=True, **options):
@@ -13,22 +20,53 @@ def pil_image(source, exif_orientation=True, **options):
         If EXIF orientation data is present, perform any required reorientation
         before passing the data along the processing pipeline.
 
+    If a thumbnail ``size`` is provided, JPEG sources are decoded at the
+    smallest scale that still covers the requested thumbnail (using PIL's
+    draft mode), avoiding the cost of decoding the full sized image.
+
     """
-    # Use a BytesIO wrapper because if the source is an incomplete file like
-    # object, PIL may have problems with it. For example, some image types
-    # require tell and seek methods that are not present on all storage
-    # File objects.
     from PIL import Image, ImageFile
 
     if not source:
         return
-    source = BytesIO(source.read())
+    # Local files are opened from their path and other seekable files are read
+    # directly, so PIL only reads the parts of the file it needs (memory
+    # mapping uncompressed images). Some storage File objects don't provide
+    # the tell and seek methods which PIL needs, so read them into memory.
+    in_memory = isinstance(source, BytesIO)
+    if not in_memory and not _is_seekable(source):
+        source = BytesIO(source.read())
+        in_memory = True
 
-    image = Image.open(source)
+    path = not in_memory and _get_local_path(source)
+    image = Image.open(path or source)
+    # Autocropping happens before scaling, so the amount that the image can be
+    # reduced by isn't known in advance.
+    if options.get('size') and not options.get('autocrop'):
+        # The requested size applies to the image after it has been rotated
+        # to match its EXIF orientation.
+        transposed = exif_orientation and utils.get_exif_orientation(
+            image) in (5, 6, 7, 8)
+        source_size = image.size[::-1] if transposed else image.size
+        draft_size = utils.get_covering_size(source_size, **options)
+        if draft_size:
+            if transposed:
+                draft_size = draft_size[::-1]
+            image.draft(None, draft_size)
     # Fully load the image now to catch any problems with the image contents.
     try:
         ImageFile.LOAD_TRUNCATED_IMAGES = True
         image.load()
+        if getattr(image, 'n_frames', 1) > 1:
+            if not in_memory:
+                # The other frames are decoded later, possibly after the
+                # source file has been closed, so keep a copy of it.
+                if path:
+                    image.close()
+                source.seek(0)
+                image = Image.open(BytesIO(source.read()))
+                image.load()
+            image = _limit_animation(image)
     finally:
         ImageFile.LOAD_TRUNCATED_IMAGES = False
 
@@ -37,6 +75,89 @@ def pil_image(source, exif_orientation=True, **options):
     return image
 
 
+def _is_seekable(source):
+    """
+    Return whether PIL can read a file-like source directly.
+    """
+    if not hasattr(source, 'seek') or not hasattr(source, 'tell'):
+        return False
+    try:
+        return source.seekable()
+    except AttributeError:
+        return True
+    except Exception:
+        return False
+
+
+def _get_local_path(source):
+    """
+    Return the path of a source which is (or wraps) a file opened from the
+    local file system, or ``None``.
+    """
+    file = source
+    # Unwrap Django File objects.
+    while isinstance(getattr(file, 'file', None), (File, io.IOBase)):
+        file = file.file
+    if not isinstance(file, (io.BufferedReader, io.FileIO)):
+        return None
+    name = getattr(file, 'name', None)
+    if isinstance(name, str) and os.path.isfile(name):
+        return name
+    return None
+
+
+def _limit_animation(image):
+    """
+    Apply the ``THUMBNAIL_ANIMATION_MAX_*`` limits to an animated image,
+    returning either the image itself (if it is within the limits), an
+    ``AnimatedImage`` of evenly sampled frames or the first frame (depending
+    on ``THUMBNAIL_ANIMATION_LIMIT_STRATEGY``).
+    """
+    n_frames = image.n_frames
+    max_frames = n_frames
+    if settings.THUMBNAIL_ANIMATION_MAX_FRAMES:
+        max_frames = min(max_frames, settings.THUMBNAIL_ANIMATION_MAX_FRAMES)
+    if settings.THUMBNAIL_ANIMATION_MAX_PIXELS:
+        max_frames = min(max_frames, settings.THUMBNAIL_ANIMATION_MAX_PIXELS //
+                         (image.size[0] * image.size[1]))
+    max_decode_time = settings.THUMBNAIL_ANIMATION_MAX_DECODE_TIME
+    if max_frames >= n_frames and not max_decode_time:
+        return image
+
+    strategy = settings.THUMBNAIL_ANIMATION_LIMIT_STRATEGY
+    if max_frames < n_frames:
+        if strategy == 'error':
+            raise exceptions.EasyThumbnailsError(
+                "The animation has {} frames, more than the limit of "
+                "{}".format(n_frames, max_frames))
+        if strategy == 'first' or max_frames < 2:
+            return _first_frame(image)
+    # Decode the frames now, evenly sampling them if there are too many.
+    keep = {i * n_frames // max_frames for i in range(max_frames)}
+    deadline = max_decode_time and time.monotonic() + max_decode_time
+    frames = []
+    for i in range(n_frames):
+        if deadline and time.monotonic() > deadline:
+            if strategy == 'error':
+                raise exceptions.EasyThumbnailsError(
+                    "Decoding the animation took longer than {} "
+                    "seconds".format(max_decode_time))
+            return _first_frame(image)
+        image.seek(i)
+        if i in keep:
+            frames.append(image.copy())
+        elif 'duration' in image.info and 'duration' in frames[-1].info:
+            # Extend the previous kept frame to cover the dropped frame.
+            frames[-1].info['duration'] += image.info['duration']
+    image.seek(0)
+    return AnimatedImage(frames, format=image.format)
+
+
+def _first_frame(image):
+    image.seek(0)
+    return image.copy()
+
+
 def vil_image(source, **options):
     """
     Try to open the source file directly using VIL, ignoring any errors.
@@ -1,4 +1,6 @@
 from django.core.files.storage import FileSystemStorage
+from django.core.signals import setting_changed
+from django.dispatch import receiver
 from django.utils.deconstruct import deconstructible
 
 from easy_thumbnails.conf import settings
@@ -15,6 +17,49 @@ def get_storage():
         return default_storage
 
 
+def get_storage_by_hash(storage_hash):
+    """
+    Return the storage (either one listed in the ``STORAGES`` setting or the
+    thumbnail default storage) matching a storage hash, or ``None`` if no
+    storage matches.
+    """
+    return get_storage_registry().get(storage_hash)
+
+
+def get_storage_registry():
+    """
+    Return a dictionary mapping storage hashes to the storages listed in the
+    ``STORAGES`` setting and the thumbnail default storage.
+
+    The registry is built once, and rebuilt if the ``STORAGES`` setting
+    changes.
+    """
+    global _storage_registry
+    if _storage_registry is None:
+        from django.core.files.storage import storages
+        from easy_thumbnails.utils import get_storage_hash
+
+        registry = {}
+        for alias in settings.STORAGES:
+            registry.setdefault(
+                get_storage_hash(storages[alias]), storages[alias])
+        registry.setdefault(
+            get_storage_hash(thumbnail_default_storage),
+            thumbnail_default_storage)
+        _storage_registry = registry
+    return _storage_registry
+
+
+_storage_registry = None
+
+
+@receiver(setting_changed)
+def reset_storage_registry(setting, **kwargs):
+    global _storage_registry
+    if setting == 'STORAGES':
+        _storage_registry = None
+
+
 @deconstructible
 class ThumbnailFileSystemStorage(FileSystemStorage):
     """
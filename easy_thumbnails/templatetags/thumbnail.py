@@ -9,7 +9,7 @@ from django.utils.html import escape
 from easy_thumbnails import utils
 from easy_thumbnails.alias import aliases
 from easy_thumbnails.conf import settings
-from easy_thumbnails.files import get_thumbnailer
+from easy_thumbnails.files import get_thumbnailer, prefetch_thumbnails
 
 register = Library()
 
@@ -116,6 +116,10 @@ class ThumbnailNode(Node):
             if raise_errors:
                 raise
             return self.bail_out(context)
+        if not thumbnail:
+            # Another process is generating the thumbnail (see
+            # THUMBNAIL_GENERATION_LOCK).
+            return self.bail_out(context)
         # Return the thumbnail file url, or put the file on the context.
         if self.context_name is None:
             return escape(thumbnail.url)
@@ -174,6 +178,13 @@ def thumbnail(parser, token):
              width="{{ thumb.width }}"
              height="{{ thumb.height }}" />
 
+    With a comma separated list of ``formats`` (in order of preference), the
+    thumbnail is in the last format and its ``picture`` method renders a
+    ``<picture>`` element with a source for each of the other formats::
+
+        {% thumbnail obj.picture 200x200 formats="avif,webp,jpg" as thumb %}
+        {{ thumb.picture }}
+
     **Debugging**
 
     By default, if there is an error creating the thumbnail or resolving the
@@ -281,13 +292,34 @@ def thumbnailer_passive(obj):
     return thumbnailer
 
 
+@register.filter(name='prefetch_thumbnails')
+def prefetch_thumbnails_filter(objects, aliases=None):
+    """
+    Load the cached thumbnail references for a list of model instances (or
+    files) at once, rather than querying the database for each of them.
+
+    Optionally, limit the references loaded to a comma separated list of
+    alias names.
+
+    Example usage::
+
+        {% for person in people|prefetch_thumbnails:'small,large' %}
+            <img src="{{ person.photo|thumbnail_url:'small' }}" alt="">
+        {% endfor %}
+    """
+    if aliases:
+        aliases = [alias.strip() for alias in aliases.split(',')]
+    return prefetch_thumbnails(objects, aliases=aliases or None)
+
+
 @register.filter
 def thumbnail_url(source, alias):
     """
     Return the thumbnail url for a source file using an aliased set of
     thumbnail options.
 
-    If no matching alias is found, returns an empty string.
+    If no matching alias is found (or another process is still generating
+    the thumbnail), returns an empty string.
 
     Example usage::
 
@@ -299,9 +331,43 @@ def thumbnail_url(source, alias):
         if settings.THUMBNAIL_DEBUG:
             raise e
         return ''
+    if not thumb:
+        return ''
     return thumb.url
 
 
+@register.filter
+def thumbnail_picture(source, alias):
+    """
+    Return a ``<picture>`` element for a source file using an aliased set of
+    thumbnail options, with a ``<source>`` for each of the alias's preferred
+    output ``formats`` and an ``<img>`` tag for its fallback format.
+
+    If no matching alias is found (or another process is still generating
+    the thumbnail), returns an empty string.
+
+    Example usage::
+
+        THUMBNAIL_ALIASES = {
+            '': {
+                'avatar': {'size': (80, 80), 'crop': True,
+                           'formats': ['avif', 'webp', 'jpg']},
+            },
+        }
+
+        {{ person.photo|thumbnail_picture:'avatar' }}
+    """
+    try:
+        thumb = get_thumbnailer(source)[alias]
+    except Exception as e:
+        if settings.THUMBNAIL_DEBUG:
+            raise e
+        return ''
+    if not thumb:
+        return ''
+    return thumb.picture()
+
+
 @register.filter
 def data_uri(thumbnail):
     """
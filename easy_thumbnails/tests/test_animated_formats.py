@@ -1,6 +1,7 @@
 from io import BytesIO
 from PIL import Image, ImageChops, ImageDraw
-from easy_thumbnails import processors
+from easy_thumbnails import engine, processors
+from easy_thumbnails.animation import AnimatedImage
 from unittest import TestCase
 
 
@@ -61,6 +62,20 @@ class AnimatedFormatProcessorsTests(TestCase):
         self.assertEqual(processed.mode, "L")
         self.assertEqual(processed.size, (1000, 1000))
 
+    def test_colorspace_high_bit_depth(self):
+        frames = [Image.new('I;16', (10, 10), value) for value in (0, 25600, 65535)]
+        write_to = BytesIO()
+        frames[0].save(write_to, format='TIFF', save_all=True, append_images=frames[1:])
+        im = Image.open(write_to)
+        processed = processors.colorspace(im)
+        self.assertEqual(processed.n_frames, 3)
+        self.assertEqual(processed.mode, "L")
+        values = []
+        for i in range(processed.n_frames):
+            processed.seek(i)
+            values.append(processed.getpixel((0, 0)))
+        self.assertEqual(values, [0, 100, 255])
+
     def test_filter(self):
         no_frames = 12
         im = create_animated_image(format="webp", no_frames=no_frames)
@@ -96,3 +111,48 @@ class AnimatedFormatProcessorsTests(TestCase):
         processed_loop = processed.info.get('loop', 0)
         self.assertEqual(processed_loop, original_loop)
         self.assertEqual(processed_loop, loop_value)
+
+    def test_processors_keep_frames(self):
+        im = create_animated_image(format="gif", no_frames=4, loop=2)
+        processed = engine.process_image(
+            im, {'size': (100, 100), 'crop': True, 'sharpen': True, 'background': '#fff'},
+            [processors.colorspace, processors.scale_and_crop, processors.filters,
+             processors.background])
+        # The frames aren't re-encoded between each processor.
+        self.assertIsInstance(processed, AnimatedImage)
+        self.assertEqual(processed.n_frames, 4)
+        self.assertEqual(processed.mode, "RGB")
+        self.assertEqual(processed.info['loop'], 2)
+
+    def test_save(self):
+        frames = [Image.new('RGB', (10, 10), (i * 60, 0, 0)) for i in range(4)]
+        write_to = BytesIO()
+        frames[0].save(
+            write_to, format="GIF", save_all=True, append_images=frames[1:],
+            duration=[100, 200, 300, 400], loop=5)
+        im = AnimatedImage.from_image(Image.open(write_to))
+        self.assertEqual(im.n_frames, 4)
+
+        saved = Image.open(engine.save_pil_image(im, filename='test.gif', save_all=True))
+        self.assertEqual(saved.n_frames, 4)
+        self.assertEqual(saved.info['loop'], 5)
+        durations = []
+        for i in range(saved.n_frames):
+            saved.seek(i)
+            durations.append(saved.info['duration'])
+        self.assertEqual(durations, [100, 200, 300, 400])
+
+        # Only the first frame is saved without save_all.
+        saved = Image.open(engine.save_pil_image(im, filename='test.gif'))
+        self.assertEqual(getattr(saved, 'n_frames', 1), 1)
+
+    def test_current_frame(self):
+        im = AnimatedImage(
+            [Image.new('L', (10, 10), value) for value in (0, 100, 200)])
+        self.assertEqual(im.getpixel((0, 0)), 0)
+        im.seek(2)
+        self.assertEqual(im.tell(), 2)
+        self.assertEqual(im.getpixel((0, 0)), 200)
+        self.assertEqual(im.size, (10, 10))
+        with self.assertRaises(EOFError):
+            im.seek(3)
@@ -0,0 +1,129 @@
+from unittest import mock
+
+from django.utils import timezone
+
+from easy_thumbnails import files, models
+from easy_thumbnails.cache import ExistenceCache, existence_cache
+from easy_thumbnails.conf import settings
+from easy_thumbnails.tests import utils as test
+
+
+class ExistenceCacheTest(test.BaseTest):
+
+    def setUp(self):
+        super().setUp()
+        settings.THUMBNAIL_EXISTENCE_CACHE_TIMEOUT = 60
+        self.cache = ExistenceCache()
+
+    def test_disabled(self):
+        settings.THUMBNAIL_EXISTENCE_CACHE_TIMEOUT = 0
+        self.cache.set('key', True)
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_get_set_delete(self):
+        self.assertIsNone(self.cache.get(('a', 'b')))
+        self.cache.set(('a', 'b'), True)
+        self.assertTrue(self.cache.get(('a', 'b')))
+        self.cache.delete(('a', 'b'))
+        self.assertIsNone(self.cache.get(('a', 'b')))
+
+    def test_lru(self):
+        settings.THUMBNAIL_EXISTENCE_CACHE_SIZE = 2
+        self.cache.set(('a',), 1)
+        self.cache.set(('b',), 2)
+        self.cache.get(('a',))
+        self.cache.set(('c',), 3)
+        self.assertEqual(self.cache.get(('a',)), 1)
+        self.assertIsNone(self.cache.get(('b',)))
+        self.assertEqual(self.cache.get(('c',)), 3)
+
+    def test_expired(self):
+        settings.THUMBNAIL_EXISTENCE_CACHE_TIMEOUT = -1
+        self.cache.set(('a',), 1)
+        self.assertIsNone(self.cache.get(('a',)))
+
+    def test_shared_cache(self):
+        settings.THUMBNAIL_EXISTENCE_CACHE_BACKEND = 'default'
+        self.cache.set(('a',), 1)
+        self.cache.clear()
+        self.assertEqual(self.cache.get(('a',)), 1)
+        other_process = ExistenceCache()
+        self.assertEqual(other_process.get(('a',)), 1)
+        other_process.delete(('a',))
+        self.cache.clear()
+        self.assertIsNone(self.cache.get(('a',)))
+
+    def test_shared_only(self):
+        settings.THUMBNAIL_EXISTENCE_CACHE_BACKEND = 'default'
+        self.cache.set(('source', 'a'), 1)
+        other_process = ExistenceCache()
+        self.assertEqual(other_process.get(('source', 'a')), 1)
+        self.cache.delete(('source', 'a'))
+        # The other process didn't keep its own copy.
+        self.assertIsNone(other_process.get(('source', 'a')))
+
+
+class ThumbnailExistsCacheTest(test.BaseTest):
+
+    def setUp(self):
+        super().setUp()
+        settings.THUMBNAIL_EXISTENCE_CACHE_TIMEOUT = 60
+        existence_cache.clear()
+        self.storage = test.FakeRemoteStorage()
+        filename = self.create_image(self.storage, 'test.jpg')
+        self.thumbnailer = files.get_thumbnailer(self.storage, filename)
+        self.thumbnailer.thumbnail_storage = self.storage
+
+    def tearDown(self):
+        existence_cache.clear()
+        self.storage.delete_temporary_storage()
+        super().tearDown()
+
+    def test_cached(self):
+        options = {'size': (100, 100)}
+        self.thumbnailer.get_thumbnail(options)
+        # The first lookup after generating the thumbnail populates the cache.
+        self.thumbnailer.get_thumbnail(options, generate=False)
+        thumbnailer = files.get_thumbnailer(self.storage, 'test.jpg')
+        thumbnailer.thumbnail_storage = self.storage
+        with self.assertNumQueries(0):
+            self.assertTrue(thumbnailer.get_thumbnail(options, generate=False))
+
+    def test_source_changed(self):
+        options = {'size': (100, 100)}
+        thumb = self.thumbnailer.get_thumbnail(options)
+        self.assertTrue(self.thumbnailer.thumbnail_exists(thumb.name))
+        models.Source.objects.update(modified=timezone.now())
+        existence_cache.delete(
+            existence_cache.source_key(self.storage, 'test.jpg'))
+        thumbnailer = files.get_thumbnailer(self.storage, 'test.jpg')
+        thumbnailer.thumbnail_storage = self.storage
+        self.assertFalse(thumbnailer.thumbnail_exists(thumb.name))
+
+    def test_misses_not_cached(self):
+        options = {'size': (100, 100)}
+        self.assertIsNone(
+            self.thumbnailer.get_thumbnail(options, generate=False))
+        self.assertTrue(self.thumbnailer.get_thumbnail(options))
+        self.assertTrue(
+            self.thumbnailer.get_thumbnail(options, generate=False))
+
+    def test_source_changed_other_process(self):
+        """
+        A source saved by one process invalidates the existence checks cached
+        by other processes sharing the cache.
+        """
+        settings.THUMBNAIL_EXISTENCE_CACHE_BACKEND = 'default'
+        other_process = ExistenceCache()
+        options = {'size': (100, 100)}
+        thumb = self.thumbnailer.get_thumbnail(options)
+        with mock.patch.object(files, 'existence_cache', other_process):
+            self.assertTrue(self.thumbnailer.thumbnail_exists(thumb.name))
+        # This process saves a new version of the source.
+        models.Source.objects.update(modified=timezone.now())
+        existence_cache.delete(
+            existence_cache.source_key(self.storage, 'test.jpg'))
+        thumbnailer = files.get_thumbnailer(self.storage, 'test.jpg')
+        thumbnailer.thumbnail_storage = self.storage
+        with mock.patch.object(files, 'existence_cache', other_process):
+            self.assertFalse(thumbnailer.thumbnail_exists(thumb.name))
@@ -1,7 +1,11 @@
+import unittest
 from unittest import TestCase
-from PIL import Image, ImageCms
+from django.test import override_settings
+from PIL import Image, ImageChops, ImageCms, features
 
-from easy_thumbnails import engine
+from easy_thumbnails import engine, processors
+from easy_thumbnails.conf import settings
+from easy_thumbnails.tests import utils as test
 
 
 class SaveTest(TestCase):
@@ -28,3 +32,146 @@ class SaveTest(TestCase):
         img = Image.open(data)
 
         self.assertNotEqual(img.info.get('icc_profile'), None)
+
+    @unittest.skipUnless(features.check('avif'), 'AVIF support not available')
+    def test_save_avif(self):
+        source = Image.effect_noise((100, 100), 64).convert('RGB')
+        # The thumbnail's (JPEG) subsampling option is ignored.
+        data = engine.save_pil_image(
+            source, filename='test.avif', quality=50, subsampling=2)
+        with Image.open(data) as img:
+            self.assertEqual(img.format, 'AVIF')
+        high_quality = engine.save_pil_image(
+            source, filename='test.avif', quality=95)
+        self.assertLess(
+            len(data.getvalue()), len(high_quality.getvalue()))
+
+    @unittest.skipUnless(features.check('webp'), 'WebP support not available')
+    def test_save_options(self):
+        source = Image.new('RGB', (100, 100), (255, 0, 0))
+        with override_settings(
+                THUMBNAIL_IMAGE_SAVE_OPTIONS={'WEBP': {'lossless': True}}):
+            data = engine.save_pil_image(
+                source, filename='test.webp', quality=85, subsampling=2)
+        with Image.open(data) as img:
+            self.assertEqual(img.format, 'WEBP')
+            self.assertEqual(img.getpixel((50, 50)), (255, 0, 0))
+
+
+def double(im, double=False):
+    return im.resize((im.size[0] * 2, im.size[1] * 2)) if double else im
+
+
+class PipelineTest(test.BaseTest):
+
+    def test_cached(self):
+        pipeline = engine.get_pipeline()
+        self.assertIs(engine.get_pipeline(), pipeline)
+        self.assertIs(pipeline.processors[0], processors.colorspace)
+        self.assertIn('crop', pipeline.valid_options)
+        self.assertIn('size', pipeline.valid_options)
+        self.assertEqual(
+            pipeline.processor_options[processors.background],
+            {'background', 'size'})
+
+    def test_settings_changed(self):
+        pipeline = engine.get_pipeline()
+        settings.THUMBNAIL_PROCESSORS = (
+            'easy_thumbnails.tests.test_engine.double',)
+        changed = engine.get_pipeline()
+        self.assertIsNot(changed, pipeline)
+        self.assertEqual(changed.processors, (double,))
+        # Django's setting_changed signal also resets the pipeline.
+        with override_settings(THUMBNAIL_SOURCE_GENERATORS=()):
+            pass
+        self.assertIsNot(engine.get_pipeline(), changed)
+
+    def test_inactive_processor_skipped(self):
+        def active(im, **options):
+            calls.append(options)
+            return bool(options.get('double'))
+        calls = []
+        double.active = active
+        try:
+            pipeline = engine.Pipeline([double])
+        finally:
+            del double.active
+        source = Image.new('RGB', (10, 10))
+        self.assertEqual(pipeline.get_processors(source, {}), [])
+        self.assertIs(pipeline.process(source, {}), source)
+        self.assertEqual(
+            pipeline.get_processors(source, {'double': True}), [double])
+        self.assertEqual(
+            pipeline.process(source, {'double': True}).size, (20, 20))
+
+    def test_deferred(self):
+        def convert(im, **options):
+            calls.append(('convert', im.size))
+            return im.convert('L')
+        convert.deferrable = lambda im, **options: True
+
+        def resize(im, **options):
+            calls.append(('resize', im.size))
+            return im.resize((10, 10))
+        resize.resizes = True
+
+        def noop(im, **options):
+            calls.append(('noop', im.size))
+            return im
+        noop.active = lambda im, **options: False
+
+        source = Image.new('RGB', (100, 100))
+        calls = []
+        processed = engine.Pipeline([convert, noop, resize]).process(
+            source, {})
+        self.assertEqual(processed.mode, 'L')
+        self.assertEqual(
+            calls, [('resize', (100, 100)), ('convert', (10, 10))])
+
+        # Deferred processors run before any other active processor.
+        calls = []
+        engine.Pipeline([convert, double, resize]).process(source, {})
+        self.assertEqual(
+            calls, [('convert', (100, 100)), ('resize', (100, 100))])
+
+    def test_deferred_colorspace(self):
+        source = Image.merge('RGB', [
+            Image.linear_gradient('L').resize((800, 600)),
+            Image.radial_gradient('L').resize((800, 600)),
+            Image.new('L', (800, 600), 128)])
+        options = {'size': (80, 60), 'bw': True}
+        processed = engine.process_image(source, options)
+        self.assertEqual(processed.mode, 'L')
+        self.assertEqual(processed.size, (80, 60))
+        expected = processors.scale_and_crop(
+            processors.colorspace(source, bw=True), (80, 60))
+        difference = ImageChops.difference(processed, expected)
+        self.assertLessEqual(max(difference.getextrema()), 1)
+
+    def test_colorspace_smart_crop(self):
+        """
+        Images which are smart cropped are converted before they are scaled,
+        since the crop depends on the entropy of the converted image.
+        """
+        # The left half has detail in the red and blue channels which cancels
+        # out when converted to grayscale, the right half has a little detail
+        # in each channel.
+        noise = Image.effect_noise((200, 100), 100).point(
+            lambda x: 160 + x * 95 // 255)
+        left = Image.merge('RGB', [
+            noise, Image.new('L', (200, 100), 64),
+            noise.point(lambda x: round((255 - x) * 0.299 / 0.114))])
+        gray = Image.effect_noise((200, 100), 100).point(
+            lambda x: 100 + x // 32)
+        source = Image.new('RGB', (400, 100))
+        source.paste(left, (0, 0))
+        source.paste(Image.merge('RGB', [gray, gray, gray]), (200, 0))
+        options = {'size': (100, 100), 'bw': True, 'crop': 'smart',
+                   'reducing_gap': 0}
+        processed = engine.process_image(source, options)
+        expected = processors.scale_and_crop(
+            processors.colorspace(source, bw=True), (100, 100), crop='smart',
+            reducing_gap=0)
+        self.assertEqual(processed.mode, 'L')
+        difference = ImageChops.difference(processed, expected)
+        self.assertLessEqual(max(difference.getextrema()), 1)
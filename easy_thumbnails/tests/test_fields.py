@@ -3,7 +3,13 @@ import pickle
 
 from django import VERSION as DJANGO_VERSION
 from django.core.files.base import ContentFile
+from django.template import Context, Template
+from unittest import mock
 
+from easy_thumbnails.conf import settings
+
+from easy_thumbnails.files import prefetch_thumbnails
+from easy_thumbnails.models import SourceMetadata
 from easy_thumbnails.tests import utils, models
 from easy_thumbnails.tests.test_aliases import BaseTest as AliasBaseTest
 from easy_thumbnails.engine import NoSourceGenerator
@@ -116,9 +122,125 @@ class ThumbnailerFieldTest(AliasBaseTest):
 
         self.assertEqual(instance.picture.width, 10)
 
+    def test_saving_source_metadata(self):
+        settings.THUMBNAIL_CACHE_SOURCE_METADATA = True
+        instance = models.TestModel(avatar='avatars/avatar.jpg')
+        instance.picture.save(
+            'file.jpg', ContentFile(self._read_filefield(instance.avatar)),
+            save=False)
+        metadata = SourceMetadata.objects.get()
+        self.assertEqual(metadata.source.name, 'pictures/file.jpg')
+        self.assertEqual(
+            (metadata.size, metadata.format, metadata.mode),
+            ((10, 8), 'JPEG', 'RGB'))
+
+        # The dimensions of the image are read from the cached metadata.
+        instance = models.TestModel(picture='pictures/file.jpg')
+        with mock.patch.object(self.storage, 'open') as storage_open:
+            self.assertEqual(
+                (instance.picture.width, instance.picture.height), (10, 8))
+        storage_open.assert_not_called()
+
     def test_saving_image_field_with_resize_source_different_ext(self):
         instance = models.TestModel(avatar='avatars/avatar.jpg')
         instance.picture.save(
             'file.gif', ContentFile(self._read_filefield(instance.avatar)), save=False)
 
         self.assertEqual(instance.picture.name, 'pictures/file.jpg')
+
+
+class PrefetchThumbnailsTest(AliasBaseTest):
+    def setUp(self):
+        super().setUp()
+        self.storage = utils.FakeRemoteStorage()
+        field = models.TestModel._meta.get_field('avatar')
+        field.storage = self.storage
+        field.thumbnail_storage = self.storage
+        for i in range(3):
+            name = self.create_image(self.storage, 'avatars/%s.jpg' % i)
+            instance = models.TestModel.objects.create(avatar=name)
+            if i < 2:
+                instance.avatar.get_thumbnail({'size': (100, 100)})
+
+    def tearDown(self):
+        self.storage.delete_temporary_storage()
+        super().tearDown()
+
+    def test_prefetch_aliases(self):
+        # The instances, their sources and their thumbnails.
+        with self.assertNumQueries(3):
+            instances = prefetch_thumbnails(
+                models.TestModel.objects.order_by('pk'), aliases=['small'])
+        with self.assertNumQueries(0):
+            thumbs = [
+                instance.avatar.get_thumbnail(
+                    {'size': (100, 100), 'ALIAS': 'small'}, generate=False)
+                for instance in instances]
+        self.assertTrue(thumbs[0])
+        self.assertTrue(thumbs[1])
+        self.assertIsNone(thumbs[2])
+
+    def test_prefetch_all(self):
+        instances = list(models.TestModel.objects.order_by('pk'))
+        with self.assertNumQueries(2):
+            prefetch_thumbnails([instance.avatar for instance in instances])
+        with self.assertNumQueries(0):
+            self.assertTrue(instances[0].avatar['small'])
+            self.assertIsNone(instances[2].avatar.get_thumbnail(
+                {'size': (50, 50)}, generate=False))
+
+    def test_prefetch_generate(self):
+        instances = prefetch_thumbnails(
+            models.TestModel.objects.order_by('pk'), aliases=['small'])
+        thumb = instances[2].avatar['small']
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                instances[2].avatar.get_thumbnail(
+                    {'size': (100, 100), 'ALIAS': 'small'}).name,
+                thumb.name)
+
+    def test_prefetch_content_addressed(self):
+        settings.THUMBNAIL_NAMER = 'easy_thumbnails.namers.content_hash'
+        options = {'size': (100, 100), 'ALIAS': 'small'}
+        for i, instance in enumerate(
+                models.TestModel.objects.order_by('pk')):
+            # Give each source different contents.
+            self.storage.delete(instance.avatar.name)
+            self.create_image(
+                self.storage, instance.avatar.name, size=(800 + i, 600))
+            if i < 2:
+                instance.avatar.get_thumbnail(options)
+            else:
+                instance.avatar.get_content_hash()
+        # The instances, their sources and their thumbnails.
+        with self.assertNumQueries(3):
+            instances = prefetch_thumbnails(
+                models.TestModel.objects.order_by('pk'), aliases=['small'])
+        with self.assertNumQueries(0):
+            thumbs = [
+                instance.avatar.get_thumbnail(options, generate=False)
+                for instance in instances[:2]]
+        self.assertTrue(thumbs[0])
+        self.assertTrue(thumbs[1])
+        # Checking whether the missing thumbnail (or its transparent version)
+        # was generated from another source with the same contents takes a
+        # query each, but nothing is saved.
+        with self.assertNumQueries(2):
+            self.assertIsNone(
+                instances[2].avatar.get_thumbnail(options, generate=False))
+
+    def test_prefetch_filter(self):
+        template = Template(
+            '{% load thumbnail %}'
+            '{% for instance in instances|prefetch_thumbnails:"small" %}'
+            '{% with avatar=instance.avatar|thumbnailer_passive %}'
+            '{{ avatar.small.url }};'
+            '{% endwith %}{% endfor %}')
+        context = Context({
+            'instances': models.TestModel.objects.order_by('pk')})
+        with self.assertNumQueries(3):
+            output = template.render(context)
+        self.assertEqual(
+            output,
+            '/media/avatars/0.jpg.100x100_q85.jpg;'
+            '/media/avatars/1.jpg.100x100_q85.jpg;;')
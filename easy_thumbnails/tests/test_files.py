@@ -1,14 +1,19 @@
+import hashlib
+import os
 from io import BytesIO
 from os import path
 
+import django
+from django.core.files.base import ContentFile
 from django.test import TestCase
 from easy_thumbnails import files, utils, signals, exceptions, models, engine
 from easy_thumbnails.conf import settings
 from easy_thumbnails.options import ThumbnailOptions
 from easy_thumbnails.tests import utils as test
-from PIL import Image
+from PIL import Image, ImageChops, features
 from testfixtures import LogCapture
 import unittest
+from unittest import mock
 
 
 class FilesTest(test.BaseTest):
@@ -225,6 +230,23 @@ class FilesTest(test.BaseTest):
                 actual[2],
                 '^easy_thumbnails/tests/mockoptim.py [^ ]+ returned nothing$')
 
+    @unittest.skipIf(
+        'easy_thumbnails.optimize' not in settings.INSTALLED_APPS,
+        'optimize app not installed')
+    def test_postprocessor_content(self):
+        """the returned thumbnail reads the optimized file"""
+        settings.THUMBNAIL_OPTIMIZE_COMMAND = {'png': 'echo >> {filename}'}
+        self.ext_thumbnailer.thumbnail_extension = 'png'
+        thumb = self.ext_thumbnailer.get_thumbnail({'size': (10, 10)})
+        with self.storage.open(thumb.name) as stored:
+            optimized = stored.read()
+        self.assertTrue(optimized.endswith(b'\n'))
+        thumb.open('rb')
+        try:
+            self.assertEqual(thumb.read(), optimized)
+        finally:
+            thumb.close()
+
     @unittest.skipIf(
         'easy_thumbnails.optimize' not in settings.INSTALLED_APPS,
         'optimize app not installed')
@@ -299,6 +321,71 @@ class FilesTest(test.BaseTest):
         with self.assertNumQueries(0):
             self.assertEqual(thumb.width, 50)
 
+    def test_dimensions_from_header(self):
+        opts = {'size': (50, 50)}
+        self.thumbnailer.get_thumbnail(opts)
+        thumb = self.thumbnailer.get_thumbnail(opts)
+        with mock.patch.object(
+                files, 'get_image_dimensions') as get_image_dimensions:
+            self.assertEqual((thumb.width, thumb.height), (50, 38))
+        get_image_dimensions.assert_not_called()
+        self.assertTrue(thumb.closed)
+
+    def test_cached_dimensions_not_opened(self):
+        settings.THUMBNAIL_CACHE_DIMENSIONS = True
+        opts = {'size': (50, 50)}
+        self.thumbnailer.get_thumbnail(opts).height
+        thumb = files.ThumbnailFile(
+            self.thumbnailer.get_thumbnail(opts).name, storage=self.storage)
+        with mock.patch.object(self.storage, 'open') as storage_open:
+            self.assertEqual((thumb.width, thumb.height), (50, 38))
+        storage_open.assert_not_called()
+
+    def test_source_metadata(self):
+        settings.THUMBNAIL_CACHE_SOURCE_METADATA = True
+        self.assertIsNone(self.thumbnailer.get_source_metadata())
+        self.thumbnailer.get_thumbnail({'size': (50, 50)})
+        metadata = models.SourceMetadata.objects.get()
+        self.assertEqual(metadata.source.name, self.thumbnailer.name)
+        self.assertEqual(metadata.size, (800, 600))
+        self.assertEqual(
+            (metadata.format, metadata.mode, metadata.frames,
+             metadata.orientation), ('JPEG', 'RGB', 1, 1))
+
+        # The metadata is only read once.
+        thumbnailer = files.get_thumbnailer(
+            self.storage, self.thumbnailer.name)
+        thumbnailer.thumbnail_storage = self.storage
+        with mock.patch.object(
+                utils, 'get_source_metadata') as get_source_metadata:
+            thumbnailer.get_thumbnail({'size': (20, 20)})
+        get_source_metadata.assert_not_called()
+        self.assertEqual(thumbnailer.get_source_metadata(), metadata)
+
+    def test_source_metadata_outdated(self):
+        settings.THUMBNAIL_CACHE_SOURCE_METADATA = True
+        self.thumbnailer.get_thumbnail({'size': (50, 50)})
+        modified = models.SourceMetadata.objects.get().modified
+
+        # Replace the source file with a newer image.
+        path = self.storage.path(self.thumbnailer.name)
+        Image.new('RGB', (400, 300)).save(path, 'PNG')
+        mtime = modified.timestamp() + 10
+        os.utime(path, (mtime, mtime))
+        thumbnailer = files.get_thumbnailer(
+            self.storage, self.thumbnailer.name)
+        thumbnailer.thumbnail_storage = self.storage
+        self.assertIsNone(thumbnailer.get_source_metadata())
+
+        thumbnailer.get_thumbnail({'size': (20, 20)})
+        metadata = models.SourceMetadata.objects.get()
+        self.assertEqual((metadata.size, metadata.format), ((400, 300), 'PNG'))
+
+    def test_source_metadata_disabled(self):
+        self.thumbnailer.get_thumbnail({'size': (50, 50)})
+        self.assertFalse(models.SourceMetadata.objects.exists())
+        self.assertIsNone(self.thumbnailer.get_source_metadata())
+
     def test_add_dimension_cache(self):
         settings.THUMBNAIL_CACHE_DIMENSIONS = True
         opts = {'size': (50, 50)}
@@ -384,6 +471,195 @@ class FilesTest(test.BaseTest):
         finally:
             signals.thumbnail_created.disconnect(signal_handler)
 
+    def test_get_many_thumbnails(self):
+        existing = self.thumbnailer.get_thumbnail({'size': (50, 50)})
+        generated = []
+
+        def signal_handler(sender, **kwargs):
+            generated.append(sender.name)
+
+        signals.thumbnail_created.connect(signal_handler)
+        try:
+            thumbs = self.thumbnailer.get_many_thumbnails([
+                {'size': (200, 200)}, {'size': (50, 50)},
+                {'size': (100, 100), 'crop': True}])
+        finally:
+            signals.thumbnail_created.disconnect(signal_handler)
+        self.assertEqual(
+            [(thumb.width, thumb.height) for thumb in thumbs],
+            [(200, 150), (50, 38), (100, 100)])
+        self.assertEqual(thumbs[1].name, existing.name)
+        self.assertEqual(generated, [thumbs[0].name, thumbs[2].name])
+        self.assertEqual(
+            thumbs[0].name,
+            self.thumbnailer.get_thumbnail({'size': (200, 200)}).name)
+
+    def test_get_many_thumbnails_single_decode(self):
+        calls = []
+
+        def source_generator(source, **kwargs):
+            calls.append(kwargs)
+            return Image.new('RGB', (800, 600))
+
+        self.thumbnailer.source_generators = [source_generator]
+        thumbs = self.thumbnailer.get_many_thumbnails([
+            {'size': (200, 200)}, {'size': (100, 100)}])
+        self.assertEqual(len(calls), 1)
+        self.assertNotIn('size', calls[0])
+        self.assertEqual(
+            [(thumb.width, thumb.height) for thumb in thumbs],
+            [(200, 150), (100, 75)])
+
+    def test_get_many_thumbnails_source_options(self):
+        """
+        Thumbnails whose options change how the source is decoded don't share
+        a decoded source image.
+        """
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        data = BytesIO()
+        Image.new('RGB', (800, 400)).save(data, 'JPEG', exif=exif)
+        name = self.storage.save('rotated.jpg', ContentFile(data.getvalue()))
+        thumbnailer = files.get_thumbnailer(self.storage, name)
+        thumbnailer.thumbnail_storage = self.storage
+        with mock.patch.object(
+                files.engine, 'generate_source_image',
+                wraps=engine.generate_source_image) as generate:
+            thumbs = thumbnailer.get_many_thumbnails([
+                {'size': (100, 100), 'exif_orientation': False},
+                {'size': (80, 80)}, {'size': (60, 60), 'crop': True}])
+        # The processor options (such as crop) still share a source image.
+        self.assertEqual(generate.call_count, 2)
+        self.assertEqual(
+            [(thumb.width, thumb.height) for thumb in thumbs],
+            [(100, 50), (40, 80), (60, 60)])
+
+    def test_get_many_thumbnails_matches_single(self):
+        source = Image.effect_noise((2400, 1800), 64).convert('RGB')
+
+        def source_generator(source_file, **kwargs):
+            return source
+
+        self.thumbnailer.source_generators = [source_generator]
+        self.thumbnailer.thumbnail_extension = 'png'
+        options_list = [
+            {'size': (100, 100)}, {'size': (300, 300)},
+            {'size': (150, 150), 'crop': True}]
+        thumbs = self.thumbnailer.get_many_thumbnails(options_list)
+        for thumb, options in zip(thumbs, options_list):
+            single = self.thumbnailer.generate_thumbnail(options)
+            thumb.seek(0)
+            with Image.open(thumb) as batch, Image.open(single) as expected:
+                difference = ImageChops.difference(batch, expected)
+            self.assertLessEqual(
+                max(high for low, high in difference.getextrema()), 2)
+
+    def test_get_many_thumbnails_unreducible_modes(self):
+        """
+        Palette, bilevel and 16 bit sources can't be reduced before they are
+        converted, so they are processed at full size.
+        """
+        for name, mode, image_format in (
+                ('palette.gif', 'P', 'GIF'), ('palette.png', 'P', 'PNG'),
+                ('bilevel.png', '1', 'PNG'), ('16bit.png', 'I;16', 'PNG')):
+            filename = self.create_image(
+                self.storage, name, size=(800, 600), image_mode=mode,
+                image_format=image_format)
+            thumbnailer = files.get_thumbnailer(self.storage, filename)
+            thumbnailer.thumbnail_storage = self.storage
+            thumbs = thumbnailer.get_many_thumbnails([
+                {'size': (100, 100), 'reducing_gap': 1},
+                {'size': (50, 50), 'reducing_gap': 1}])
+            self.assertEqual(
+                [(thumb.width, thumb.height) for thumb in thumbs],
+                [(100, 75), (50, 38)], name)
+
+    def test_encoded_buffer_not_copied(self):
+        thumb = self.thumbnailer.generate_thumbnail({'size': (100, 100)})
+        self.assertIsInstance(thumb.file.file, BytesIO)
+        data = thumb.file.file.getvalue()
+        self.assertEqual(Image.open(BytesIO(data)).size, (100, 75))
+
+    def test_save_replaces_local_file(self):
+        thumb = self.thumbnailer.get_thumbnail({'size': (100, 100)})
+        self.storage.save = mock.Mock()
+        self.storage.delete = mock.Mock()
+        with open(thumb.path, 'rb') as f:
+            old_file = f.read()
+        thumb = self.thumbnailer.generate_thumbnail(
+            {'size': (100, 100), 'quality': 10})
+        self.thumbnailer.save_thumbnail(thumb)
+        # The file was replaced in place, without going through the storage.
+        self.assertFalse(self.storage.save.called)
+        self.assertFalse(self.storage.delete.called)
+        with open(thumb.path, 'rb') as f:
+            new_file = f.read()
+        self.assertNotEqual(new_file, old_file)
+        self.assertEqual(new_file, thumb.file.file.getvalue())
+        # No temporary files are left behind.
+        directory, filename = path.split(thumb.path)
+        self.assertEqual(
+            [name for name in os.listdir(directory) if filename in name],
+            [filename])
+
+    def test_save_local_permissions(self):
+        storage = test.TemporaryStorage(
+            file_permissions_mode=0o640, directory_permissions_mode=0o750)
+        self.addCleanup(storage.delete_temporary_storage)
+        self.thumbnailer.thumbnail_storage = storage
+        self.thumbnailer.thumbnail_subdir = 'thumbs'
+        thumb = self.thumbnailer.get_thumbnail({'size': (100, 100)})
+        self.assertEqual(os.stat(thumb.path).st_mode & 0o777, 0o640)
+        self.assertEqual(
+            os.stat(path.dirname(thumb.path)).st_mode & 0o777, 0o750)
+
+    def test_save_remote(self):
+        thumb = self.remote_thumbnailer.get_thumbnail({'size': (100, 100)})
+        with mock.patch.object(self.remote_storage, 'delete') as delete:
+            self.remote_thumbnailer.save_thumbnail(thumb)
+        delete.assert_called_once_with(thumb.name)
+        self.assertTrue(self.remote_storage.exists(thumb.name))
+
+        # Storages which overwrite files natively don't need to delete them.
+        self.remote_storage.thumbnail_capabilities = {'overwrite': True}
+        utils._storage_capabilities.clear()
+        thumb = self.remote_thumbnailer.generate_thumbnail(
+            {'size': (100, 100)})
+        with mock.patch.object(
+                self.remote_storage, 'delete') as delete, mock.patch.object(
+                self.remote_storage, 'save') as save:
+            self.remote_thumbnailer.save_thumbnail(thumb)
+        self.assertFalse(delete.called)
+        save.assert_called_once_with(thumb.name, thumb)
+
+    @unittest.skipIf(
+        django.VERSION < (5, 0),
+        'primary keys of upserted rows are only returned from Django 5.0')
+    def test_save_thumbnails_queries(self):
+        settings.THUMBNAIL_CACHE_DIMENSIONS = True
+        thumbnails = [
+            self.thumbnailer.generate_thumbnail({'size': (size, size)})
+            for size in (10, 20, 30)]
+        thumbnailer = files.get_thumbnailer(
+            self.storage, self.thumbnailer.name)
+        thumbnailer.thumbnail_storage = self.storage
+        # Upsert the source, the thumbnails and their dimensions.
+        with self.assertNumQueries(3):
+            thumbnailer.save_thumbnails(thumbnails)
+        # The source reference is cached now.
+        with self.assertNumQueries(2):
+            thumbnailer.save_thumbnails(thumbnails)
+        self.assertEqual(
+            sorted(models.ThumbnailDimensions.objects.values_list(
+                'width', flat=True)), [10, 20, 30])
+        for thumbnail in thumbnails:
+            self.assertTrue(thumbnailer.thumbnail_exists(thumbnail.name))
+
+    def test_get_many_thumbnails_passive(self):
+        thumbs = self.thumbnailer.get_many_thumbnails(
+            [{'size': (10, 10)}, {'size': (20, 20)}], generate=False)
+        self.assertEqual(thumbs, [None, None])
+
     def test_progressive_encoding(self):
         thumb = self.thumbnailer.generate_thumbnail(
             {'size': (99, 99), 'crop': True})
@@ -409,6 +685,337 @@ class FilesTest(test.BaseTest):
             self.assertFalse(utils.is_progressive(thumb_image))
 
 
+class ContentAddressedTest(test.BaseTest):
+
+    def setUp(self):
+        super().setUp()
+        settings.THUMBNAIL_NAMER = 'easy_thumbnails.namers.content_hash'
+        self.storage = test.TemporaryStorage()
+        self.remote_storage = test.FakeRemoteStorage()
+
+    def tearDown(self):
+        self.storage.delete_temporary_storage()
+        self.remote_storage.delete_temporary_storage()
+        super().tearDown()
+
+    def field_file(self, storage, name):
+        field = files.FakeField(storage)
+        field.attname, field.max_length = 'file', 100
+        field.thumbnail_storage = storage
+        return files.ThumbnailerFieldFile(files.FakeInstance(), field, name)
+
+    def get_thumbnailer(self, storage, name):
+        if not storage.exists(name):
+            self.create_image(storage, name)
+        thumbnailer = files.get_thumbnailer(storage, name)
+        thumbnailer.thumbnail_storage = storage
+        return thumbnailer
+
+    def test_content_hash(self):
+        thumbnailer = self.get_thumbnailer(self.storage, 'a/test.jpg')
+        with self.storage.open('a/test.jpg') as source:
+            content_hash = hashlib.sha256(source.read()).hexdigest()
+        self.assertEqual(thumbnailer.get_content_hash(), content_hash)
+        self.assertEqual(
+            models.Source.objects.get(name='a/test.jpg').content_hash,
+            content_hash)
+
+        # The recorded hash is used.
+        thumbnailer = files.get_thumbnailer(self.storage, 'a/test.jpg')
+        with mock.patch.object(utils, 'get_content_hash') as get_content_hash:
+            self.assertEqual(thumbnailer.get_content_hash(), content_hash)
+        get_content_hash.assert_not_called()
+
+        self.assertEqual(
+            thumbnailer.get_thumbnail_name({'size': (100, 100)}),
+            '%s/%s.100x100_q85.jpg' % (content_hash[:2], content_hash[:32]))
+
+    def test_content_hash_outdated(self):
+        thumbnailer = self.get_thumbnailer(self.storage, 'test.jpg')
+        content_hash = thumbnailer.get_content_hash()
+        modified = models.Source.objects.get().modified
+        self.storage.delete('test.jpg')
+        self.create_image(self.storage, 'test.jpg', size=(80, 60))
+        mtime = modified.timestamp() + 10
+        os.utime(self.storage.path('test.jpg'), (mtime, mtime))
+        thumbnailer = files.get_thumbnailer(self.storage, 'test.jpg')
+        self.assertNotEqual(thumbnailer.get_content_hash(), content_hash)
+
+    def assert_shared(self, storage):
+        thumbnailer = self.get_thumbnailer(storage, 'a/test.jpg')
+        thumb = thumbnailer.get_thumbnail({'size': (100, 100)})
+
+        # A copy of the source under another name uses the same thumbnail.
+        with storage.open('a/test.jpg') as source:
+            storage.save('b/copy.jpg', source)
+        other = self.get_thumbnailer(storage, 'b/copy.jpg')
+        # Only looking the thumbnail up doesn't save a reference to it.
+        self.assertEqual(
+            other.get_thumbnail({'size': (100, 100)}, generate=False).name,
+            thumb.name)
+        self.assertEqual(models.Thumbnail.objects.count(), 1)
+        with mock.patch.object(
+                files.Thumbnailer, 'generate_thumbnail') as generate:
+            other_thumb = other.get_thumbnail({'size': (100, 100)})
+        generate.assert_not_called()
+        self.assertEqual(other_thumb.name, thumb.name)
+        self.assertEqual(
+            sorted(models.Thumbnail.objects.values_list(
+                'source__name', flat=True)), ['a/test.jpg', 'b/copy.jpg'])
+
+        # The shared thumbnail is only deleted along with the last source
+        # which uses it.
+        thumbnailer = self.field_file(storage, 'a/test.jpg')
+        self.assertEqual(thumbnailer.delete_thumbnails(), 0)
+        self.assertTrue(storage.exists(thumb.name))
+        other = self.field_file(storage, 'b/copy.jpg')
+        self.assertEqual(other.delete_thumbnails(), 1)
+        self.assertFalse(storage.exists(thumb.name))
+
+    def test_shared(self):
+        self.assert_shared(self.storage)
+
+    def test_shared_remote(self):
+        self.assert_shared(self.remote_storage)
+
+    def test_save_resets_hash(self):
+        thumbnailer = self.field_file(self.storage, 'test.jpg')
+        thumbnailer.save('test.jpg', ContentFile(
+            self.create_image(None, None).read()), save=False)
+        content_hash = thumbnailer.get_content_hash()
+        thumbnailer.save('test.jpg', ContentFile(
+            self.create_image(None, None, size=(80, 60)).read()), save=False)
+        self.assertFalse(models.Source.objects.get(
+            name=thumbnailer.name).content_hash)
+        self.assertNotEqual(thumbnailer.get_content_hash(), content_hash)
+
+
+class PassthroughTest(test.BaseTest):
+
+    def setUp(self):
+        super().setUp()
+        settings.THUMBNAIL_PASSTHROUGH = True
+        self.storage = test.TemporaryStorage()
+
+    def tearDown(self):
+        self.storage.delete_temporary_storage()
+        super().tearDown()
+
+    def get_thumbnailer(self, name, size=(80, 60), **params):
+        data = BytesIO()
+        Image.new(params.pop('mode', 'RGB'), size).save(
+            data, Image.registered_extensions()[path.splitext(name)[1]],
+            **params)
+        name = self.storage.save(name, ContentFile(data.getvalue()))
+        thumbnailer = files.get_thumbnailer(self.storage, name)
+        thumbnailer.thumbnail_storage = self.storage
+        return thumbnailer
+
+    def assertPassthrough(self, thumbnailer, options, passthrough=True):
+        with mock.patch.object(
+                engine, 'generate_source_image',
+                wraps=engine.generate_source_image) as generate:
+            thumb = thumbnailer.get_thumbnail(options)
+        self.assertEqual(generate.called, not passthrough)
+        with self.storage.open(thumbnailer.name) as source:
+            source_data = source.read()
+        with self.storage.open(thumb.name) as thumb_file:
+            self.assertEqual(thumb_file.read() == source_data, passthrough)
+        return thumb
+
+    def test_passthrough(self):
+        settings.THUMBNAIL_CACHE_DIMENSIONS = True
+        thumbnailer = self.get_thumbnailer('test.jpg')
+        thumb = self.assertPassthrough(thumbnailer, {'size': (100, 100)})
+        self.assertEqual((thumb.width, thumb.height), (80, 60))
+        self.assertEqual(
+            models.ThumbnailDimensions.objects.get().size, (80, 60))
+        self.assertTrue(
+            thumbnailer.get_existing_thumbnail({'size': (100, 100)}))
+        self.assertPassthrough(
+            thumbnailer, {'size': (80, 0), 'crop': True, 'quality': 50})
+
+    def test_disabled(self):
+        settings.THUMBNAIL_PASSTHROUGH = False
+        thumbnailer = self.get_thumbnailer('test.jpg')
+        self.assertPassthrough(thumbnailer, {'size': (100, 100)}, False)
+
+    def test_not_satisfied(self):
+        thumbnailer = self.get_thumbnailer('test.jpg')
+        for options in (
+                {'size': (70, 70)},
+                {'size': (100, 50), 'crop': True},
+                {'size': (100, 100), 'upscale': True},
+                {'size': (100, 100), 'bw': True},
+                {'size': (100, 100), 'sharpen': True},
+                {'size': (100, 100), 'background': '#fff'}):
+            self.assertPassthrough(thumbnailer, options, False)
+
+    def test_format(self):
+        # The thumbnail would be a JPEG.
+        thumbnailer = self.get_thumbnailer('test.png')
+        self.assertPassthrough(thumbnailer, {'size': (100, 100)}, False)
+        thumbnailer = self.get_thumbnailer('alpha.png', mode='RGBA')
+        thumb = self.assertPassthrough(thumbnailer, {'size': (100, 100)})
+        self.assertTrue(thumb.name.endswith('.png'))
+        thumbnailer = self.get_thumbnailer('cmyk.jpg', mode='CMYK')
+        self.assertPassthrough(thumbnailer, {'size': (100, 100)}, False)
+
+    def test_exif_orientation(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        thumbnailer = self.get_thumbnailer('test.jpg', exif=exif)
+        self.assertPassthrough(thumbnailer, {'size': (100, 100)}, False)
+        self.assertPassthrough(
+            thumbnailer, {'size': (90, 90), 'exif_orientation': False})
+
+    def test_animated(self):
+        thumbnailer = self.get_thumbnailer(
+            'test.gif', mode='L', save_all=True,
+            append_images=[Image.new('L', (80, 60), 255)])
+        thumbnailer.thumbnail_extension = 'gif'
+        self.assertPassthrough(thumbnailer, {'size': (100, 100)}, False)
+
+    def test_many_thumbnails(self):
+        thumbnailer = self.get_thumbnailer('test.jpg')
+        thumbs = thumbnailer.get_many_thumbnails(
+            [{'size': (100, 100)}, {'size': (40, 40)}])
+        self.assertEqual(
+            [(thumb.width, thumb.height) for thumb in thumbs],
+            [(80, 60), (40, 30)])
+        with self.storage.open(thumbnailer.name) as source:
+            source_data = source.read()
+        with self.storage.open(thumbs[0].name) as thumb_file:
+            self.assertEqual(thumb_file.read(), source_data)
+
+    def test_cached_metadata(self):
+        """
+        Sources which are too large are ruled out from their cached metadata,
+        without opening the file.
+        """
+        settings.THUMBNAIL_CACHE_SOURCE_METADATA = True
+        thumbnailer = self.get_thumbnailer('test.jpg')
+        thumbnailer.get_thumbnail({'size': (40, 40)})
+        thumbnailer = files.get_thumbnailer(self.storage, thumbnailer.name)
+        with mock.patch.object(files.Image, 'open') as image_open:
+            self.assertEqual(
+                thumbnailer._passthrough_thumbnails([{'size': (70, 70)}]),
+                [None])
+        image_open.assert_not_called()
+
+
+@unittest.skipUnless(
+    features.check('webp') and features.check('avif'),
+    'WebP and AVIF support not available')
+class FormatsTest(test.BaseTest):
+
+    def setUp(self):
+        super().setUp()
+        self.storage = test.TemporaryStorage()
+        filename = self.create_image(self.storage, 'test.jpg')
+        self.thumbnailer = files.get_thumbnailer(self.storage, filename)
+        self.thumbnailer.thumbnail_storage = self.storage
+        filename = self.create_image(
+            self.storage, 'transparent.png', image_mode='RGBA',
+            image_format='PNG')
+        self.transparent_thumbnailer = files.get_thumbnailer(
+            self.storage, filename)
+        self.transparent_thumbnailer.thumbnail_storage = self.storage
+
+    def tearDown(self):
+        self.storage.delete_temporary_storage()
+        super().tearDown()
+
+    def test_format(self):
+        thumb = self.thumbnailer.get_thumbnail(
+            {'size': (100, 100), 'format': 'webp'})
+        self.assertEqual(thumb.name, 'test.jpg.100x100_q85.webp')
+        self.assertEqual(thumb.mime_type, 'image/webp')
+        with Image.open(thumb) as image:
+            self.assertEqual(image.format, 'WEBP')
+
+    def test_transparent_fallback(self):
+        name = self.transparent_thumbnailer.get_thumbnail_name(
+            {'size': (100, 100), 'format': 'jpg'}, transparent=True)
+        self.assertEqual(path.splitext(name)[1], '.png')
+        name = self.transparent_thumbnailer.get_thumbnail_name(
+            {'size': (100, 100), 'format': 'webp'}, transparent=True)
+        self.assertEqual(path.splitext(name)[1], '.webp')
+
+    def test_formats(self):
+        options = {'size': (100, 100), 'formats': ['avif', 'webp', 'jpg']}
+        with mock.patch.object(
+                engine, 'generate_source_image',
+                wraps=engine.generate_source_image) as generate:
+            thumb = self.thumbnailer.get_thumbnail(options)
+        # The source image is only decoded once.
+        self.assertEqual(generate.call_count, 1)
+        self.assertEqual(thumb.name, 'test.jpg.100x100_q85.jpg')
+        self.assertEqual(
+            [alternative.name for alternative in thumb.alternatives],
+            ['test.jpg.100x100_q85.avif', 'test.jpg.100x100_q85.webp'])
+        for alternative in thumb.alternatives:
+            self.assertTrue(self.storage.exists(alternative.name))
+        self.assertEqual(
+            thumb.picture(alt='A'),
+            '<picture>'
+            '<source srcset="/media/test.jpg.100x100_q85.avif" '
+            'type="image/avif" />'
+            '<source srcset="/media/test.jpg.100x100_q85.webp" '
+            'type="image/webp" />'
+            '<img alt="A" height="75" '
+            'src="/media/test.jpg.100x100_q85.jpg" width="100" />'
+            '</picture>')
+
+        # Existing thumbnails are found for each format.
+        with mock.patch.object(engine, 'generate_source_image') as generate:
+            thumb = self.thumbnailer.get_thumbnail(options)
+        generate.assert_not_called()
+        self.assertEqual(len(thumb.alternatives), 2)
+
+    def test_formats_options(self):
+        thumb = self.thumbnailer.get_thumbnail({
+            'size': (100, 100),
+            'formats': {'avif': {'quality': 60}, 'unknown': {}, 'jpg': {}}})
+        self.assertEqual(
+            [alternative.name for alternative in thumb.alternatives],
+            ['test.jpg.100x100_q60.avif'])
+        self.assertEqual(thumb.name, 'test.jpg.100x100_q85.jpg')
+
+    def test_formats_string(self):
+        thumb = self.thumbnailer.get_thumbnail(
+            {'size': (100, 100), 'formats': 'webp, jpg'})
+        self.assertEqual(
+            [alternative.name for alternative in thumb.alternatives],
+            ['test.jpg.100x100_q85.webp'])
+
+    def test_many_thumbnails(self):
+        thumbs = self.thumbnailer.get_many_thumbnails([
+            {'size': (100, 100), 'formats': ['webp', 'jpg']},
+            {'size': (50, 50)}])
+        self.assertEqual(
+            [thumb.name for thumb in thumbs],
+            ['test.jpg.100x100_q85.jpg', 'test.jpg.50x50_q85.jpg'])
+        self.assertEqual(len(thumbs[0].alternatives), 1)
+        self.assertEqual(thumbs[1].alternatives, [])
+
+    def test_passive(self):
+        missed = []
+
+        def signal_handler(sender, **kwargs):
+            missed.append(kwargs['options'])
+
+        signals.thumbnail_missed.connect(signal_handler)
+        try:
+            options = {'size': (100, 100), 'formats': ['webp', 'jpg']}
+            thumb = self.thumbnailer.get_thumbnail(options, generate=False)
+        finally:
+            signals.thumbnail_missed.disconnect(signal_handler)
+        self.assertIsNone(thumb)
+        # The miss is only signalled once, rather than for each format.
+        self.assertEqual(missed, [self.thumbnailer.get_options(options)])
+
+
 class FakeSourceGenerator:
 
     def __init__(self, fail=False):
@@ -425,6 +1032,41 @@ class EngineTest(TestCase):
     def setUp(self):
         self.source = BytesIO(b'file-contents')
 
+    def test_reduce_image(self):
+        image = Image.new('RGB', (800, 600))
+        reduced = engine.reduce_image(image, [
+            {'size': (100, 100), 'reducing_gap': 1},
+            {'size': (200, 100), 'crop': True, 'reducing_gap': 1}])
+        self.assertEqual(reduced.size, (200, 150))
+
+    def test_reduce_image_reducing_gap(self):
+        # The image is kept at least THUMBNAIL_REDUCING_GAP (3.0) times larger
+        # than each thumbnail.
+        image = Image.new('RGB', (2400, 1800))
+        reduced = engine.reduce_image(
+            image, [{'size': (100, 100)}, {'size': (200, 100), 'crop': True}])
+        self.assertEqual(reduced.size, (600, 450))
+        reduced = engine.reduce_image(image, [
+            {'size': (100, 100), 'reducing_gap': 12},
+            {'size': (200, 100), 'crop': True}])
+        self.assertEqual(reduced.size, (1200, 900))
+
+    def test_reduce_image_modes(self):
+        for mode in ('P', '1', 'I;16'):
+            image = Image.new(mode, (800, 600))
+            self.assertIs(
+                engine.reduce_image(image, [{'size': (100, 100)}]), image)
+
+    def test_reduce_image_not_reduced(self):
+        image = Image.new('RGB', (800, 600))
+        for options_list in (
+                [{'size': (500, 500)}],
+                [{'size': (100, 100)}, {'size': (1000, 1000)}],
+                [{'size': (100, 100), 'autocrop': True}],
+                [{'size': (100, 100), 'reducing_gap': 1},
+                 {'size': (50, 50), 'reducing_gap': 0}]):
+            self.assertIs(engine.reduce_image(image, options_list), image)
+
     def test_single_fail(self):
         source_generators = [FakeSourceGenerator(fail=True)]
         self.assertRaises(
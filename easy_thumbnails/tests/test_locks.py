@@ -0,0 +1,145 @@
+import shutil
+import tempfile
+
+from easy_thumbnails import files, locks, signals
+from easy_thumbnails.conf import settings
+from easy_thumbnails.tests import utils as test
+
+
+def temporary_lock_dir(test_case):
+    lock_dir = tempfile.mkdtemp()
+    test_case.addCleanup(shutil.rmtree, lock_dir)
+    return lock_dir
+
+
+class LockBackendTest(test.BaseTest):
+
+    def assertExclusive(self, lock_class):
+        lock = lock_class('some-key', timeout=1)
+        other = lock_class('some-key', timeout=1)
+        unrelated = lock_class('another-key', timeout=1)
+        self.assertTrue(lock.acquire())
+        try:
+            self.assertFalse(other.acquire(blocking=False))
+            self.assertTrue(unrelated.acquire(blocking=False))
+            unrelated.release()
+        finally:
+            lock.release()
+        self.assertTrue(other.acquire(blocking=False))
+        other.release()
+
+    def test_cache_lock(self):
+        self.assertExclusive(locks.CacheLock)
+
+    def test_file_lock(self):
+        settings.THUMBNAIL_GENERATION_LOCK_DIR = temporary_lock_dir(self)
+        self.assertExclusive(locks.FileLock)
+
+    def test_disabled(self):
+        self.assertIsNone(locks.get_generation_lock('some-key'))
+
+
+class GenerationLockTest(test.BaseTest):
+
+    def setUp(self):
+        super().setUp()
+        self.storage = test.TemporaryStorage()
+        filename = self.create_image(self.storage, 'test.jpg')
+        self.thumbnailer = files.get_thumbnailer(self.storage, filename)
+        self.thumbnailer.thumbnail_storage = self.storage
+        settings.THUMBNAIL_GENERATION_LOCK = 'easy_thumbnails.locks.CacheLock'
+        settings.THUMBNAIL_GENERATION_LOCK_TIMEOUT = 0.2
+
+    def tearDown(self):
+        self.storage.delete_temporary_storage()
+        super().tearDown()
+
+    def test_generate(self):
+        options = {'size': (100, 100)}
+        thumb = self.thumbnailer.get_thumbnail(options)
+        self.assertTrue(thumb)
+        lock = self.thumbnailer.get_generation_lock(options)
+        self.assertTrue(lock.acquire(blocking=False))
+        lock.release()
+
+    def test_locked_passive(self):
+        settings.THUMBNAIL_GENERATION_LOCK_WAIT = False
+        options = {'size': (100, 100)}
+        lock = self.thumbnailer.get_generation_lock(options)
+        lock.acquire()
+        try:
+            self.assertIsNone(self.thumbnailer.get_thumbnail(options))
+        finally:
+            lock.release()
+        self.assertTrue(self.thumbnailer.get_thumbnail(options))
+
+    def test_locked_wait_timeout(self):
+        # Cache locks expire after the timeout, so use a file lock to check
+        # that waiting gives up.
+        settings.THUMBNAIL_GENERATION_LOCK = 'easy_thumbnails.locks.FileLock'
+        settings.THUMBNAIL_GENERATION_LOCK_DIR = temporary_lock_dir(self)
+        options = {'size': (100, 100)}
+        lock = self.thumbnailer.get_generation_lock(options)
+        lock.acquire()
+        try:
+            self.assertIsNone(self.thumbnailer.get_thumbnail(options))
+        finally:
+            lock.release()
+
+    def test_locked_wait_existing(self):
+        """
+        A thumbnail generated while waiting for the lock is returned rather
+        than being generated again.
+        """
+        options = {'size': (100, 100)}
+        existing = self.thumbnailer.get_thumbnail(options)
+        self.thumbnailer.generate_thumbnail = None
+        self.thumbnailer.get_existing_thumbnail = (
+            lambda options, existing=[None, existing]: existing.pop(0))
+        thumb = self.thumbnailer.get_thumbnail(options)
+        self.assertEqual(thumb.name, existing.name)
+
+    def test_many_locked_passive(self):
+        settings.THUMBNAIL_GENERATION_LOCK_WAIT = False
+        missed = []
+
+        def signal_handler(sender, **kwargs):
+            missed.append(kwargs['options']['size'])
+
+        lock = self.thumbnailer.get_generation_lock({'size': (100, 100)})
+        lock.acquire()
+        signals.thumbnail_missed.connect(signal_handler)
+        try:
+            thumbs = self.thumbnailer.get_many_thumbnails(
+                [{'size': (100, 100)}, {'size': (50, 50)}])
+        finally:
+            signals.thumbnail_missed.disconnect(signal_handler)
+            lock.release()
+        self.assertIsNone(thumbs[0])
+        self.assertTrue(thumbs[1])
+        self.assertEqual(missed, [(100, 100)])
+        # The locks taken for generating the other thumbnail were released.
+        lock = self.thumbnailer.get_generation_lock({'size': (50, 50)})
+        self.assertTrue(lock.acquire(blocking=False))
+        lock.release()
+
+    def test_formats_locked_passive(self):
+        """
+        Generating a thumbnail in several formats takes the lock of each
+        format's thumbnail.
+        """
+        settings.THUMBNAIL_GENERATION_LOCK_WAIT = False
+        options = {'size': (100, 100), 'formats': ['webp', 'jpg']}
+        lock = self.thumbnailer.get_generation_lock(
+            {'size': (100, 100), 'format': 'webp'})
+        lock.acquire()
+        try:
+            thumb = self.thumbnailer.get_thumbnail(options)
+        finally:
+            lock.release()
+        self.assertEqual(thumb.name, 'test.jpg.100x100_q85.jpg')
+        self.assertEqual(thumb.alternatives, [])
+        thumb = self.thumbnailer.get_thumbnail(options)
+        self.assertEqual(
+            [alternative.name for alternative in thumb.alternatives],
+            ['test.jpg.100x100_q85.webp'])
@@ -1,8 +1,13 @@
 """Tests for the models module.
 """
 
+from datetime import timedelta
+
+from django.utils import timezone
+
 from easy_thumbnails import utils
-from easy_thumbnails.models import Thumbnail, Source
+from easy_thumbnails.models import (
+    Thumbnail, ThumbnailDimensions, Source, SourceMetadata)
 from easy_thumbnails.tests import utils as test
 
 
@@ -71,3 +76,57 @@ class FileManagerTest(test.BaseTest):
             Thumbnail.objects.get(name=self.filename)
         except Thumbnail.DoesNotExist:
             self.fail('Thumb should exist now')
+
+    def test_upsert_files(self):
+        """Create and update several thumbs at once"""
+        existing = Thumbnail.objects.create(
+            storage_hash=self.storage_hash, name='b.jpg', source=self.source,
+            modified=timezone.now() - timedelta(days=1))
+        modified = timezone.now()
+        thumbs = Thumbnail.objects.upsert_files(
+            self.storage, ['a.jpg', 'b.jpg'], modified, source=self.source)
+        self.assertEqual([thumb.name for thumb in thumbs], ['a.jpg', 'b.jpg'])
+        self.assertEqual(thumbs[1].pk, existing.pk)
+        for thumb in thumbs:
+            self.assertEqual(Thumbnail.objects.get(pk=thumb.pk).modified,
+                             modified)
+        self.assertEqual(Thumbnail.objects.count(), 2)
+
+
+class ThumbnailDimensionsManagerTest(test.BaseTest):
+
+    def test_upsert(self):
+        source = Source.objects.create(name='source.jpg', storage_hash='a')
+        thumbnail = Thumbnail.objects.create(
+            name='thumb.jpg', storage_hash='a', source=source)
+        with self.assertNumQueries(1):
+            ThumbnailDimensions.objects.upsert([ThumbnailDimensions(
+                thumbnail=thumbnail, width=10, height=20)])
+        with self.assertNumQueries(1):
+            ThumbnailDimensions.objects.upsert([ThumbnailDimensions(
+                thumbnail=thumbnail, width=30, height=40)])
+        dimensions = ThumbnailDimensions.objects.get()
+        self.assertEqual(dimensions.thumbnail, thumbnail)
+        self.assertEqual(dimensions.size, (30, 40))
+
+
+class SourceMetadataTest(test.BaseTest):
+
+    def test_upsert(self):
+        source = Source.objects.create(name='source.jpg', storage_hash='a')
+        with self.assertNumQueries(1):
+            SourceMetadata.objects.upsert(SourceMetadata(
+                source=source, width=10, height=20, format='JPEG'))
+        with self.assertNumQueries(1):
+            SourceMetadata.objects.upsert(SourceMetadata(
+                source=source, width=30, height=40, format='PNG'))
+        metadata = SourceMetadata.objects.get()
+        self.assertEqual(metadata.source, source)
+        self.assertEqual(metadata.size, (30, 40))
+        self.assertEqual(metadata.format, 'PNG')
+
+    def test_oriented_size(self):
+        metadata = SourceMetadata(width=30, height=40)
+        self.assertEqual(metadata.oriented_size, (30, 40))
+        metadata.orientation = 6
+        self.assertEqual(metadata.oriented_size, (40, 30))
@@ -9,6 +9,9 @@ class FakeThumbnailer:
         self.thumbnail_basedir = basedir
         self.thumbnail_subdir = subdir
 
+    def get_content_hash(self):
+        return '3f2a9c17d04b6e85a1c2f93e0d7b5a64' + '0' * 32
+
 
 class Default(TestCase):
 
@@ -75,3 +78,17 @@ class SourceHashed(TestCase):
             thumbnail_extension='jpg',
         )
         self.assertEqual(filename, '1xedFtqllFo9_100x100_QHCa6G1l.jpg')
+
+
+class ContentHash(TestCase):
+
+    def test_basic(self):
+        filename = namers.content_hash(
+            thumbnailer=FakeThumbnailer(),
+            prepared_options=['100x100', 'q80', 'crop', 'upscale'],
+            source_filename='source.jpg',
+            thumbnail_extension='jpg',
+        )
+        self.assertEqual(
+            filename,
+            '3f/3f2a9c17d04b6e85a1c2f93e0d7b5a64.100x100_q80_crop_upscale.jpg')
@@ -85,6 +85,26 @@ class ScaleAndCropTest(TestCase):
         expected = image.crop([78, 0, 678, 600])
         self.assertImagesEqual(smart_crop, expected)
 
+    def test_crop_smart_detail(self):
+        image = Image.new('RGB', (200, 200), (255, 255, 255))
+        ImageDraw.Draw(image).rectangle((150, 160, 189, 189), 'red')
+
+        smart_crop = processors.scale_and_crop(image, (50, 200), crop='smart')
+        self.assertImagesEqual(smart_crop, image.crop([140, 0, 190, 200]))
+
+        smart_crop = processors.scale_and_crop(image, (200, 40), crop='smart')
+        self.assertImagesEqual(smart_crop, image.crop([0, 150, 200, 190]))
+
+    def test_smart_crop_axis(self):
+        entropies = [0] * 40 + [1] * 20 + [0] * 40
+
+        def entropy(start, end):
+            return sum(entropies[start:end])
+
+        self.assertEqual(
+            processors._smart_crop_axis(entropy, 100, 80), (40, 60))
+        self.assertEqual(processors._smart_crop_axis(entropy, 100, 0), (0, 100))
+
     def test_crop_scale(self):
         image = create_image(size=(200, 400))
 
@@ -134,6 +154,40 @@ class ScaleAndCropTest(TestCase):
         cropped = processors.scale_and_crop(image, size, crop=True, zoom=40)
         self.assertEqual(cropped.size, size)
 
+    def test_resample(self):
+        image = create_image(size=(800, 600))
+
+        nearest = processors.scale_and_crop(
+            image, (100, 100), resample='nearest')
+        self.assertImagesEqual(
+            nearest, image.resize((100, 75), Image.Resampling.NEAREST))
+        bicubic = processors.scale_and_crop(
+            image, (100, 100), resample=Image.Resampling.BICUBIC,
+            reducing_gap=0)
+        self.assertImagesEqual(
+            bicubic, image.resize((100, 75), Image.Resampling.BICUBIC))
+
+        self.assertRaises(
+            ValueError, processors.scale_and_crop, image, (100, 100),
+            resample='blurry')
+
+    def test_reducing_gap(self):
+        image = create_image(size=(2400, 1800))
+        expected = image.resize((100, 75), Image.Resampling.LANCZOS)
+
+        full = processors.scale_and_crop(image, (100, 100), reducing_gap=0)
+        self.assertImagesEqual(full, expected)
+
+        # By default, the image is reduced before it is resampled, which is
+        # nearly identical to resampling the full sized image.
+        reduced = processors.scale_and_crop(image, (100, 100))
+        self.assertImagesEqual(
+            reduced, image.resize(
+                (100, 75), Image.Resampling.LANCZOS, reducing_gap=3.0))
+        difference = ImageChops.difference(reduced, expected)
+        self.assertLessEqual(
+            max(high for low, high in difference.getextrema()), 2)
+
     def test_crop_target(self):
         image = create_image()
 
@@ -178,9 +232,53 @@ class ScaleAndCropTest(TestCase):
         expected = image.crop([0, 280, 800, 380])
         self.assertImagesEqual(tl_crop, expected)
 
+    def test_active(self):
+        active = processors.scale_and_crop.active
+        image = create_image()
+        self.assertFalse(active(image, size=(800, 600)))
+        self.assertFalse(active(image, size=(1000, 1000), crop=True))
+        self.assertFalse(active(image, size=(1000, 0)))
+        self.assertTrue(active(image, size=(799, 1000)))
+        self.assertTrue(active(image, size=(1000, 500), crop=True))
+        self.assertTrue(active(image, size=(1000, 1000), upscale=True))
+        self.assertTrue(active(image, size=(1000, 1000), zoom=10))
+
 
 class ColorspaceTest(TestCase):
 
+    def test_high_bit_depth(self):
+        for mode in ('I', 'I;16', 'I;16B'):
+            image = Image.new(mode, (3, 1))
+            image.putpixel((0, 0), 0)
+            image.putpixel((1, 0), 256 * 100 + 255)
+            image.putpixel((2, 0), 65535)
+            processed = processors.colorspace(image)
+            self.assertEqual(processed.mode, 'L')
+            self.assertEqual(
+                [processed.getpixel((x, 0)) for x in range(3)], [0, 100, 255])
+
+    def test_high_bit_depth_clipped(self):
+        image = Image.new('I', (2, 1))
+        image.putpixel((0, 0), -1000)
+        image.putpixel((1, 0), 100000)
+        processed = processors.colorspace(image)
+        self.assertEqual(
+            [processed.getpixel((x, 0)) for x in range(2)], [0, 255])
+
+    def test_stretch_levels(self):
+        image = Image.new('I;16', (3, 1))
+        image.putpixel((0, 0), 1000)
+        image.putpixel((1, 0), 1500)
+        image.putpixel((2, 0), 2000)
+        processed = processors.colorspace(image, stretch_levels=True)
+        self.assertEqual(processed.mode, 'L')
+        self.assertEqual(
+            [processed.getpixel((x, 0)) for x in range(3)], [0, 128, 255])
+
+        processed = processors.colorspace(
+            Image.new('I;16', (3, 1), 1000), stretch_levels=True)
+        self.assertEqual(processed.getpixel((0, 0)), 0)
+
     def test_standard(self):
         image = Image.new('RGB', (800, 600))
         processed = processors.colorspace(image)
@@ -229,6 +327,31 @@ class ColorspaceTest(TestCase):
         processed = processors.colorspace(image, bw=True)
         self.assertEqual(processed.mode, 'LA')
 
+    def test_active(self):
+        active = processors.colorspace.active
+        self.assertFalse(active(Image.new('RGB', (10, 10))))
+        self.assertFalse(active(Image.new('RGBA', (10, 10))))
+        self.assertFalse(active(Image.new('L', (10, 10)), bw=True))
+        self.assertTrue(active(Image.new('RGB', (10, 10)), bw=True))
+        self.assertTrue(
+            active(Image.new('RGBA', (10, 10)), replace_alpha='#fff'))
+        self.assertTrue(active(Image.new('CMYK', (10, 10))))
+        self.assertTrue(active(Image.new('P', (10, 10))))
+        self.assertTrue(active(Image.new('I;16', (10, 10))))
+
+    def test_deferrable(self):
+        deferrable = processors.colorspace.deferrable
+        self.assertTrue(deferrable(Image.new('RGB', (10, 10)), bw=True))
+        self.assertTrue(deferrable(Image.new('I;16', (10, 10))))
+        self.assertFalse(
+            deferrable(Image.new('I;16', (10, 10)), stretch_levels=True))
+        self.assertFalse(deferrable(Image.new('RGBA', (10, 10)), bw=True))
+        self.assertFalse(deferrable(Image.new('P', (10, 10))))
+        self.assertFalse(deferrable(Image.new('CMYK', (10, 10))))
+        self.assertFalse(
+            deferrable(Image.new('RGB', (10, 10)), bw=True, crop='smart'))
+        self.assertFalse(deferrable(Image.new('I;16', (10, 10)), crop='smart'))
+
 
 class AutocropTest(TestCase):
 
@@ -236,9 +359,32 @@ class AutocropTest(TestCase):
         processed = processors.autocrop(create_image(), autocrop=True)
         self.assertEqual(processed.size, (481, 421))
 
+    def test_active(self):
+        self.assertFalse(processors.autocrop.active(create_image()))
+        self.assertTrue(
+            processors.autocrop.active(create_image(), autocrop=True))
+
+
+class FiltersTest(TestCase):
+
+    def test_active(self):
+        self.assertFalse(processors.filters.active(create_image()))
+        self.assertTrue(processors.filters.active(create_image(), detail=True))
+        self.assertTrue(
+            processors.filters.active(create_image(), sharpen=True))
+
 
 class BackgroundTest(TestCase):
 
+    def test_active(self):
+        active = processors.background.active
+        image = create_image()
+        self.assertFalse(active(image, size=(1000, 1000)))
+        self.assertTrue(active(image, size=(1000, 1000), background='#fff'))
+        self.assertTrue(active(image, size=(800, 601), background='#fff'))
+        self.assertFalse(active(image, size=(800, 600), background='#fff'))
+        self.assertFalse(active(image, size=(1000, 0), background='#fff'))
+
     def test_basic(self):
         image = create_image()
         processed = processors.background(
@@ -0,0 +1,114 @@
+import unittest
+from io import BytesIO
+
+from PIL import Image, features
+
+from easy_thumbnails import probe
+
+
+def image_data(format, size=(120, 80), mode='RGB', **params):
+    data = BytesIO()
+    Image.new(mode, size, 'red').save(data, format, **params)
+    data.seek(0)
+    return data
+
+
+class Unseekable:
+    """
+    A file which can only be read, recording how much of it has been read.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.read_bytes = 0
+
+    def read(self, size=-1):
+        data = self.data.read(size)
+        self.read_bytes += len(data)
+        return data
+
+
+class GetImageDimensionsTest(unittest.TestCase):
+
+    def test_jpeg(self):
+        self.assertEqual(
+            probe.get_image_dimensions(image_data('JPEG')), (120, 80))
+        data = image_data('JPEG', progressive=True)
+        self.assertEqual(probe.get_image_dimensions(data), (120, 80))
+
+    def test_jpeg_segments(self):
+        """
+        Segments before the frame header (such as EXIF and ICC profiles) are
+        skipped.
+        """
+        exif = Image.Exif()
+        exif[0x010E] = 'x' * 10000
+        data = image_data('JPEG', exif=exif, icc_profile=b'y' * 70000)
+        self.assertEqual(probe.get_image_dimensions(data), (120, 80))
+
+    def test_png(self):
+        self.assertEqual(
+            probe.get_image_dimensions(image_data('PNG', mode='RGBA')),
+            (120, 80))
+
+    def test_gif(self):
+        self.assertEqual(
+            probe.get_image_dimensions(image_data('GIF')), (120, 80))
+
+    @unittest.skipUnless(features.check('webp'), 'WebP support not available')
+    def test_webp(self):
+        self.assertEqual(
+            probe.get_image_dimensions(image_data('WEBP')), (120, 80))
+        self.assertEqual(
+            probe.get_image_dimensions(image_data('WEBP', lossless=True)),
+            (120, 80))
+        # Transparent images have an extended (VP8X) header.
+        self.assertEqual(
+            probe.get_image_dimensions(image_data('WEBP', mode='RGBA')),
+            (120, 80))
+
+    @unittest.skipUnless(features.check('avif'), 'AVIF support not available')
+    def test_avif(self):
+        self.assertEqual(
+            probe.get_image_dimensions(image_data('AVIF')), (120, 80))
+
+    def test_svg(self):
+        svg = (
+            b'<?xml version="1.0"?>\n<!-- <svg width="1" height="1"> -->\n'
+            b'<svg xmlns="http://www.w3.org/2000/svg" width="120" '
+            b"height='80.5px' viewBox=\"0 0 12 8\"><rect/></svg>")
+        self.assertEqual(
+            probe.get_image_dimensions(BytesIO(svg)), (120, 80.5))
+
+    def test_svg_view_box(self):
+        svg = b'<svg width="100%" viewBox="0 0 300 150"></svg>'
+        self.assertEqual(
+            probe.get_image_dimensions(BytesIO(svg)), (300, 150))
+        svg = b'<svg width="5cm" height="3cm"></svg>'
+        self.assertIsNone(probe.get_image_dimensions(BytesIO(svg)))
+
+    def test_unknown(self):
+        self.assertIsNone(probe.get_image_dimensions(image_data('BMP')))
+        self.assertIsNone(probe.get_image_dimensions(BytesIO()))
+        data = image_data('PNG')
+        self.assertIsNone(
+            probe.get_image_dimensions(BytesIO(data.read(20))))
+        data = image_data('JPEG')
+        self.assertIsNone(
+            probe.get_image_dimensions(BytesIO(data.read(100))))
+
+    def test_position_restored(self):
+        data = image_data('PNG')
+        data.seek(10)
+        self.assertEqual(probe.get_image_dimensions(data), (120, 80))
+        self.assertEqual(data.tell(), 10)
+
+    def test_header_only(self):
+        """
+        Only the header of the image is read.
+        """
+        data = image_data('JPEG', size=(1200, 800), quality=100)
+        source = Unseekable(data)
+        self.assertEqual(probe.get_image_dimensions(source), (1200, 800))
+        self.assertLess(source.read_bytes, 1024)
+        self.assertLess(source.read_bytes, len(data.getvalue()) / 10)
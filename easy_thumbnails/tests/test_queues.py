@@ -0,0 +1,138 @@
+import datetime
+from io import StringIO
+
+from django.core.management import call_command
+from django.utils import timezone
+
+from easy_thumbnails import files, models, queues, signal_handlers, signals
+from easy_thumbnails.alias import aliases
+from easy_thumbnails.conf import settings
+from easy_thumbnails.tests import models as test_models
+from easy_thumbnails.tests.test_aliases import BaseTest as AliasBaseTest
+
+
+class QueueTest(AliasBaseTest):
+    create_file = True
+
+    def setUp(self):
+        super().setUp()
+        self.profile = test_models.Profile(avatar='avatars/test.jpg')
+
+    def thumbnail_names(self):
+        profile = test_models.Profile(avatar='avatars/test.jpg')
+        return sorted(
+            thumbnail.name for thumbnail in profile.avatar.get_thumbnails())
+
+    def test_queue_aliases(self):
+        signal_handlers.queue_aliases(self.profile.avatar)
+        job = models.ThumbnailJob.objects.get()
+        self.assertEqual(job.name, 'avatars/test.jpg')
+        self.assertEqual(job.target, 'easy_thumbnails_tests.Profile.avatar')
+        self.assertEqual(
+            sorted(job.items), ['avatar', 'banner', 'large', 'small'])
+        self.assertEqual(self.thumbnail_names(), [])
+
+        stdout = StringIO()
+        call_command(
+            'thumbnail_worker', once=True, concurrency=1, stdout=stdout)
+        self.assertEqual(stdout.getvalue(), 'Processed 1 jobs (0 failed).\n')
+        self.assertFalse(models.ThumbnailJob.objects.exists())
+        self.assertEqual(self.thumbnail_names(), [
+            'avatars/test.jpg.200x200_q85.jpg',
+            'avatars/test.jpg.20x20_q85_crop.jpg',
+            'avatars/test.jpg.600x80_q85_crop.jpg',
+            'avatars/test.jpg.80x80_q85_crop.jpg',
+        ])
+
+    def test_queue_missed_thumbnail(self):
+        signals.thumbnail_missed.connect(signal_handlers.queue_missed_thumbnail)
+        try:
+            self.profile.avatar.get_thumbnail(
+                {'size': (50, 50)}, generate=False)
+            self.assertIsNone(self.profile.avatar.get_thumbnail(
+                dict(aliases.get('avatar', target=self.profile.avatar),
+                     ALIAS='avatar'),
+                generate=False))
+        finally:
+            signals.thumbnail_missed.disconnect(
+                signal_handlers.queue_missed_thumbnail)
+        items = [job.items for job in models.ThumbnailJob.objects.order_by('pk')]
+        self.assertEqual(items, [
+            [{'size': [50, 50], 'quality': 85, 'subsampling': 2}],
+            ['avatar'],
+        ])
+
+        call_command(
+            'thumbnail_worker', once=True, concurrency=1, verbosity=0)
+        self.assertEqual(self.thumbnail_names(), [
+            'avatars/test.jpg.50x50_q85.jpg',
+            'avatars/test.jpg.80x80_q85_crop.jpg',
+        ])
+
+    def test_failed_job(self):
+        queues.DatabaseQueue().enqueue({
+            'source_storage': 'unknown', 'thumbnail_storage': '',
+            'name': 'missing.jpg', 'target': '', 'items': ['small']})
+        stdout, stderr = StringIO(), StringIO()
+        with self.assertLogs('easy_thumbnails.queues'):
+            call_command(
+                'thumbnail_worker', once=True, concurrency=1, stdout=stdout,
+                stderr=stderr)
+        self.assertEqual(stdout.getvalue(), 'Processed 1 jobs (1 failed).\n')
+        self.assertEqual(stderr.getvalue(), 'Failed: missing.jpg\n')
+
+    def test_duplicate_job(self):
+        signal_handlers.queue_aliases(self.profile.avatar)
+        signal_handlers.queue_aliases(self.profile.avatar)
+        self.assertEqual(models.ThumbnailJob.objects.count(), 1)
+        # Once the job is claimed, the thumbnails are queued again (the source
+        # may have changed since the worker read it).
+        queue = queues.DatabaseQueue()
+        self.assertEqual(len(queue.claim(10)), 1)
+        signal_handlers.queue_aliases(self.profile.avatar)
+        self.assertEqual(models.ThumbnailJob.objects.count(), 2)
+
+    def test_failed_job_retried(self):
+        settings.THUMBNAIL_QUEUE_MAX_ATTEMPTS = 2
+        queue = queues.DatabaseQueue()
+        queue.enqueue({
+            'source_storage': 'unknown', 'thumbnail_storage': '',
+            'name': 'missing.jpg', 'target': '', 'items': ['small']})
+        [job] = queue.claim(10)
+        queue.finish(job, False)
+        # The job stays queued, but isn't claimed again until its claim has
+        # expired.
+        self.assertEqual(queue.claim(10), [])
+        models.ThumbnailJob.objects.update(
+            claimed=timezone.now() - datetime.timedelta(
+                seconds=settings.THUMBNAIL_QUEUE_CLAIM_TIMEOUT + 1))
+        [job] = queue.claim(10)
+        self.assertEqual(job['attempts'], 2)
+        queue.finish(job, False)
+        self.assertFalse(models.ThumbnailJob.objects.exists())
+
+    def test_claimed_job_not_lost(self):
+        """
+        A job claimed by a worker which stops before processing it is claimed
+        again once the claim expires.
+        """
+        signal_handlers.queue_aliases(self.profile.avatar)
+        queue = queues.DatabaseQueue()
+        [job] = queue.claim(10)
+        self.assertEqual(queue.claim(10), [])
+        self.assertTrue(models.ThumbnailJob.objects.exists())
+        settings.THUMBNAIL_QUEUE_CLAIM_TIMEOUT = -1
+        [reclaimed] = queue.claim(10)
+        self.assertEqual(reclaimed['id'], job['id'])
+        queue.finish(reclaimed, True)
+        self.assertFalse(models.ThumbnailJob.objects.exists())
+
+    def test_thread_pool_queue(self):
+        queue = queues.ThreadPoolQueue()
+        thumbnailer = files.get_thumbnailer(self.profile.avatar)
+        job = {
+            'source_storage': 'unknown', 'thumbnail_storage': '',
+            'name': thumbnailer.name, 'target': '', 'items': ['small']}
+        with self.assertLogs('easy_thumbnails.queues'):
+            self.assertFalse(queue.enqueue(job).result())
+        queue.executor.shutdown()
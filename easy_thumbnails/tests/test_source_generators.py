@@ -1,8 +1,15 @@
 import base64
+import os
+import shutil
+import tempfile
 
 from io import BytesIO
+from django.core.files.base import ContentFile, File
 from PIL import Image, ImageChops
-from easy_thumbnails import source_generators
+from easy_thumbnails import files, source_generators
+from easy_thumbnails.animation import AnimatedImage
+from easy_thumbnails.conf import settings
+from easy_thumbnails.exceptions import EasyThumbnailsError
 from easy_thumbnails.tests import utils as test
 
 EXIF_REFERENCE = '/9j/4AAQSkZJRgABAQEASABIAAD/4QAiRXhpZgAASUkqAAgAAAABABIBAwABAAAAAQAAAAAAAAD/2wBDAAEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQH//gAdQ3JlYXRlZCB3aXRoIEdJTVAgb24gYSBNYWMA/8AACwgAHgAeAQERAP/EABgAAAMBAQAAAAAAAAAAAAAAAAAICgkL/8QAPhAAAAIGBgQGEwAAAAAAAAAABxYABAUGFRcICRMUGCUDChkaIyc3ZoinJDQ1OUVHSVdYZ2imqLjI1tfm5//aAAgBAQAAPwC/hBBBIA9tpWdekz1M0ffxQlftVwNon0jKCYGDKMrzHESXxmaY3jgrvO9ES8MQguqx8ndVksNgqdzYLDZah2Ay1W8XW9LVuu6dYWNMU5xtE8HJXS4eYuGM7RnJXea98hBRh3d5ktS73eKL3atha2/D2tlobNAMbVJ3zm+5gffaiKruy/tsfDd/e0QAbdYb2CInvNVN4QsVuFKC8fs/5Fn2ejvMmkpyVyUGIrFacRL5R3jjZcMeUReBMt/6sus03i6dnEng7wdy38ZGIOYuIM+8wgQKJRkhznj5n8CwXNtVNmX67Orf99TVROQLrR3f16c3Rm+Tyj6m/wBqMflRehN9XCX+J//Z'
@@ -32,6 +39,17 @@ def image_from_b64(data):
     return Image.open(BytesIO(base64.b64decode(data)))
 
 
+def animated_gif(no_frames, size=(20, 10), duration=100):
+    frames = [
+        Image.new('RGB', size, (i * 20, 0, 0)) for i in range(no_frames)]
+    data = BytesIO()
+    frames[0].save(
+        data, 'GIF', save_all=True, append_images=frames[1:],
+        duration=duration)
+    data.seek(0)
+    return data
+
+
 class PilImageTest(test.BaseTest):
 
     def test_not_image(self):
@@ -88,3 +106,204 @@ class PilImageTest(test.BaseTest):
         self.assertFalse(
             near_identical(reference, im),
             'Image should not have been modified')
+
+    def test_draft(self):
+        """
+        JPEG sources are decoded at a reduced scale which still covers the
+        requested thumbnail size.
+        """
+        data = self.create_image(None, None, size=(800, 600))
+        im = source_generators.pil_image(data, size=(100, 100))
+        self.assertEqual(im.size, (100, 75))
+
+        data.seek(0)
+        im = source_generators.pil_image(data, size=(100, 100), crop=True)
+        self.assertEqual(im.size, (200, 150))
+
+        data.seek(0)
+        im = source_generators.pil_image(data, size=(100, 100), zoom=40)
+        self.assertEqual(im.size, (200, 150))
+
+    def test_draft_not_reduced(self):
+        """
+        Sources aren't reduced when upscaling, autocropping or when no size is
+        requested.
+        """
+        data = self.create_image(None, None, size=(800, 600))
+        im = source_generators.pil_image(data)
+        self.assertEqual(im.size, (800, 600))
+
+        data.seek(0)
+        im = source_generators.pil_image(data, size=(1000, 1000))
+        self.assertEqual(im.size, (800, 600))
+
+        data.seek(0)
+        im = source_generators.pil_image(
+            data, size=(100, 100), autocrop=True)
+        self.assertEqual(im.size, (800, 600))
+
+    def test_draft_exif_orientation(self):
+        """
+        The draft size takes into account images which will be rotated due to
+        their EXIF orientation.
+        """
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        data = BytesIO()
+        Image.new('RGB', (800, 400)).save(data, 'JPEG', exif=exif)
+        data.seek(0)
+        im = source_generators.pil_image(data, size=(100, 0))
+        self.assertEqual(im.size, (100, 200))
+
+    def test_seekable_source(self):
+        """
+        Seekable sources are read directly rather than being copied into
+        memory first.
+        """
+        reads = []
+
+        class Seekable:
+            def __init__(self, data):
+                self.seek, self.tell = data.seek, data.tell
+                self.data = data
+
+            def read(self, size=-1):
+                reads.append(size)
+                return self.data.read(size)
+
+        data = self.create_image(None, None, size=(80, 60))
+        im = source_generators.pil_image(
+            File(Seekable(data), name='test.jpg'))
+        self.assertTrue(reads)
+        self.assertNotIn(-1, reads)
+        self.assertEqual(im.size, (80, 60))
+
+    def test_unseekable_source(self):
+        class Unseekable:
+            def __init__(self, data):
+                self.read = data.read
+
+        data = self.create_image(None, None, size=(80, 60))
+        im = source_generators.pil_image(Unseekable(data))
+        self.assertEqual(im.size, (80, 60))
+
+    def test_local_source(self):
+        """
+        Local files are opened from their path, so PIL can close the file once
+        the image is loaded.
+        """
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'test.bmp')
+        Image.new('RGB', (80, 60)).save(path)
+        with open(path, 'rb') as source:
+            self.assertEqual(
+                source_generators._get_local_path(File(source)), path)
+        self.assertIsNone(source_generators._get_local_path(BytesIO()))
+
+        with open(path, 'rb') as source:
+            im = source_generators.pil_image(File(source))
+        self.assertEqual(im.size, (80, 60))
+        self.assertEqual(im.filename, path)
+
+    def test_animated_local_source(self):
+        """
+        The frames of animated sources can still be read after the source file
+        has been closed.
+        """
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'test.gif')
+        with open(path, 'wb') as f:
+            f.write(animated_gif(3).read())
+
+        with open(path, 'rb') as source:
+            im = source_generators.pil_image(File(source))
+        self.assertEqual(im.n_frames, 3)
+        im.seek(2)
+        self.assertEqual(im.convert('RGB').getpixel((0, 0)), (40, 0, 0))
+
+
+class AnimationLimitsTest(test.BaseTest):
+
+    def test_no_limits(self):
+        im = source_generators.pil_image(animated_gif(10))
+        self.assertNotIsInstance(im, AnimatedImage)
+        self.assertEqual(im.n_frames, 10)
+
+    def test_within_limits(self):
+        settings.THUMBNAIL_ANIMATION_MAX_FRAMES = 10
+        settings.THUMBNAIL_ANIMATION_MAX_PIXELS = 2000
+        im = source_generators.pil_image(animated_gif(10))
+        self.assertNotIsInstance(im, AnimatedImage)
+        self.assertEqual(im.n_frames, 10)
+
+    def test_max_frames_sample(self):
+        settings.THUMBNAIL_ANIMATION_MAX_FRAMES = 4
+        im = source_generators.pil_image(animated_gif(10))
+        self.assertIsInstance(im, AnimatedImage)
+        self.assertEqual(im.n_frames, 4)
+        self.assertEqual(
+            [frame.convert('RGB').getpixel((0, 0))[0] for frame in im.frames],
+            [0, 40, 100, 140])
+        # The kept frames last as long as the whole animation.
+        self.assertEqual(
+            [frame.info['duration'] for frame in im.frames],
+            [200, 300, 200, 300])
+
+    def test_max_pixels_sample(self):
+        settings.THUMBNAIL_ANIMATION_MAX_PIXELS = 200 * 5
+        im = source_generators.pil_image(animated_gif(10))
+        self.assertIsInstance(im, AnimatedImage)
+        self.assertEqual(im.n_frames, 5)
+
+    def test_first(self):
+        settings.THUMBNAIL_ANIMATION_MAX_FRAMES = 4
+        settings.THUMBNAIL_ANIMATION_LIMIT_STRATEGY = 'first'
+        im = source_generators.pil_image(animated_gif(10))
+        self.assertFalse(getattr(im, 'is_animated', False))
+        self.assertEqual(im.size, (20, 10))
+
+    def test_error(self):
+        settings.THUMBNAIL_ANIMATION_MAX_FRAMES = 4
+        settings.THUMBNAIL_ANIMATION_LIMIT_STRATEGY = 'error'
+        self.assertRaises(
+            EasyThumbnailsError,
+            source_generators.pil_image, animated_gif(10))
+
+    def test_error_thumbnailer(self):
+        """
+        The error isn't swallowed when generating a thumbnail (even when
+        template exceptions are silenced).
+        """
+        settings.THUMBNAIL_ANIMATION_MAX_FRAMES = 4
+        settings.THUMBNAIL_ANIMATION_LIMIT_STRATEGY = 'error'
+        storage = test.TemporaryStorage()
+        try:
+            name = storage.save(
+                'animated.gif', ContentFile(animated_gif(10).read()))
+            thumbnailer = files.get_thumbnailer(storage, name)
+            thumbnailer.thumbnail_storage = storage
+            with self.assertRaisesMessage(
+                    EasyThumbnailsError, 'more than the limit of 4'):
+                thumbnailer.get_thumbnail({'size': (10, 10)})
+            with self.assertRaisesMessage(
+                    EasyThumbnailsError, 'more than the limit of 4'):
+                thumbnailer.get_thumbnail(
+                    {'size': (10, 10)}, silent_template_exception=True)
+        finally:
+            storage.delete_temporary_storage()
+
+    def test_decode_time(self):
+        settings.THUMBNAIL_ANIMATION_MAX_DECODE_TIME = 1e-9
+        im = source_generators.pil_image(animated_gif(10))
+        self.assertFalse(getattr(im, 'is_animated', False))
+
+        settings.THUMBNAIL_ANIMATION_LIMIT_STRATEGY = 'error'
+        self.assertRaises(
+            EasyThumbnailsError,
+            source_generators.pil_image, animated_gif(10))
+
+        settings.THUMBNAIL_ANIMATION_MAX_DECODE_TIME = 60
+        im = source_generators.pil_image(animated_gif(10))
+        self.assertEqual(im.n_frames, 10)
@@ -0,0 +1,140 @@
+import unittest
+from unittest import mock
+
+import django
+from django.core.files.storage import (
+    FileSystemStorage, default_storage, storages)
+from django.test import override_settings
+from django.utils.functional import empty
+
+from easy_thumbnails import storage, utils
+from easy_thumbnails.files import get_thumbnailer
+from easy_thumbnails.models import Thumbnail
+from easy_thumbnails.tests import utils as test
+
+
+class StorageHashTest(test.BaseTest):
+
+    def test_hash(self):
+        storage_hash = utils.get_storage_hash(FileSystemStorage())
+        self.assertEqual(
+            storage_hash,
+            utils.get_storage_hash(
+                'django.core.files.storage.filesystem.FileSystemStorage'))
+        self.assertEqual(storage_hash, utils.get_storage_hash(
+            FileSystemStorage(location='/other')))
+        self.assertNotEqual(
+            storage_hash, utils.get_storage_hash(
+                'easy_thumbnails.tests.utils.TemporaryStorage'))
+
+    def test_memoized(self):
+        utils.get_storage_hash(FileSystemStorage())
+        self.assertIn(FileSystemStorage, utils._storage_hashes)
+
+    def test_lazy(self):
+        default_storage._wrapped = empty
+        self.assertEqual(
+            utils.get_storage_hash(default_storage),
+            utils.get_storage_hash(FileSystemStorage()))
+
+
+class StorageRegistryTest(test.BaseTest):
+
+    def test_get_storage_by_hash(self):
+        self.assertIsInstance(
+            storage.get_storage_by_hash(
+                utils.get_storage_hash(storage.thumbnail_default_storage)),
+            storage.thumbnail_default_storage.__class__)
+        self.assertIsNone(storage.get_storage_by_hash('unknown'))
+
+    def test_storages_changed(self):
+        remote_hash = utils.get_storage_hash(
+            'easy_thumbnails.tests.utils.FakeRemoteStorage')
+        self.assertIsNone(storage.get_storage_by_hash(remote_hash))
+        # Changing STORAGES discards Django's storage instances, so keep the
+        # current ones to restore afterwards.
+        storage_instances = storages._storages
+        try:
+            with override_settings(STORAGES={
+                    'default': {
+                        'BACKEND':
+                            'django.core.files.storage.FileSystemStorage'},
+                    'remote': {
+                        'BACKEND':
+                            'easy_thumbnails.tests.utils.FakeRemoteStorage'}}):
+                remote_storage = storage.get_storage_by_hash(remote_hash)
+                self.assertIsInstance(remote_storage, test.FakeRemoteStorage)
+                remote_storage.delete_temporary_storage()
+        finally:
+            storages._storages = storage_instances
+        self.assertIsNone(storage.get_storage_by_hash(remote_hash))
+
+
+class StorageCapabilitiesTest(test.BaseTest):
+
+    def setUp(self):
+        super().setUp()
+        self.storage = test.FakeRemoteStorage()
+
+    def tearDown(self):
+        self.storage.delete_temporary_storage()
+        super().tearDown()
+
+    def test_local(self):
+        self.assertEqual(utils.get_storage_capabilities(FileSystemStorage()), {
+            'local': True,
+            'modified_time': True,
+            'use_modified_time': True,
+            'overwrite': False,
+        })
+
+    def test_remote(self):
+        self.storage.remote_mode = True
+        self.assertEqual(utils.get_storage_capabilities(self.storage), {
+            'local': False,
+            'modified_time': True,
+            'use_modified_time': False,
+            'overwrite': False,
+        })
+        self.assertFalse(utils.is_storage_local(self.storage))
+
+    def test_overwrite(self):
+        # As declared by django-storages backends.
+        self.storage.remote_mode = True
+        self.storage.file_overwrite = True
+        self.assertTrue(
+            utils.get_storage_capabilities(self.storage)['overwrite'])
+
+    @unittest.skipIf(
+        django.VERSION < (5, 1), 'FileSystemStorage.allow_overwrite missing')
+    def test_overwrite_local(self):
+        self.assertTrue(utils.get_storage_capabilities(
+            FileSystemStorage(allow_overwrite=True))['overwrite'])
+
+    def test_cached(self):
+        self.storage.remote_mode = True
+        utils.get_storage_capabilities(self.storage)
+        with mock.patch.object(self.storage, 'path') as path:
+            self.assertFalse(utils.is_storage_local(self.storage))
+        self.assertFalse(path.called)
+
+    def test_declared(self):
+        storage = test.TemporaryStorage()
+        self.addCleanup(storage.delete_temporary_storage)
+        storage.thumbnail_capabilities = {'use_modified_time': False}
+        self.assertEqual(utils.get_storage_capabilities(storage), {
+            'local': True,
+            'modified_time': True,
+            'use_modified_time': False,
+            'overwrite': False,
+        })
+
+        # Freshness checks use the modification times cached in the database
+        # rather than the storage's.
+        name = self.create_image(storage, 'test.jpg')
+        thumbnailer = get_thumbnailer(storage, name)
+        thumbnailer.thumbnail_storage = storage
+        thumbnail = thumbnailer.get_thumbnail({'size': (10, 10)})
+        self.assertTrue(thumbnailer.thumbnail_exists(thumbnail.name))
+        Thumbnail.objects.all().delete()
+        self.assertFalse(thumbnailer.thumbnail_exists(thumbnail.name))
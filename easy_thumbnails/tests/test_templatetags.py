@@ -5,8 +5,9 @@ from pathlib import Path
 from django.template import Template, Context, TemplateSyntaxError
 from django.core.files import storage as django_storage
 from django.utils.module_loading import import_string
+from PIL import features
 
-from easy_thumbnails import alias, storage
+from easy_thumbnails import alias, locks, storage
 from easy_thumbnails.conf import settings
 from easy_thumbnails.files import get_thumbnailer
 from easy_thumbnails.tests import utils as test
@@ -370,6 +371,79 @@ class ThumbnailerDataUriTest(ThumbnailerBase):
         self.assertEqual(output, startswith)
 
 
+class BusyLock(locks.BaseLock):
+    """
+    A generation lock which is always held by another process.
+    """
+
+    def try_acquire(self):
+        return False
+
+    def release(self):
+        pass
+
+
+class ThumbnailGenerationLockedTest(ThumbnailerBase):
+    """
+    Thumbnails which another process is generating render as empty strings.
+    """
+
+    def setUp(self):
+        super().setUp()
+        settings.THUMBNAIL_GENERATION_LOCK = (
+            'easy_thumbnails.tests.test_templatetags.BusyLock')
+        settings.THUMBNAIL_GENERATION_LOCK_WAIT = False
+        settings.THUMBNAIL_ALIASES['']['card'] = {
+            'size': (20, 20), 'crop': True, 'formats': ['jpg']}
+        alias.aliases.populate_from_settings()
+
+    def test_tag(self):
+        self.assertEqual(self.render_template(
+            '{% thumbnail source 50x50 %}'), '')
+        self.assertEqual(self.render_template(
+            '{% thumbnail source 50x50 as thumb %}[{{ thumb }}]'), '[]')
+
+    def test_filters(self):
+        self.assertEqual(self.render_template(
+            '{{ filename|thumbnail_url:"small" }}'), '')
+        self.assertEqual(self.render_template(
+            '{{ filename|thumbnail_picture:"card" }}'), '')
+
+
+@unittest.skipUnless(features.check('webp'), 'WebP support not available')
+class ThumbnailPictureTest(ThumbnailerBase):
+
+    def setUp(self):
+        super().setUp()
+        settings.THUMBNAIL_ALIASES['']['card'] = {
+            'size': (20, 20), 'crop': True, 'formats': ['webp', 'jpg']}
+        alias.aliases.populate_from_settings()
+
+    def expected_picture(self, options):
+        webp = self.verify_thumbnail((20, 20), dict(options, format='webp'))
+        jpg = self.verify_thumbnail((20, 20), dict(options, format='jpg'))
+        return (
+            '<picture><source srcset="%s%s" type="image/webp" />'
+            '<img alt="" height="20" src="%s%s" width="20" /></picture>' % (
+                settings.MEDIA_URL, webp, settings.MEDIA_URL, jpg))
+
+    def test_filter(self):
+        output = self.render_template('{{ filename|thumbnail_picture:"card" }}')
+        self.assertEqual(output, self.expected_picture(
+            settings.THUMBNAIL_ALIASES['']['card']))
+
+    def test_filter_invalid(self):
+        self.assertEqual(self.render_template(
+            '{{ filename|thumbnail_picture:"notanalias" }}'), '')
+
+    def test_tag(self):
+        output = self.render_template(
+            '{% thumbnail source 20x20 crop formats="webp,jpg" as thumb %}'
+            '{{ thumb.picture }}')
+        self.assertEqual(output, self.expected_picture(
+            {'size': (20, 20), 'crop': True}))
+
+
 @unittest.skipUnless(VIL.is_available(), "SVG support not available")
 class ThumbnailSVGImage(test.BaseTest):
 
@@ -0,0 +1,102 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+
+from easy_thumbnails import files
+from easy_thumbnails.management.commands.thumbnail_generate import Command
+from easy_thumbnails.storage import thumbnail_default_storage
+from easy_thumbnails.tests import models
+from easy_thumbnails.tests.test_aliases import BaseTest as AliasBaseTest
+from easy_thumbnails.utils import get_storage_hash
+
+
+class ThumbnailGenerateTest(AliasBaseTest):
+    create_file = True
+
+    def setUp(self):
+        super().setUp()
+        models.Profile.objects.create(avatar='avatars/test.jpg')
+
+    def generate(self, *args, **kwargs):
+        stdout, stderr = StringIO(), StringIO()
+        call_command(
+            'thumbnail_generate', *args, workers=1, stdout=stdout,
+            stderr=stderr, **kwargs)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def thumbnail_names(self):
+        profile = models.Profile(avatar='avatars/test.jpg')
+        return sorted(
+            thumbnail.name for thumbnail in profile.avatar.get_thumbnails())
+
+    def test_generate(self):
+        stdout, stderr = self.generate('easy_thumbnails_tests.Profile')
+        self.assertIn(
+            'Generating thumbnails for easy_thumbnails_tests.Profile.avatar\n',
+            stdout)
+        self.assertIn(
+            'Generated 4 thumbnails for 1 files (0 skipped, 0 failed)', stdout)
+        self.assertEqual(stderr, '')
+        self.assertEqual(self.thumbnail_names(), [
+            'avatars/test.jpg.200x200_q85.jpg',
+            'avatars/test.jpg.20x20_q85_crop.jpg',
+            'avatars/test.jpg.600x80_q85_crop.jpg',
+            'avatars/test.jpg.80x80_q85_crop.jpg',
+        ])
+
+        # Fresh thumbnails are skipped.
+        stdout, stderr = self.generate(
+            'easy_thumbnails_tests.Profile.avatar', include_global=True)
+        self.assertIn(
+            'Generated 1 thumbnails for 1 files (4 skipped, 0 failed)', stdout)
+
+    def test_existing_checked_once(self):
+        """
+        Each thumbnail is only looked up once (by ``get_many_thumbnails``).
+        """
+        self.generate('easy_thumbnails_tests', aliases=['small'])
+        with mock.patch.object(
+                files.Thumbnailer, 'thumbnail_exists', autospec=True,
+                side_effect=files.Thumbnailer.thumbnail_exists) as exists:
+            stdout, stderr = self.generate('easy_thumbnails_tests.Profile')
+        self.assertIn(
+            'Generated 3 thumbnails for 1 files (1 skipped, 0 failed)', stdout)
+        # The existing thumbnail is found by its first name, the three
+        # missing ones are looked for under their transparent name too.
+        self.assertEqual(exists.call_count, 1 + 3 * 2)
+
+    def test_thumbnail_storage(self):
+        """
+        Fields without a thumbnail storage use the default thumbnail storage.
+        """
+        field = models.Profile._meta.get_field('avatar')
+        with mock.patch.object(field, 'thumbnail_storage', None):
+            [job] = Command().get_jobs(
+                'easy_thumbnails_tests.Profile.avatar', field, ['small'])
+        self.assertEqual(
+            job['thumbnail_storage'],
+            get_storage_hash(thumbnail_default_storage))
+
+    def test_aliases(self):
+        stdout, stderr = self.generate(
+            'easy_thumbnails_tests', aliases=['small', 'sidebar'])
+        self.assertIn(
+            'Generated 1 thumbnails for 1 files (0 skipped, 0 failed)', stdout)
+        self.assertEqual(self.thumbnail_names(), [
+            'avatars/test.jpg.20x20_q85_crop.jpg',
+        ])
+
+    def test_failed(self):
+        models.Profile.objects.create(avatar='avatars/missing.jpg')
+        stdout, stderr = self.generate(
+            'easy_thumbnails_tests.Profile.avatar', aliases=['small'])
+        self.assertIn(
+            'Generated 1 thumbnails for 2 files (0 skipped, 1 failed)', stdout)
+        self.assertIn('Failed: avatars/missing.jpg', stderr)
+
+    def test_invalid_target(self):
+        with self.assertRaises(CommandError):
+            self.generate('easy_thumbnails_tests.Profile.invalid')
+        with self.assertRaises(CommandError):
+            self.generate('invalid_app')
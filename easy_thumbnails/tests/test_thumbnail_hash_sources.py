@@ -0,0 +1,52 @@
+import hashlib
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+
+from easy_thumbnails import utils
+from easy_thumbnails.models import Source
+from easy_thumbnails.tests import models
+from easy_thumbnails.tests.test_aliases import BaseTest as AliasBaseTest
+
+
+class ThumbnailHashSourcesTest(AliasBaseTest):
+    create_file = True
+
+    def setUp(self):
+        super().setUp()
+        profile = models.Profile.objects.create(avatar='avatars/test.jpg')
+        profile.avatar.get_thumbnail({'size': (20, 20)})
+        with self.storage.open('avatars/test.jpg') as source:
+            self.content_hash = hashlib.sha256(source.read()).hexdigest()
+
+    def hash_sources(self, **kwargs):
+        stdout, stderr = StringIO(), StringIO()
+        # The temporary storage isn't one of the STORAGES.
+        storages = {utils.get_storage_hash(self.storage): self.storage}
+        with mock.patch(
+                'easy_thumbnails.management.commands.thumbnail_hash_sources.'
+                'get_storage_by_hash', storages.get):
+            call_command(
+                'thumbnail_hash_sources', stdout=stdout, stderr=stderr,
+                **kwargs)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_hash_sources(self):
+        Source.objects.create(storage_hash='unknown', name='missing.jpg')
+        self.assertEqual(Source.objects.exclude(content_hash='').count(), 0)
+        stdout, stderr = self.hash_sources()
+        self.assertIn('Hashed 1 source files (1 failed)', stdout)
+        self.assertIn('Failed: missing.jpg (unknown storage)', stderr)
+        source = Source.objects.get(name='avatars/test.jpg')
+        self.assertEqual(source.content_hash, self.content_hash)
+
+        # Sources which already have a hash are skipped...
+        stdout, stderr = self.hash_sources()
+        self.assertIn('Hashed 0 source files (1 failed)', stdout)
+        # ...unless they are all hashed again.
+        Source.objects.filter(pk=source.pk).update(content_hash='outdated')
+        stdout, stderr = self.hash_sources(all=True)
+        self.assertIn('Hashed 1 source files (1 failed)', stdout)
+        source.refresh_from_db()
+        self.assertEqual(source.content_hash, self.content_hash)
@@ -1,12 +1,17 @@
+import functools
 import hashlib
-import inspect
 import math
+import os
+import weakref
+from io import BytesIO
 
+from django.core.files.storage import Storage
 from django.utils import timezone
-from django.utils.functional import LazyObject
+from django.utils.functional import LazyObject, empty
 from django.utils.module_loading import import_string
 
 from PIL import Image
+from easy_thumbnails.animation import is_image
 from easy_thumbnails.conf import settings
 
 
@@ -14,13 +19,10 @@ def image_entropy(im):
     """
     Calculate the entropy of an image. Used for "smart cropping".
     """
-    if not isinstance(im, Image.Image):
+    if not is_image(im):
         # Can only deal with PIL images. Fall back to a constant entropy.
         return 0
-    hist = im.histogram()
-    hist_size = float(sum(hist))
-    hist = [h / hist_size for h in hist]
-    return -sum([p * math.log(p, 2) for p in hist if p != 0])
+    return im.entropy()
 
 
 def valid_processor_options(processors=None):
@@ -28,51 +30,193 @@ def valid_processor_options(processors=None):
     Return a list of unique valid options for a list of image processors
     (and/or source generators)
     """
+    from easy_thumbnails import engine
+
     if processors is None:
-        processors = [
-            import_string(p) for p in
-            tuple(settings.THUMBNAIL_PROCESSORS) +
-            tuple(settings.THUMBNAIL_SOURCE_GENERATORS)]
-    valid_options = set(['size', 'quality', 'subsampling'])
-    for processor in processors:
-        args = inspect.getfullargspec(processor)[0]
-        # Add all arguments apart from the first (the source image).
-        valid_options.update(args[1:])
-    return list(valid_options)
+        return list(engine.get_pipeline().valid_options)
+    return list(engine.Pipeline(processors).valid_options)
 
 
-def is_storage_local(storage):
+@functools.lru_cache(maxsize=None)
+def _import_string(dotted_path):
+    return import_string(dotted_path)
+
+
+def get_callable(value):
     """
-    Check to see if a file storage is local.
+    Return ``value`` itself if it is callable, otherwise import it from its
+    dotted path (caching the result for future calls).
+    """
+    if callable(value):
+        return value
+    return _import_string(value)
+
+
+def get_covering_size(source_size, size, crop=False, zoom=None, **kwargs):
+    """
+    Return the smallest size that a source image of ``source_size`` can be
+    reduced to while still covering a thumbnail of the requested ``size``, or
+    ``None`` if the source image can't be reduced.
+
+    This mirrors the scale calculations of
+    :func:`easy_thumbnails.processors.scale_and_crop`.
+    """
+    try:
+        target_x, target_y = [int(v) for v in size]
+    except (TypeError, ValueError):
+        return None
+    source_x, source_y = source_size
+    if not source_x or not source_y or not (target_x or target_y):
+        return None
+    if crop or not target_x or not target_y:
+        scale = max(target_x / source_x, target_y / source_y)
+    else:
+        scale = min(target_x / source_x, target_y / source_y)
+    if zoom:
+        scale *= (100 + int(zoom)) / 100.0
+    if scale >= 1.0:
+        return None
+    return math.ceil(source_x * scale), math.ceil(source_y * scale)
+
+
+def fits_within(source_size, size):
+    """
+    Return whether an image of ``source_size`` already fits within a
+    thumbnail of the requested ``size`` (where a zero dimension doesn't
+    constrain the image).
+    """
+    try:
+        target = [int(v) for v in size]
+    except (TypeError, ValueError):
+        return False
+    return all(
+        not target_v or source_v <= target_v
+        for source_v, target_v in zip(source_size, target))
+
+
+# Storage capabilities, keyed by storage instance.
+_storage_capabilities = weakref.WeakKeyDictionary()
+
+
+def get_storage_capabilities(storage):
     """
+    Return a dictionary describing the capabilities of a file storage:
+
+    ``local``
+        Whether the storage's files have a local file system path.
+    ``modified_time``
+        Whether the storage implements ``get_modified_time``.
+    ``use_modified_time``
+        Whether to check if thumbnails are up to date using the modification
+        times from the storage (rather than the ones cached in the
+        database). By default, this is only done for local storages.
+    ``overwrite``
+        Whether saving a file replaces any existing file with the same name
+        (rather than saving it under a new name). Detected from the
+        ``file_overwrite`` attribute of django-storages backends and the
+        ``allow_overwrite`` option of ``FileSystemStorage``. Thumbnails in
+        other non-local storages are deleted before they are saved again.
+
+    The capabilities are detected once for each storage instance. A storage
+    class can also declare any of them in a ``thumbnail_capabilities``
+    dictionary attribute, to override the detected values.
+    """
+    if isinstance(storage, LazyObject):
+        if storage._wrapped is empty:
+            storage._setup()
+        storage = storage._wrapped
+    try:
+        return _storage_capabilities[storage]
+    except (KeyError, TypeError):
+        pass
     try:
         storage.path('test')
     except NotImplementedError:
-        return False
-    return True
+        local = False
+    else:
+        local = True
+    modified_time = (
+        getattr(type(storage), 'get_modified_time', None) is not
+        Storage.get_modified_time)
+    capabilities = {
+        'local': local,
+        'modified_time': modified_time,
+        'use_modified_time': local and modified_time,
+        'overwrite': bool(
+            getattr(storage, 'file_overwrite', False) or
+            getattr(storage, '_allow_overwrite', False)),
+    }
+    capabilities.update(getattr(storage, 'thumbnail_capabilities', None) or {})
+    try:
+        _storage_capabilities[storage] = capabilities
+    except TypeError:
+        # The storage can't be weakly referenced, so don't cache its
+        # capabilities.
+        pass
+    return capabilities
+
+
+def make_directories(directory, permissions_mode=None):
+    """
+    Create a directory (and any missing parents), like ``FileSystemStorage``
+    does when saving a file.
+    """
+    if permissions_mode is None:
+        os.makedirs(directory, exist_ok=True)
+        return
+    # Set the umask so the directories get exactly the requested mode.
+    old_umask = os.umask(0o777 & ~permissions_mode)
+    try:
+        os.makedirs(directory, permissions_mode, exist_ok=True)
+    finally:
+        os.umask(old_umask)
+
+
+def is_storage_local(storage):
+    """
+    Check to see if a file storage is local.
+    """
+    return get_storage_capabilities(storage)['local']
+
+
+# Storage hashes, keyed by storage class.
+_storage_hashes = weakref.WeakKeyDictionary()
 
 
 def get_storage_hash(storage):
     """
     Return a hex string hash for a storage object (or string containing
     'full.path.ClassName' referring to a storage object).
+
+    The hash only depends on the storage's class, so it is calculated once
+    for each class.
     """
     # If storage is wrapped in a lazy object we need to get the real thing.
     if isinstance(storage, LazyObject):
-        if storage._wrapped is None:
+        if storage._wrapped is empty:
             storage._setup()
         storage = storage._wrapped
-    if not isinstance(storage, str):
-        storage_cls = storage.__class__
-        storage = '%s.%s' % (storage_cls.__module__, storage_cls.__name__)
-    return md5_not_used_for_security(storage.encode('utf8')).hexdigest()
+    if isinstance(storage, str):
+        return _get_storage_path_hash(storage)
+    storage_cls = storage.__class__
+    storage_hash = _storage_hashes.get(storage_cls)
+    if storage_hash is None:
+        storage_hash = _get_storage_path_hash(
+            '%s.%s' % (storage_cls.__module__, storage_cls.__name__))
+        _storage_hashes[storage_cls] = storage_hash
+    return storage_hash
+
+
+@functools.lru_cache(maxsize=128)
+def _get_storage_path_hash(storage_path):
+    return md5_not_used_for_security(storage_path.encode('utf8')).hexdigest()
 
 
 def is_transparent(image):
     """
     Check to see if an image is transparent.
     """
-    if not isinstance(image, Image.Image):
+    if not is_image(image):
         # Can only deal with PIL images, fall back to the assumption that that
         # it's not transparent.
         return False
@@ -84,12 +228,67 @@ def is_progressive(image):
     """
     Check to see if an image is progressive.
     """
-    if not isinstance(image, Image.Image):
+    if not is_image(image):
         # Can only check PIL images for progressive encoding.
         return False
     return ('progressive' in image.info) or ('progression' in image.info)
 
 
+def get_exif_orientation(im):
+    """
+    Return the EXIF orientation of an image, or ``None`` if it isn't known.
+    """
+    try:
+        exif = im._getexif()
+    except Exception:
+        # There are many ways that _getexif fails, we're just going to blanket
+        # cover them all.
+        exif = None
+    if exif:
+        return exif.get(0x0112)
+
+
+def get_content_hash(file):
+    """
+    Return the SHA-256 hex digest of the contents of a (binary mode) file.
+    """
+    try:
+        file.seek(0)
+    except Exception:
+        pass
+    content_hash = hashlib.sha256()
+    for chunk in iter(lambda: file.read(64 * 1024), b''):
+        content_hash.update(chunk)
+    return content_hash.hexdigest()
+
+
+def get_source_metadata(file):
+    """
+    Return a dictionary of the ``width``, ``height``, ``format``, ``mode``,
+    number of ``frames`` and EXIF ``orientation`` of an image file, or
+    ``None`` if PIL can't identify the image.
+
+    Only the image's header is parsed.
+    """
+    try:
+        file.seek(0)
+    except Exception:
+        # PIL needs to seek within the file, so read it into memory.
+        file = BytesIO(file.read())
+    try:
+        image = Image.open(file)
+    except Exception:
+        return None
+    return {
+        'width': image.size[0],
+        'height': image.size[1],
+        'format': image.format or '',
+        'mode': image.mode,
+        'frames': getattr(image, 'n_frames', 1),
+        'orientation': get_exif_orientation(image) or 1,
+    }
+
+
 def exif_orientation(im):
     """
     Rotate and/or flip an image to respect the image's EXIF orientation data.
@@ -102,14 +301,8 @@ def exif_orientation(im):
         # Pillow < 9.1.0
         Image__Transpose = Image
 
-    try:
-        exif = im._getexif()
-    except Exception:
-        # There are many ways that _getexif fails, we're just going to blanket
-        # cover them all.
-        exif = None
-    if exif:
-        orientation = exif.get(0x0112)
+    orientation = get_exif_orientation(im)
+    if orientation:
         if orientation == 2:
             im = im.transpose(Image__Transpose.FLIP_LEFT_RIGHT)
         elif orientation == 3: